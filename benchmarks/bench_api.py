@@ -0,0 +1,268 @@
+"""Throughput, latency and peak memory of the public API.
+
+This script writes synthetic patient and lab .txt files of increasing
+size with `synthetic.write_files` and times each public operation of
+`ehr_utils` in a fresh Python process, so the peak resident set size
+(RSS) of one operation does not leak into the next. Results can be
+saved as JSON and compared against a saved baseline, which makes the
+script exit with status 1 if any operation got slower than the
+tolerance allows.
+
+This script requires `ehr_utils`, `argparse`, `json`, `resource` and
+`subprocess`, and is run from the repository root.
+
+Usage
+-----
+    python benchmarks/bench_api.py [--rows N ...] [--cases NAME ...]
+        [--output FILE] [--baseline FILE] [--tolerance FRACTION]
+"""
+
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import DEFAULT_LABS_PER_PATIENT, write_files  # noqa: E402
+
+
+SRC_DIR: str = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+
+DEFAULT_ROWS: tuple[int, ...] = (10_000, 100_000, 1_000_000)
+
+DEFAULT_TOLERANCE: float = 0.25
+
+LAB_NAME: str = "METABOLIC: CREATININE"
+
+# Each case is (setup, operation). Only the operation is timed; the
+# peak RSS covers both.
+CASES: dict[str, tuple[str, str]] = {
+    "parse_data": ("", "parse_data(patients, labs)"),
+    "parse_data_fast": ("", "parse_data(patients, labs, fast=True)"),
+    "parse_data_table": ("", "parse_data(patients, labs, table=LabTable())"),
+    "parse_data_mmap": ("", "parse_data(patients, labs, use_mmap=True)"),
+    "stream_data": (
+        "",
+        "for batch in stream_data(patients, labs, 10_000):\n    pass",
+    ),
+    "parse_lazy": ("", "parse_lazy(patients, labs)"),
+    "read_snapshot": (
+        "parse_data(patients, labs, cache_dir=directory)",
+        "parse_data(patients, labs, cache_dir=directory)",
+    ),
+    "is_sick": (
+        "records = parse_data(patients, labs)",
+        "[p.is_sick(LAB_NAME, '>', 5.0) for p in records.values()]",
+    ),
+    "age_first_visit": (
+        "records = parse_data(patients, labs)",
+        "[p.age_first_visit() for p in records.values() if p.labs]",
+    ),
+    "cohort_ages": (
+        "records = parse_data(patients, labs)",
+        "cohort_ages(records)",
+    ),
+    "cohort_ages_first_visit": (
+        "records = parse_data(patients, labs)\n"
+        "records = {k: p for k, p in records.items() if p.labs}",
+        "cohort_ages_first_visit(records)",
+    ),
+    "get_summary": (
+        "records = parse_data(patients, labs)",
+        "[p.get_summary(LAB_NAME) for p in records.values()]",
+    ),
+    "query": (
+        "records = parse_data(patients, labs)",
+        "(Query.lab(LAB_NAME, '>=', 9.0) & Query.age('between', (40, 65))"
+        ").compile().select(records)",
+    ),
+    "query_table": (
+        "table = LabTable()\nrecords = parse_data(patients, labs, table=table)",
+        "(Query.lab(LAB_NAME, '>=', 9.0) & Query.age('between', (40, 65))"
+        ").compile().select(records, table)",
+    ),
+    "sick_patients": (
+        "table = LabTable()\nparse_data(patients, labs, table=table)",
+        "table.sick_patients(LAB_NAME, '>', 5.0)",
+    ),
+    "table_summary": (
+        "table = LabTable()\nparse_data(patients, labs, table=table)",
+        "table.summary(LAB_NAME)",
+    ),
+}
+
+CHILD: str = """
+import sys
+sys.path.insert(0, {src!r})
+from ehr_utils import *
+import json, resource, time
+patients, labs, directory = {patients!r}, {labs!r}, {directory!r}
+LAB_NAME = {lab_name!r}
+{setup}
+start = time.perf_counter()
+{operation}
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": seconds, "rss_kib": rss}}))
+"""
+
+
+def run_case(
+    case: str, patient_filename: str, lab_filename: str, directory: str
+) -> dict[str, float]:
+    """
+    Return the latency and peak RSS of one case in a fresh process.
+
+    Arguments
+    ---------
+    case -- a string denoting a key of CASES
+
+    patient_filename -- a string denoting the patient .txt file
+
+    lab_filename -- a string denoting the lab .txt file
+
+    directory -- a string denoting a scratch directory for the case
+
+    Return
+    ------
+    dict[str, float]
+        the operation's wall time in seconds and the process' peak RSS
+        in kilobytes
+    """
+    setup, operation = CASES[case]
+    code = CHILD.format(
+        src=os.path.abspath(SRC_DIR),
+        patients=patient_filename,
+        labs=lab_filename,
+        directory=directory,
+        lab_name=LAB_NAME,
+        setup=setup,
+        operation=operation,
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def run(rows: list[int], cases: list[str]) -> list[dict]:
+    """
+    Return the results of every case for every lab file size.
+
+    Arguments
+    ---------
+    rows -- a list of integers denoting lab file sizes in rows
+
+    cases -- a list of strings denoting keys of CASES
+
+    Return
+    ------
+    list[dict]
+        one result per case and size with the case, rows, seconds,
+        rows per second and peak RSS
+    """
+    results = []
+    for count in rows:
+        patients = max(1, count // DEFAULT_LABS_PER_PATIENT)
+        with tempfile.TemporaryDirectory() as directory:
+            patient_filename, lab_filename = write_files(
+                directory, patients, count // patients
+            )
+            for case in cases:
+                with tempfile.TemporaryDirectory() as scratch:
+                    result = run_case(
+                        case, patient_filename, lab_filename, scratch
+                    )
+                results.append(
+                    {
+                        "case": case,
+                        "rows": count,
+                        "seconds": result["seconds"],
+                        "rows_per_second": count / max(result["seconds"], 1e-9),
+                        "rss_kib": result["rss_kib"],
+                    }
+                )
+                print_row(results[-1])
+    return results
+
+
+def print_row(result: dict) -> None:
+    """Print one result as a row of a Markdown table."""
+    print(
+        f"| `{result['case']}` | {result['rows']:,} "
+        f"| {result['seconds'] * 1000:.1f} "
+        f"| {result['rows_per_second']:,.0f} "
+        f"| {result['rss_kib'] / 1024:.1f} |",
+        flush=True,
+    )
+
+
+def regressions(
+    results: list[dict], baseline: list[dict], tolerance: float
+) -> list[str]:
+    """
+    Return descriptions of results slower than their baseline.
+
+    Arguments
+    ---------
+    results -- a list of results returned by run
+
+    baseline -- a list of results loaded from an earlier run
+
+    tolerance -- a float denoting the allowed fractional slowdown
+
+    Return
+    ------
+    list[str]
+        one description per case and size that got slower than
+        baseline by more than tolerance
+    """
+    before = {(result["case"], result["rows"]): result for result in baseline}
+    slower = []
+    for result in results:
+        previous = before.get((result["case"], result["rows"]))
+        if previous is None:
+            continue
+        if result["seconds"] > previous["seconds"] * (1 + tolerance):
+            slower.append(
+                f"{result['case']} at {result['rows']:,} rows: "
+                f"{previous['seconds']:.3f} s -> {result['seconds']:.3f} s"
+            )
+    return slower
+
+
+def main() -> None:
+    """Print a table of results and compare them against a baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument(
+        "--cases", nargs="+", choices=list(CASES), default=list(CASES)
+    )
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    print("| case | lab rows | ms | rows/s | peak RSS MiB |")
+    print("|---|---:|---:|---:|---:|")
+    results = run(args.rows, args.cases)
+
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump(results, outfile, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as infile:
+            slower = regressions(results, json.load(infile), args.tolerance)
+        for line in slower:
+            print("regression:", line, file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
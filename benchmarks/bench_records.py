@@ -0,0 +1,79 @@
+"""Memory and construction time of Lab and LabRecord.
+
+This script builds the same laboratory tests as instances of the Lab
+class and as LabRecord tuples, and reports the memory allocated per
+object and the construction time per object.
+
+This script requires `ehr_utils`, `timeit` and `tracemalloc`, and is
+run from the repository root.
+
+Usage
+-----
+    python benchmarks/bench_records.py [count]
+"""
+
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from ehr_utils import Lab, LabRecord  # noqa: E402
+
+
+DEFAULT_COUNT: int = 100_000
+
+
+def make_rows(count: int) -> list[list[str]]:
+    """Return count rows of lab fields as they come out of a split line."""
+    return [
+        [
+            f"{idx % 1000:08X}-0000-0000-0000-000000000000",
+            str(idx % 5),
+            "METABOLIC: CREATININE",
+            f"{idx % 100 / 10}",
+            "mg/dL",
+            "2000-01-01 00:00:00.000",
+        ]
+        for idx in range(count)
+    ]
+
+
+def per_object_bytes(build, rows: list[list[str]]) -> float:
+    """Return the memory allocated per object by build(rows)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / len(rows)
+
+
+def per_object_seconds(build, rows: list[list[str]]) -> float:
+    """Return the best construction time per object of build(rows)."""
+    return min(timeit.repeat(lambda: build(rows), number=1, repeat=5)) / len(
+        rows
+    )
+
+
+def main(count: int) -> None:
+    """Print a table of memory and construction time per object."""
+    rows = make_rows(count)
+    builders = {
+        "Lab": lambda rows: [Lab(*fields) for fields in rows],
+        "LabRecord": lambda rows: list(map(LabRecord._make, rows)),
+    }
+
+    print("| record | bytes per object | ns per object |")
+    print("|---|---:|---:|")
+    for name, build in builders.items():
+        size = per_object_bytes(build, rows)
+        seconds = per_object_seconds(build, rows)
+        print(f"| `{name}` | {size:.0f} | {seconds * 1e9:.0f} |")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT)
@@ -0,0 +1,92 @@
+"""Peak memory benchmark for parse_data and stream_data.
+
+This script writes synthetic patient and lab .txt files of increasing
+size and reports the peak resident set size (RSS) of a fresh Python
+process that consumes each file with `parse_data` or `stream_data`.
+
+This script requires `ehr_utils`, `synthetic` and `subprocess`, and is
+run from the repository root.
+
+Usage
+-----
+    python benchmarks/bench_streaming.py [rows ...]
+"""
+
+
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import DEFAULT_LABS_PER_PATIENT, write_files  # noqa: E402
+
+
+SRC_DIR: str = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+
+DEFAULT_ROWS: tuple[int, ...] = (10_000, 100_000, 1_000_000)
+
+CHILD: str = """
+import resource, sys
+sys.path.insert(0, {src!r})
+from ehr_utils import parse_data, stream_data
+if {mode!r} == "parse_data":
+    records = parse_data({patients!r}, {labs!r})
+else:
+    for batch in stream_data({patients!r}, {labs!r}, 10_000):
+        pass
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_rss(mode: str, patient_filename: str, lab_filename: str) -> int:
+    """
+    Return the peak RSS in kilobytes of a process running mode.
+
+    Arguments
+    ---------
+    mode -- a string denoting "parse_data" or "stream_data"
+
+    patient_filename -- a string denoting the patient .txt file
+
+    lab_filename -- a string denoting the lab .txt file
+
+    Return
+    ------
+    int
+        the peak resident set size of the child process in kilobytes
+    """
+    code = CHILD.format(
+        src=os.path.abspath(SRC_DIR),
+        mode=mode,
+        patients=patient_filename,
+        labs=lab_filename,
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return int(output.stdout.strip())
+
+
+def main(rows: list[int]) -> None:
+    """Print a table of peak RSS against lab file size."""
+    print("| lab rows | file MiB | parse_data MiB | stream_data MiB |")
+    print("|---:|---:|---:|---:|")
+    for count in rows:
+        with tempfile.TemporaryDirectory() as directory:
+            patients = max(1, count // DEFAULT_LABS_PER_PATIENT)
+            patient_filename, lab_filename = write_files(
+                directory, patients, count // patients
+            )
+            size = os.path.getsize(lab_filename) / 2**20
+            parsed = peak_rss("parse_data", patient_filename, lab_filename)
+            streamed = peak_rss("stream_data", patient_filename, lab_filename)
+            print(
+                f"| {count:,} | {size:.1f} | {parsed / 1024:.1f} "
+                f"| {streamed / 1024:.1f} |"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or list(DEFAULT_ROWS))
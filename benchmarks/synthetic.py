@@ -0,0 +1,163 @@
+"""Deterministic synthetic EHR data.
+
+This module writes patient and lab .txt files in the tab-delimited
+format read by `ehr_utils`, with a configurable number of patients,
+laboratory tests per patient and distinct laboratory test names. The
+same arguments always produce byte-identical files, and rows are
+written one at a time, so files of 10^8 lab rows need constant memory.
+
+This module requires `datetime`, `os`, `random` and `sys`, and can be run
+from the repository root.
+
+Usage
+-----
+    python benchmarks/synthetic.py directory patients [labs_per_patient
+        [lab_names [seed]]]
+"""
+
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+
+DEFAULT_LABS_PER_PATIENT: int = 100
+
+DEFAULT_LAB_NAMES: int = 3
+
+DEFAULT_SEED: int = 0
+
+CLINICAL_LAB_NAMES: tuple[tuple[str, str], ...] = (
+    ("METABOLIC: CREATININE", "mg/dL"),
+    ("URINALYSIS: RED BLOOD CELLS", "rbc/hpf"),
+    ("CBC: WHITE BLOOD CELL COUNT", "k/cumm"),
+)
+
+GENDERS: tuple[str, ...] = ("Female", "Male")
+
+RACES: tuple[str, ...] = ("White", "African American", "Asian", "Unknown")
+
+MARITAL_STATUSES: tuple[str, ...] = (
+    "Married",
+    "Single",
+    "Divorced",
+    "Unknown",
+)
+
+LANGUAGES: tuple[str, ...] = ("English", "Spanish", "Icelandic", "Unknown")
+
+FIRST_BIRTH: datetime = datetime(1920, 1, 1)
+
+FIRST_LAB: datetime = datetime(2000, 1, 1)
+
+SPAN_SECONDS: int = 20 * 365 * 24 * 3600
+
+
+def patient_id(idx: int) -> str:
+    """Return the synthetic id of patient number idx."""
+    return f"{idx:08X}-0000-4000-8000-{idx * 2654435761 % 16**12:012X}"
+
+
+def lab_names(count: int) -> list[tuple[str, str]]:
+    """Return count laboratory test names and their units."""
+    names = list(CLINICAL_LAB_NAMES[:count])
+    names.extend(
+        (f"PANEL {idx // 10:03d}: TEST {idx:05d}", "units")
+        for idx in range(len(names), count)
+    )
+    return names
+
+
+def format_datetime(when: datetime) -> str:
+    """Return when formatted as the EHR files' dates and times."""
+    return when.isoformat(" ", "milliseconds")
+
+
+def write_files(
+    directory: str,
+    patients: int,
+    labs_per_patient: int = DEFAULT_LABS_PER_PATIENT,
+    lab_name_count: int = DEFAULT_LAB_NAMES,
+    seed: int = DEFAULT_SEED,
+) -> tuple[str, str]:
+    """
+    Write synthetic patient and lab .txt files.
+
+    Lab rows are assigned to patients at random, so each patient has
+    labs_per_patient laboratory tests on average and the rows of one
+    patient are spread over the whole file, as in real extracts.
+
+    Arguments
+    ---------
+    directory -- a string denoting the directory for the files, which is
+        created if it does not exist
+
+    patients -- an integer denoting the number of patients
+
+    labs_per_patient -- an integer denoting the mean number of lab rows
+        per patient
+
+    lab_name_count -- an integer denoting the number of distinct
+        laboratory test names
+
+    seed -- an integer seeding the random number generator
+
+    Return
+    ------
+    tuple[str, str]
+        the patient and lab filenames
+    """
+    if patients < 1 or labs_per_patient < 0 or lab_name_count < 1:
+        raise ValueError(
+            "patients and lab_name_count must be positive and "
+            "labs_per_patient must not be negative"
+        )
+
+    rng = random.Random(seed)
+    names = lab_names(lab_name_count)
+    os.makedirs(directory, exist_ok=True)
+
+    patient_filename = os.path.join(directory, "patients.txt")
+    with open(patient_filename, "w", newline="\n") as outfile:
+        outfile.write(
+            "PatientID\tPatientGender\tPatientDateOfBirth\tPatientRace\t"
+            "PatientMaritalStatus\tPatientLanguage\t"
+            "PatientPopulationPercentageBelowPoverty\n"
+        )
+        for idx in range(patients):
+            birth = FIRST_BIRTH + timedelta(
+                seconds=rng.randrange(80 * 365 * 24 * 3600),
+                milliseconds=rng.randrange(1000),
+            )
+            outfile.write(
+                f"{patient_id(idx)}\t{rng.choice(GENDERS)}\t"
+                f"{format_datetime(birth)}\t{rng.choice(RACES)}\t"
+                f"{rng.choice(MARITAL_STATUSES)}\t{rng.choice(LANGUAGES)}\t"
+                f"{rng.uniform(0, 40):.2f}\n"
+            )
+
+    lab_filename = os.path.join(directory, "labs.txt")
+    with open(lab_filename, "w", newline="\n") as outfile:
+        outfile.write(
+            "PatientID\tAdmissionID\tLabName\tLabValue\tLabUnits\tLabDateTime\n"
+        )
+        for _ in range(patients * labs_per_patient):
+            name, units = names[rng.randrange(lab_name_count)]
+            when = FIRST_LAB + timedelta(
+                seconds=rng.randrange(SPAN_SECONDS),
+                milliseconds=rng.randrange(1000),
+            )
+            outfile.write(
+                f"{patient_id(rng.randrange(patients))}\t{rng.randint(1, 5)}\t"
+                f"{name}\t{rng.uniform(0, 10):.1f}\t{units}\t"
+                f"{format_datetime(when)}\n"
+            )
+
+    return patient_filename, lab_filename
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(__doc__)
+    print(*write_files(sys.argv[1], *map(int, sys.argv[2:6])), sep="\n")
@@ -1,15 +1,37 @@
 """EHR Data Processor.
 
 This module is allows the user to perform basic operations
-on EHR data. This tool accepts tab-delimited text (.txt) files.
+on EHR data. This tool accepts tab-delimited text (.txt) files,
+which may be compressed with gzip or zstd.
 
-This script requires `datetime`, and contains the following
-classes and functions.
+This script requires `array`, `bisect`, `collections`,
+`concurrent.futures`, `contextlib`, `datetime`, `functools`, `gzip`,
+`hashlib`, `heapq`, `io`, `itertools`, `json`, `locale`, `math`, `mmap`,
+`operator`, `os`, `queue`, `struct`, `sys`, `tempfile`, `threading`,
+`time` and `typing`, and
+optionally `pyarrow`, `resource` and `zstandard`, and
+contains the following classes and functions.
 
 Classes
 -------
 Patient
 Lab
+LabRecord
+LabSummary
+LabSeries
+Admission
+Query
+QueryPlan
+Vocabulary
+LabVocabulary
+LabTable
+LabCursor
+LoadStats
+LabIndex
+LabCache
+LabFilter
+LabStore
+PatientView
 
 Functions
 ---------
@@ -18,13 +40,339 @@ remove_chars(variables: str) -> str:
 
 parse_data(
     patient_filename: str,
-    lab_filename: str
+    lab_filename: str,
+    table: Optional[LabTable],
+    workers: int,
+    use_mmap: bool,
+    cache_dir: Optional[str],
+    fast: bool,
+    vocabulary: Optional[LabVocabulary],
+    stats: Optional[LoadStats],
+    lab_filter: Optional[LabFilter]
 ) -> dict[str, Patient]:
     Parse and return laboratory test history for patients
+
+iter_patients(
+    patient_filename: str,
+    use_mmap: bool
+) -> Iterator[Patient]:
+    Yield patients one line at a time
+
+iter_labs(
+    lab_filename: str,
+    use_mmap: bool,
+    fast: bool,
+    vocabulary: Optional[LabVocabulary],
+    lab_filter: Optional[LabFilter]
+) -> Iterator[Union[Lab, LabRecord]]:
+    Yield laboratory tests one line at a time
+
+stream_data(
+    patient_filename: str,
+    lab_filename: str,
+    buffer_size: int,
+    use_mmap: bool,
+    lab_filter: Optional[LabFilter]
+) -> Iterator[dict[str, Patient]]:
+    Yield laboratory test history for patients in bounded batches
+
+sort_labs(
+    lab_filename: str,
+    sorted_filename: str,
+    run_size: int,
+    temp_dir: Optional[str],
+    fan_in: int
+) -> int:
+    Sort a lab .txt file by patient id and date and time in bounded memory
+
+stream_patients(
+    patient_filename: str,
+    lab_filename: str,
+    use_mmap: bool
+) -> Iterator[Patient]:
+    Yield patients one at a time from a lab file sorted by patient
+
+shard_of(
+    patient_id: str,
+    shards: int
+) -> int:
+    Return the shard of a patient in a dataset written by partition_data
+
+partition_data(
+    patient_filename: str,
+    lab_filename: str,
+    directory: str,
+    shards: int
+) -> dict[str, Any]:
+    Split patient and lab .txt files into shards by patient id
+
+ages_on(
+    births: Iterable[str],
+    on: Optional[Union[str, date, Iterable[Union[str, date]]]]
+) -> array:
+    Return the ages in whole years of many people on reference dates
+
+cohort_ages(
+    records: dict[str, Patient],
+    on: Optional[Union[str, date, Iterable[Union[str, date]]]]
+) -> array:
+    Return every patient's age on reference dates
+
+cohort_ages_first_visit(
+    records: dict[str, Patient]
+) -> array:
+    Return every patient's age at first admission
+
+cache_filename(
+    patient_filename: str,
+    lab_filename: str,
+    cache_dir: str
+) -> str:
+    Return the snapshot file used by parse_data for a pair of files
+
+write_snapshot(
+    snapshot_filename: str,
+    records: dict[str, Patient],
+    table: LabTable,
+    sources: Iterable[str],
+    fingerprints: Optional[list[dict[str, Any]]]
+) -> None:
+    Write patients and their laboratory tests to a binary snapshot
+
+read_snapshot(
+    snapshot_filename: str
+) -> Optional[tuple[dict[str, Patient], LabTable]]:
+    Read patients and their laboratory tests from a binary snapshot
+
+update_data(
+    records: dict[str, Patient],
+    lab_filename: str,
+    cursor: Optional[LabCursor],
+    table: Optional[LabTable]
+) -> LabCursor:
+    Parse laboratory tests appended to a lab .txt file since the cursor
+
+parse_lazy(
+    patient_filename: str,
+    lab_filename: str,
+    index_filename: Optional[str],
+    max_resident: Optional[int]
+) -> dict[str, Patient]:
+    Parse patients and read their laboratory tests on first access
+
+write_columnar(
+    directory: str,
+    records: dict[str, Patient],
+    table: Optional[LabTable],
+    file_format: str
+) -> None:
+    Write patients and their laboratory tests to columnar files
+
+read_columnar(
+    directory: str
+) -> tuple[dict[str, Patient], LabTable]:
+    Read patients and their laboratory tests from columnar files
+
+write_store(
+    store_filename: str,
+    records: dict[str, Patient],
+    table: Optional[LabTable]
+) -> None:
+    Write patients and their laboratory tests to a shared store file
 """
 
 
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import locale
+import mmap
+import os
+import queue
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
 from datetime import *
+from functools import lru_cache, partial
+from itertools import compress, groupby, islice, repeat
+from math import nan as NAN
+from operator import attrgetter, methodcaller
+from time import perf_counter
+from typing import (
+    Any,
+    AnyStr,
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Union,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+
+PATIENT_VARIABLES: tuple[str, ...] = (
+    "PatientID",
+    "PatientGender",
+    "PatientDateOfBirth",
+    "PatientRace",
+    "PatientMaritalStatus",
+    "PatientLanguage",
+    "PatientPopulationPercentageBelowPoverty",
+)
+
+LAB_VARIABLES: tuple[str, ...] = (
+    "PatientID",
+    "AdmissionID",
+    "LabName",
+    "LabValue",
+    "LabUnits",
+    "LabDateTime",
+)
+
+DEFAULT_BUFFER_SIZE: int = 100_000
+
+DEFAULT_CHUNK_SIZE: int = 64 * 2**20
+
+DEFAULT_RUN_SIZE: int = 1_000_000
+
+DEFAULT_FAN_IN: int = 64
+
+MANIFEST_FILENAME: str = "manifest.json"
+
+SNAPSHOT_MAGIC: bytes = b"EHRSNAP1"
+
+SNAPSHOT_SUFFIX: str = ".ehrsnap"
+
+CHECKSUM_WINDOW: int = 2**16
+
+INDEX_MAGIC: bytes = b"EHRIDX01"
+
+DEFAULT_MAX_RESIDENT: int = 10_000
+
+DATETIME_CACHE_SIZE: int = 2**16
+
+COLUMNAR_FORMATS: tuple[str, ...] = ("parquet", "feather", "snapshot")
+
+STORE_MAGIC: bytes = b"EHRSTOR2"
+
+GZIP_MAGIC: bytes = b"\x1f\x8b"
+
+ZSTD_MAGIC: bytes = b"\x28\xb5\x2f\xfd"
+
+DECOMPRESS_CHUNK_SIZE: int = 2**20
+
+DECOMPRESS_QUEUE_SIZE: int = 4
+
+PARTITION_BUFFER_SIZE: int = 32 * 2**20
+
+EPOCH: datetime = datetime(1970, 1, 1)
+
+QUERY_OPERATORS: tuple[str, ...] = (">", "<", ">=", "<=", "==", "between")
+
+DEMOGRAPHIC_ATTRIBUTES: tuple[str, ...] = ("gender", "race", "ms", "lang", "pbp")
+
+
+class _DecompressionThread(io.RawIOBase):
+    """
+    A readable stream whose data is decompressed in a background thread.
+
+    The thread reads DECOMPRESS_CHUNK_SIZE bytes at a time from a
+    decompressing stream into a queue of at most DECOMPRESS_QUEUE_SIZE
+    chunks, so decompression, which releases the GIL, overlaps with
+    splitting lines and building laboratory tests.
+    """
+
+    def __init__(self, stream: BinaryIO, raw: BinaryIO) -> None:
+        """
+        Start decompressing stream in a background thread.
+
+        Arguments
+        ---------
+        stream -- a decompressing binary stream
+
+        raw -- the compressed binary file that stream reads from
+
+        Return
+        -------
+        None
+        """
+        super().__init__()
+        self._stream = stream  # O(1)
+        self._raw = raw  # O(1)
+        self._queue: "queue.Queue[Union[bytes, BaseException]]" = (
+            queue.Queue(DECOMPRESS_QUEUE_SIZE)
+        )  # O(1)
+        self._pending = memoryview(b"")  # O(1)
+        self._done = False  # O(1)
+        self._stop = threading.Event()  # O(1)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()  # O(1)
+
+    def _run(self) -> None:
+        """Decompress chunks into the queue until the end of stream."""
+        try:
+            while not self._stop.is_set():  # O(b)
+                chunk = self._stream.read(DECOMPRESS_CHUNK_SIZE)  # O(1)
+                self._put(chunk)  # O(1)
+                if not chunk:  # O(1)
+                    return
+        except BaseException as error:
+            self._put(error)  # O(1)
+
+    def _put(self, item: Union[bytes, BaseException]) -> None:
+        """Put item in the queue unless the stream is closed first."""
+        while not self._stop.is_set():  # O(1)
+            try:
+                self._queue.put(item, timeout=0.1)  # O(1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        """Return True, as the stream can be read."""
+        return True  # O(1)
+
+    def readinto(self, buffer: Any) -> int:
+        """Read decompressed bytes into buffer and return their number."""
+        if not self._pending:  # O(1)
+            if self._done:  # O(1)
+                return 0  # O(1)
+            item = self._queue.get()  # O(1)
+            if isinstance(item, BaseException):  # O(1)
+                raise item
+            if not item:  # O(1)
+                self._done = True  # O(1)
+                return 0  # O(1)
+            self._pending = memoryview(item)  # O(1)
+        count = min(len(buffer), len(self._pending))  # O(1)
+        buffer[:count] = self._pending[:count]  # O(n)
+        self._pending = self._pending[count:]  # O(1)
+        return count  # O(1)
+
+    def close(self) -> None:
+        """Stop the background thread and close the files."""
+        if not self.closed:  # O(1)
+            self._stop.set()  # O(1)
+            self._thread.join()  # O(1)
+            self._stream.close()  # O(1)
+            self._raw.close()  # O(1)
+        super().close()  # O(1)
 
 
 class Lab:
@@ -80,6 +428,11 @@ class Lab:
 
     date_time
         The laboratory test's date and time property.
+
+    timestamp
+        The laboratory test's parsed date and time property. Recently
+        parsed date and time strings are cached by _cached_datetime,
+        outside of the instance.
     """
 
     def __init__(
@@ -188,297 +541,582 @@ class Lab:
         else:
             raise ValueError('"date_time" must be a string')
 
+    @property
+    def timestamp(self) -> datetime:
+        """The laboratory test's parsed date and time property."""
+        return _cached_datetime(self._date_time)  # O(1)
+
 
-class Patient:
+class LabRecord(NamedTuple):
     """
-    A class to represent a patient.
+    A lightweight, immutable record of a laboratory test.
+
+    LabRecord has the same attributes as the Lab class but is a tuple,
+    so it has no per-instance dictionary and no validation on each
+    attribute. parse_data emits it when fast is True, after checking
+    once that every column is present.
 
     Attributes
     ----------
-    id -- a string denoting the patient's id
-    gender -- a string denoting the patient's gender
-    dob -- a string denoting the patient's date and time
-        of birth
-    ms -- a string denoting the patient's marital status
-    race -- a string denoting the patient's race
-    lang -- a string denoting the patient's primary language
-    pbp -- a string denoting the patient's community percentage
-        below the poverty line
-    labs -- a list of instances of the Lab class, where each
-        instance denotes a laboratory test for the patient
+    patient_id -- a string denoting the patient's id
+    admission_id -- a string denoting the patient's
+        admission id
+    name -- a string denoting the laboratory test's name
+    value -- a string denoting the laboratory test's value
+    units -- a string denoting the laboratory test's units
+    date_time -- a string denoting the laboratory test's
+        date and time
 
     Methods
     -------
-    __init__(self, id, gender, dob, marital_status, race,
-        language, percent_below_poverty)
-        Construct all attributes for Patient class.
+    timestamp
+        The laboratory test's parsed date and time property, parsed on
+        each access.
+    """
 
-        Arguments
-        ---------
-        id -- a string denoting the patient's id
-        gender -- a string denoting the patient's gender
-        dob -- a string denoting the patient's date and time
-            of birth
-        marital_status -- a string denoting the patient's marital
-            status
-        race -- a string denoting the patient's race
-        language -- a string denoting the patient's primary language
-        percent_below_poverty -- a string denoting the patient's
-            community percentage below the poverty lined
+    patient_id: str
+    admission_id: str
+    name: str
+    value: str
+    units: str
+    date_time: str
 
-        Return
-        ------
-        None
+    @property
+    def timestamp(self) -> datetime:
+        """The laboratory test's parsed date and time property."""
+        return _parse_datetime(self.date_time)  # O(1)
 
-    id
-        The patient's ID property.
 
-    gender
-        The patient's gender property.
+class LabSummary(NamedTuple):
+    """
+    Summary statistics of one patient's values for one laboratory test.
 
-    dob
-        The patient's date of birth property.
+    Attributes
+    ----------
+    count -- an integer denoting the number of laboratory tests
+    value_count -- an integer denoting the number of laboratory tests
+        with a numeric value
+    min_value -- a float denoting the smallest numeric value, or None
+        if no numeric value was recorded
+    max_value -- a float denoting the largest numeric value, or None
+        if no numeric value was recorded
+    mean -- a float denoting the mean of the numeric values, or None
+        if no numeric value was recorded
+    last_value -- a float denoting the numeric value of the latest
+        laboratory test with one, or None if no numeric value was
+        recorded
+    earliest -- a string denoting the earliest date and time the
+        laboratory test was taken
+    latest -- a string denoting the latest date and time the
+        laboratory test was taken
+    """
 
-    ms
-        The patient's marital status property.
+    count: int
+    value_count: int
+    min_value: Optional[float]
+    max_value: Optional[float]
+    mean: Optional[float]
+    last_value: Optional[float]
+    earliest: str
+    latest: str
 
-    race
-        The patient's race property.
 
-    lang
-        The patient's language property.
+class LabSeries:
+    """
+    A class to index one patient's values for one laboratory test.
 
-    pbp
-        The patient's community poverty percent property.
+    The series is built in one pass from the laboratory tests, sorted
+    once by date and time.
 
-    get_labs(self)
-        Return the laboratory test history for the patient.
+    Attributes
+    ----------
+    name -- a string denoting the laboratory test's name
+    values -- a list of floats denoting the numeric values recorded
+        for the laboratory test, sorted by date and time and parsed on
+        access
+    value_count -- an integer denoting the number of laboratory tests
+        with a numeric value
+    min_value -- a float denoting the smallest recorded value, or
+        None if no numeric value was recorded
+    max_value -- a float denoting the largest recorded value, or
+        None if no numeric value was recorded
+    dates -- a list of strings denoting the dates and times the
+        laboratory test was taken, sorted in ascending order
+    labs -- a list of instances of the Lab class, sorted by date
+        and time in the same order as dates
+    earliest -- a string denoting the earliest date and time the
+        laboratory test was taken, or None if no test was added
+    total -- a float denoting the sum of the numeric values
+    last_value -- a float denoting the numeric value of the latest
+        laboratory test with one, or None if no numeric value was
+        recorded
+
+    Methods
+    -------
+    __init__(self, name, labs=())
+        Construct all attributes for LabSeries class.
+
+        Time Complexity
+        ---------------
+        O(N log N) total, O(N) when labs arrive in date order
+        N - number of laboratory tests in the series
+
+    summary(self)
+        Return the series' summary statistics.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+    between(self, start, end)
+        Return the laboratory tests taken from start to end inclusive.
+
+        Time Complexity
+        ---------------
+        O(log N + K) total
+        N - number of laboratory tests in the series
+        K - number of laboratory tests returned
+
+    last_before(self, when)
+        Return the latest laboratory test taken before when.
+
+        Time Complexity
+        ---------------
+        O(log N) total
+        N - number of laboratory tests in the series
+    """
+
+    def __init__(self, name: str, labs: Iterable[Lab] = ()) -> None:
+        """
+        Construct all attributes for LabSeries class.
+
+        The laboratory tests are sorted once by date and time, with ties
+        kept in the order given. Values that cannot be parsed as floats
+        are not counted.
+
+        Time Complexity
+        ---------------
+        O(N log N) total, O(N) when labs arrive in date order
+        N - number of laboratory tests in the series
 
         Arguments
         ---------
-        None
+        name -- a string denoting the laboratory test's name
+
+        labs -- instances of the Lab class with the series' name
 
         Return
-        ------
-        list[Lab]
-            instances of the Lab class, where each instance
-            is a recorded laboratory test for the patient
+        -------
+        None
+        """
+        self.name = name  # O(1)
+        self.labs: list[Lab] = sorted(
+            labs, key=attrgetter("date_time")
+        )  # O(n log n)
+        self.dates: list[str] = list(
+            map(attrgetter("date_time"), self.labs)
+        )  # O(n)
+        self.value_count = 0  # O(1)
+        self.min_value: Optional[float] = None  # O(1)
+        self.max_value: Optional[float] = None  # O(1)
+        self.total = 0.0  # O(1)
+        self.last_value: Optional[float] = None  # O(1)
+
+        for lab in self.labs:  # O(n)
+            try:
+                value = float(lab.value)  # O(1)
+            except ValueError:
+                continue
+
+            self.value_count += 1  # O(1)
+            self.total += value  # O(1)
+            if self.min_value is None or value < self.min_value:  # O(1)
+                self.min_value = value  # O(1)
+            if self.max_value is None or value > self.max_value:  # O(1)
+                self.max_value = value  # O(1)
+            self.last_value = value  # O(1)
 
-    add_lab(self, lab)
-        Add lab to patient's laboratory test history.
+    @property
+    def earliest(self) -> Optional[str]:
+        """The earliest date and time the laboratory test was taken."""
+        return self.dates[0] if self.dates else None  # O(1)
+
+    @property
+    def values(self) -> list[float]:
+        """The numeric values of the series, sorted by date and time."""
+        values = []  # O(1)
+        for lab in self.labs:  # O(n)
+            try:
+                values.append(float(lab.value))  # O(1)
+            except ValueError:
+                continue
+        return values  # O(1)
+
+    def summary(self) -> LabSummary:
+        """
+        Return the series' summary statistics.
+
+        The statistics are computed when the series is built, so no
+        laboratory test is visited again.
+
+        Time Complexity
+        ---------------
+        O(1) total
 
         Arguments
         ---------
-        lab -- an instance of the Lab class denoting one lab
-        taken by the patient
+        None
 
         Return
         ------
-        None
+        LabSummary
+            the count, extrema, mean, last value and date range of the
+            laboratory test
+        """
+        value_count = self.value_count  # O(1)
+        return LabSummary(
+            len(self.labs),
+            value_count,
+            self.min_value,
+            self.max_value,
+            self.total / value_count if value_count else None,
+            self.last_value,
+            self.dates[0],
+            self.dates[-1],
+        )  # O(1)
 
-    age
-        The patient's age property.
+    def between(
+        self, start: Union[str, datetime], end: Union[str, datetime]
+    ) -> list[Lab]:
+        """
+        Return the laboratory tests taken from start to end inclusive.
 
         Time Complexity
         ---------------
-        O(1) total - All statements involve either indexing,
-        variable assignment, variable state updates, or logical
-        comparisons. Hence, all operations are in O(1) time.
-
-        Assumptions
-        -----------
-        1.  All entries for patient date of birth are strings of a fixed
-            length.
+        O(log N + K) total
+        N - number of laboratory tests in the series
+        K - number of laboratory tests returned
 
         Arguments
         ---------
-        None
+        start -- a datetime, or a string formatted as the laboratory
+            tests' dates and times, denoting the start of the range
+
+        end -- a datetime, or a string formatted as the laboratory
+            tests' dates and times, denoting the end of the range
 
         Return
-        -------
-        int
-            the patient's current age
+        ------
+        list[Lab]
+            the laboratory tests in the range, sorted by date and time
+        """
+        low = bisect_left(self.dates, _date_key(start, True))  # O(log n)
+        high = bisect_right(self.dates, _date_key(end))  # O(log n)
+        return self.labs[low:high]  # O(k)
 
-    age_first_visit(self) -> int:
-        Return the patient's age at first admission.
+    def last_before(self, when: Union[str, datetime]) -> Optional[Lab]:
+        """
+        Return the latest laboratory test taken before when.
 
         Time Complexity
         ---------------
-        O(N) total
-        N - number of laboratory tests taken by the patient
-
-        Assumptions
-        -----------
-        1.  All entries for patient date of birth are strings of a fixed
-            length.
-        2.  All entries for patient date and time of admission are strings
-            of a fixed length.
+        O(log N) total
+        N - number of laboratory tests in the series
 
         Arguments
         ---------
-        None
+        when -- a datetime, or a string formatted as the laboratory
+            tests' dates and times
 
         Return
-        -------
-        int
-            the patient's age at first admission
+        ------
+        Lab or None
+            the latest laboratory test strictly before when, or None if
+            there is none
+        """
+        idx = bisect_left(self.dates, _date_key(when, True))  # O(log n)
+        return self.labs[idx - 1] if idx else None  # O(1)
 
-    is_sick(self, lab_name, operator, value)
-        Return the patient's history of illness for a laboratory test.
+
+class Admission:
+    """
+    A class to index one patient's laboratory tests in one admission.
+
+    The admission keeps only its laboratory tests and date range; its
+    per-name series are derived from the patient's, restricted to the
+    admission's date range.
+
+    Attributes
+    ----------
+    id -- a string denoting the admission id
+    labs -- a list of instances of the Lab class taken during the
+        admission, in the order they were added
+    first -- a string denoting the earliest date and time of a
+        laboratory test in the admission
+    last -- a string denoting the latest date and time of a
+        laboratory test in the admission
+
+    Methods
+    -------
+    __init__(self, id, series_of=None)
+        Construct all attributes for Admission class.
+
+    add(self, lab)
+        Add one laboratory test to the admission.
 
         Time Complexity
         ---------------
-        O(N) total
-        N - number of records for a laboratory test taken by the patient
+        O(1) total
 
-        Assumptions
-        -----------
-        1.  All arguments are positional and lack of adherence to order
-            indicated in function definition generates errors.
-        2.  Only operators passed as arguments include > and <
+    get_series(self, lab_name)
+        Return the admission's indexed values for one laboratory test.
 
-        Arguments
-        ---------
-        lab_name -- a string denoting the name of a laboratory test
+        Time Complexity
+        ---------------
+        O(log N + K) total
+        N - number of the patient's records for the laboratory test
+        K - number of those records in the admission's date range
 
-        operator -- a string denoting a comparison operator: > or <
+    first_lab(self, lab_name)
+        Return the admission's earliest laboratory test of one name.
 
-        value -- a float denoting a value for a laboratory test to
-            assess the patient's history of illness
+        Time Complexity
+        ---------------
+        O(log N + K) total
+        N - number of the patient's records for the laboratory test
+        K - number of those records in the admission's date range
 
-        Return
-        -------
-        bool
-            the patient's history of illness for a laboratory test: True
-            if the patient's recorded value is greater than or less than
-            value, and False if otherwise
+    length_of_stay
+        The admission's length of stay property, approximated by the
+        time between its first and last laboratory tests.
     """
 
     def __init__(
         self,
         id: str,
-        gender: str,
-        dob: str,
-        race: str,
-        marital_status: str,
-        language: str,
-        percent_below_poverty: str,
+        series_of: Optional[Callable[[str], Optional[LabSeries]]] = None,
     ) -> None:
         """
-        Construct all attributes for Patient class.
+        Construct all attributes for Admission class.
 
         Arguments
         ---------
-        id -- a string denoting the patient's id
-        gender -- a string denoting the patient's gender
-        dob -- a string denoting the patient's date and time
-            of birth
-        marital_status -- a string denoting the patient's marital
-            status
-        race -- a string denoting the patient's race
-        language -- a string denoting the patient's primary language
-        percent_below_poverty -- a string denoting the patient's
-            community percentage below the poverty line
+        id -- a string denoting the admission id
+
+        series_of -- a callable returning the patient's LabSeries for a
+            laboratory test name, or None to index the admission's own
+            laboratory tests on demand
 
         Return
-        ------
+        -------
         None
         """
         self.id = id  # O(1)
-        self.gender = gender  # O(1)
-        self.dob = dob  # O(1)
-        self.race = race  # O(1)
-        self.ms = marital_status  # O(1)
-        self.lang = language  # O(1)
-        self.pbp = percent_below_poverty  # O(1)
         self.labs: list[Lab] = []  # O(1)
+        self.first: Optional[str] = None  # O(1)
+        self.last: Optional[str] = None  # O(1)
+        self._series_of = series_of  # O(1)
 
-    @property
-    def id(self) -> str:
-        """The patient's ID property."""
-        return self._id  # O(1)
+    def add(self, lab: Lab) -> None:
+        """
+        Add one laboratory test to the admission.
 
-    @id.setter
-    def id(self, id: str) -> None:
-        if isinstance(id, str):
-            self._id = id
-        else:
-            raise ValueError('"id" must be a string')
+        Time Complexity
+        ---------------
+        O(1) total
 
-    @property
-    def gender(self) -> str:
-        """The patient's gender property."""
-        return self._gender  # O(1)
+        Arguments
+        ---------
+        lab -- an instance of the Lab class with the admission's id
 
-    @gender.setter
-    def gender(self, gender: str) -> None:
-        if isinstance(gender, str):
-            self._gender = gender
-        else:
-            raise ValueError('"gender" must be a string')
+        Return
+        ------
+        None
+        """
+        self.labs.append(lab)  # O(1)
+        if self.first is None or lab.date_time < self.first:  # O(1)
+            self.first = lab.date_time  # O(1)
+        if self.last is None or lab.date_time > self.last:  # O(1)
+            self.last = lab.date_time  # O(1)
 
-    @property
-    def dob(self) -> str:
-        """The patient's date of birth property."""
-        return self._dob  # O(1)
+    def _window(self, lab_name: str) -> Iterator[Lab]:
+        """
+        Yield the admission's laboratory tests of one name by date.
 
-    @dob.setter
-    def dob(self, dob: str) -> None:
-        if isinstance(dob, str):
-            self._dob = dob
-        else:
-            raise ValueError('"dob" must be a string')
+        The patient's series for lab_name is bisected to the admission's
+        date range, so only the records in that range are visited.
 
-    @property
-    def race(self) -> str:
-        """The patient's race property."""
-        return self._race  # O(1)
+        Time Complexity
+        ---------------
+        O(log N + K) total
+        N - number of the patient's records for the laboratory test
+        K - number of those records in the admission's date range
 
-    @race.setter
-    def race(self, race: str) -> None:
-        if isinstance(race, str):
-            self._race = race
-        else:
-            raise ValueError('"race" must be a string')
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
 
-    @property
-    def ms(self) -> str:
-        """The patient's marital status property."""
-        return self._ms  # O(1)
+        Return
+        ------
+        Iterator[Lab]
+            the admission's laboratory tests of lab_name, sorted by date
+            and time
+        """
+        if self._series_of is None:  # O(1)
+            labs = [lab for lab in self.labs if lab.name == lab_name]  # O(l)
+            return iter(LabSeries(lab_name, labs).labs)  # O(l log l)
+
+        series = self._series_of(lab_name)  # O(1) once indexed
+        if series is None or self.first is None:  # O(1)
+            return iter(())  # O(1)
+        low = bisect_left(series.dates, self.first)  # O(log n)
+        high = bisect_right(series.dates, self.last)  # O(log n)
+        admission_id = self.id  # O(1)
+        return (
+            lab
+            for lab in islice(series.labs, low, high)
+            if lab.admission_id == admission_id
+        )  # O(k)
+
+    def get_series(self, lab_name: str) -> Optional[LabSeries]:
+        """
+        Return the admission's indexed values for one laboratory test.
 
-    @ms.setter
-    def ms(self, marital_status: str) -> None:
-        if isinstance(marital_status, str):
-            self._ms = marital_status
-        else:
-            raise ValueError('"marital_status" must be a string')
+        The series is built on each call from the admission's window of
+        the patient's series.
 
-    @property
-    def lang(self) -> str:
-        """The patient's language property."""
-        return self._lang  # O(1)
+        Time Complexity
+        ---------------
+        O(log N + K) total
+        N - number of the patient's records for the laboratory test
+        K - number of those records in the admission's date range
 
-    @lang.setter
-    def lang(self, language: str) -> None:
-        if isinstance(language, str):
-            self._lang = language
-        else:
-            raise ValueError('"language" must be a string')
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
 
-    @property
-    def pbp(self) -> str:
-        """The patient's community poverty percent property."""
-        return self._pbp  # O(1)
+        Return
+        ------
+        LabSeries or None
+            the admission's indexed values for the laboratory test, or
+            None if the test was not taken during the admission
+        """
+        series = LabSeries(lab_name, self._window(lab_name))  # O(log n + k)
+        return series if series.labs else None  # O(1)
 
-    @pbp.setter
-    def pbp(self, pbp: str) -> None:
-        if isinstance(pbp, str):
-            self._pbp = pbp
-        else:
-            raise ValueError('"pbp" must be a string')
+    def first_lab(self, lab_name: str) -> Optional[Lab]:
+        """
+        Return the admission's earliest laboratory test of one name.
 
-    def get_labs(self) -> list[Lab]:
+        Time Complexity
+        ---------------
+        O(log N + K) total
+        N - number of the patient's records for the laboratory test
+        K - number of those records in the admission's date range
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        Return
+        ------
+        Lab or None
+            the earliest laboratory test of lab_name in the admission, or
+            None if the test was not taken during the admission
+        """
+        return next(self._window(lab_name), None)  # O(log n + k)
+
+    @property
+    def length_of_stay(self) -> timedelta:
+        """
+        The admission's length of stay property.
+
+        Return
+        ------
+        timedelta
+            the time from the first to the last laboratory test, or zero
+            if the admission has no laboratory tests
         """
+        if self.first is None or self.last is None:  # O(1)
+            return timedelta(0)  # O(1)
+        return _parse_datetime(self.last) - _parse_datetime(self.first)
+
+
+class Patient:
+    """
+    A class to represent a patient.
+
+    Attributes
+    ----------
+    id -- a string denoting the patient's id
+    gender -- a string denoting the patient's gender
+    dob -- a string denoting the patient's date and time
+        of birth
+    ms -- a string denoting the patient's marital status
+    race -- a string denoting the patient's race
+    lang -- a string denoting the patient's primary language
+    pbp -- a string denoting the patient's community percentage
+        below the poverty line
+    labs -- a list of instances of the Lab class, where each
+        instance denotes a laboratory test for the patient
+
+    Laboratory tests must be added with add_lab. The index of LabSeries
+    keyed by laboratory test name is built by sorting the laboratory
+    tests once, on the first query after they change.
+
+    Methods
+    -------
+    __init__(self, id, gender, dob, marital_status, race,
+        language, percent_below_poverty)
+        Construct all attributes for Patient class.
+
+        Arguments
+        ---------
+        id -- a string denoting the patient's id
+        gender -- a string denoting the patient's gender
+        dob -- a string denoting the patient's date and time
+            of birth
+        marital_status -- a string denoting the patient's marital
+            status
+        race -- a string denoting the patient's race
+        language -- a string denoting the patient's primary language
+        percent_below_poverty -- a string denoting the patient's
+            community percentage below the poverty lined
+
+        Return
+        ------
+        None
+
+    id
+        The patient's ID property.
+
+    gender
+        The patient's gender property.
+
+    dob
+        The patient's date of birth property.
+
+    dob_datetime
+        The patient's parsed date of birth property, parsed once and
+        cached until dob changes.
+
+    first_visit
+        The patient's first visit property, the date and time of the
+        earliest laboratory test maintained by add_lab.
+
+    ms
+        The patient's marital status property.
+
+    race
+        The patient's race property.
+
+    lang
+        The patient's language property.
+
+    pbp
+        The patient's community poverty percent property.
+
+    get_labs(self)
         Return the laboratory test history for the patient.
 
         Arguments
@@ -490,13 +1128,38 @@ class Patient:
         list[Lab]
             instances of the Lab class, where each instance
             is a recorded laboratory test for the patient
-        """
-        return self.labs  # O(1)
 
-    def add_lab(self, lab: Lab) -> None:
-        """
+    set_lab_source(self, source)
+        Defer loading the laboratory test history until first access.
+
+        Arguments
+        ---------
+        source -- a callable returning the instances of the Lab class
+            for the patient
+
+        Return
+        ------
+        None
+
+    unload_labs(self, source)
+        Drop the laboratory test history until the next access.
+
+        Arguments
+        ---------
+        source -- a callable returning the instances of the Lab class
+            for the patient
+
+        Return
+        ------
+        None
+
+    add_lab(self, lab)
         Add lab to patient's laboratory test history.
 
+        Time Complexity
+        ---------------
+        O(1) total
+
         Arguments
         ---------
         lab -- an instance of the Lab class denoting one lab
@@ -505,13 +1168,10 @@ class Patient:
         Return
         ------
         None
-        """
-        self.get_labs().append(lab)  # O(1)
 
-    @property
-    def age(self) -> int:
-        """
-        The patient's age property.
+    age
+        The patient's age property, cached until the date of birth
+        or the current date changes.
 
         Time Complexity
         ---------------
@@ -532,73 +1192,106 @@ class Patient:
         -------
         int
             the patient's current age
-        """
-        dob = self.dob  # O(1)
-        dob_date = datetime.strptime(dob, "%Y-%m-%d %H:%M:%S.%f")  # O(1)
-        today = date.today()  # O(1)
-        age = today.year - dob_date.year  # O(1)
-
-        if (today.month < dob_date.month) or (
-            today.month == dob_date.month and today.day < dob_date.day
-        ):  # O(1)
-            age -= 1  # O(1)
 
-        return int(age)  # O(1)
-
-    def age_first_visit(self) -> int:
-        """
-        Return the patient's age at first admission.
+    get_series(self, lab_name)
+        Return the indexed values for one laboratory test.
 
         Time Complexity
         ---------------
-        O(N) total
-        N - number of laboratory tests taken by the patient
-
-        Assumptions
-        -----------
-        1.  All entries for patient date of birth are strings of a fixed
-            length.
-        2.  All entries for patient date and time of admission are strings
-            of a fixed length.
+        O(L log L) on the first query after labs are added, O(1)
+        afterwards
+        L - number of laboratory tests of the patient
 
         Arguments
         ---------
-        None
+        lab_name -- a string denoting the name of a laboratory test
 
         Return
-        -------
-        int
-            the patient's age at first admission
-        """
-        dob = self.dob  # O(1)
-        dob_date = datetime.strptime(dob, "%Y-%m-%d %H:%M:%S.%f")  # O(1)
-        lab_dates: list[str] = []  # O(1)
-        labs = self.get_labs()[:]  # O(n)
-        for lab in labs:  # O(n)
-            lab_dates.append(lab.date_time)
+        ------
+        LabSeries or None
+            the patient's indexed values for the laboratory test, or
+            None if the patient never took the test
 
-        first_visit_string = min(lab_dates)  # O(n)
-        first_visit_date = datetime.strptime(
-            first_visit_string, "%Y-%m-%d %H:%M:%S.%f"
-        )  # O(1)
-        age = first_visit_date.year - dob_date.year  # O(1)
+    get_summary(self, lab_name)
+        Return the summary statistics for one laboratory test.
 
-        if (first_visit_date.month < dob_date.month) or (
-            first_visit_date.month == dob_date.month
-            and first_visit_date.day < dob_date.day
-        ):  # O(1)
-            age -= 1  # O(1)
+        Time Complexity
+        ---------------
+        O(1) total once the series are indexed
 
-        return int(age)  # O(1)
+    get_summaries(self)
+        Return the summary statistics for every laboratory test.
 
-    def is_sick(self, lab_name: str, operator: str, value: float) -> bool:
-        """
-        Return the patient's history of illness for a laboratory test.
+        Time Complexity
+        ---------------
+        O(T) total once the series are indexed
+        T - number of distinct laboratory tests taken by the patient
+
+    get_admission(self, admission_id)
+        Return the patient's laboratory tests in one admission.
 
         Time Complexity
         ---------------
-        O(N) total
-        N - number of records for a laboratory test taken by the patient
+        O(1) total
+
+    get_admissions(self)
+        Return the patient's admissions in order of their first test.
+
+        Time Complexity
+        ---------------
+        O(A log A) total
+        A - number of admissions of the patient
+
+    labs_between(self, lab_name, start, end)
+        Return the patient's laboratory tests of one name in a time range.
+
+        Time Complexity
+        ---------------
+        O(log N + K) total
+        N - number of records for the laboratory test
+        K - number of laboratory tests returned
+
+    last_before(self, lab_name, when)
+        Return the patient's latest laboratory test of one name before when.
+
+        Time Complexity
+        ---------------
+        O(log N) total
+        N - number of records for the laboratory test
+
+    age_first_visit(self) -> int:
+        Return the patient's age at first admission, cached until the
+        date of birth or the earliest laboratory test changes.
+
+        Time Complexity
+        ---------------
+        O(1) total - the earliest laboratory test date and time is
+        maintained by add_lab.
+
+        Assumptions
+        -----------
+        1.  All entries for patient date of birth are strings of a fixed
+            length.
+        2.  All entries for patient date and time of admission are strings
+            of a fixed length.
+
+        Arguments
+        ---------
+        None
+
+        Return
+        -------
+        int
+            the patient's age at first admission
+
+    is_sick(self, lab_name, operator, value)
+        Return the patient's history of illness for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(1) total once the series are indexed - the minimum and maximum
+        of each laboratory test are computed when its LabSeries is
+        built, on the first query after labs are added.
 
         Assumptions
         -----------
@@ -620,171 +1313,6111 @@ class Patient:
         bool
             the patient's history of illness for a laboratory test: True
             if the patient's recorded value is greater than or less than
-            value, and False if otherwise
+            value, and False if otherwise or if the patient never took
+            the laboratory test
+    """
+
+    def __init__(
+        self,
+        id: str,
+        gender: str,
+        dob: str,
+        race: str,
+        marital_status: str,
+        language: str,
+        percent_below_poverty: str,
+    ) -> None:
         """
-        operator_table = {
-            ">": lambda x, y: x > y,
-            "<": lambda x, y: x < y,
-        }  # O(1)
+        Construct all attributes for Patient class.
 
-        lab_values: list[float] = []  # O(1)
-        labs = self.get_labs()[:]  # O(n)
-        for lab in labs:  # O(n)
-            if lab.name == lab_name:  # O(1)
-                lab_values.append(float(lab.value))  # O(1)
+        Arguments
+        ---------
+        id -- a string denoting the patient's id
+        gender -- a string denoting the patient's gender
+        dob -- a string denoting the patient's date and time
+            of birth
+        marital_status -- a string denoting the patient's marital
+            status
+        race -- a string denoting the patient's race
+        language -- a string denoting the patient's primary language
+        percent_below_poverty -- a string denoting the patient's
+            community percentage below the poverty line
 
-        comparison = operator_table[operator]  # O(1)
+        Return
+        ------
+        None
+        """
+        self.id = id  # O(1)
+        self.gender = gender  # O(1)
+        self.dob = dob  # O(1)
+        self.race = race  # O(1)
+        self.ms = marital_status  # O(1)
+        self.lang = language  # O(1)
+        self.pbp = percent_below_poverty  # O(1)
+        self.labs: list[Lab] = []  # O(1)
+        self._lab_index: Optional[dict[str, LabSeries]] = None  # O(1)
+        self._admissions: dict[str, Admission] = {}  # O(1)
+        self._first_visit: Optional[str] = None  # O(1)
+        self._lab_source: Optional[Callable[[], Iterable[Lab]]] = None
+        self._lab_cache: Optional[LabCache] = None  # O(1)
 
-        if operator == ">":  # O(1)
-            max_value = max(lab_values)  # O(n)
-            if comparison(max_value, value):  # type: ignore
-                return True  # O(1)
+    @property
+    def id(self) -> str:
+        """The patient's ID property."""
+        return self._id  # O(1)
 
-        if operator == "<":  # O(1)
-            min_value = min(lab_values)  # O(n)
-            if comparison(min_value, value):  # type: ignore
-                return True  # O(1)
-        return False  # O(1)
+    @id.setter
+    def id(self, id: str) -> None:
+        if isinstance(id, str):
+            self._id = id
+        else:
+            raise ValueError('"id" must be a string')
 
+    @property
+    def gender(self) -> str:
+        """The patient's gender property."""
+        return self._gender  # O(1)
 
-def remove_chars(variables: str) -> str:
-    """Trim BOM from first line of .txt file.
+    @gender.setter
+    def gender(self, gender: str) -> None:
+        if isinstance(gender, str):
+            self._gender = gender
+        else:
+            raise ValueError('"gender" must be a string')
 
-    Time Complexity
-    ---------------
-    O(N) total
-    N - number of times the character sequence "ï»¿"
-        is replaced with "" to create a new string
+    @property
+    def dob(self) -> str:
+        """The patient's date of birth property."""
+        return self._dob  # O(1)
 
-    Arguments
-    ---------
-    variables -- a string denoting the variables
-        from the first line of a .txt file
+    @dob.setter
+    def dob(self, dob: str) -> None:
+        if isinstance(dob, str):
+            self._dob = dob
+            self._dob_datetime: Optional[datetime] = None
+            self._age: Optional[tuple[date, int]] = None
+            self._first_visit_age: Optional[tuple[str, int]] = None
+        else:
+            raise ValueError('"dob" must be a string')
 
-    Return
-    -------
-    str
-        trimmed variables from the first line of a .txt file
-    """
-    trimmed_variables = variables.replace("ï»¿", "")  # O(n)
-    return trimmed_variables  # O(1)
+    @property
+    def dob_datetime(self) -> datetime:
+        """The patient's parsed date of birth property."""
+        if self._dob_datetime is None:  # O(1)
+            self._dob_datetime = _parse_datetime(self._dob)  # O(1)
+        return self._dob_datetime  # O(1)
 
 
-def parse_data(patient_filename: str, lab_filename: str) -> dict[str, Patient]:
-    """
-    Parse and return lab test history for patients.
+    @property
+    def first_visit(self) -> Optional[str]:
+        """
+        The patient's first visit property.
 
-    Time Complexity
-    ---------------
-    O(QR+ST) total
-    Q - number of lines in the patient_filename .txt file
-    R - number of columns per line in the patient_filename
-        .txt file
-    S - number of lines in the labs_filename .txt file
-    T - number of columns per line in the labs_filename
-        .txt file
+        Time Complexity
+        ---------------
+        O(1) total once the laboratory tests are loaded - the earliest
+        laboratory test date and time is maintained by add_lab.
 
-    Assumptions
-    -----------
-    1.  All arguments are positional and lack of adherence to order
-        indicated in function definition generates errors.
-    2.  Only input is tab-delimited .txt files.
-    3.  All patient and corresponding lab history files contain same columns.
-    4.  The number of lines in labs_filename .txt file will be greater than
-        or equal to the number of lines in patient_filename (S >= Q).
+        Return
+        ------
+        str or None
+            the date and time of the patient's earliest laboratory test,
+            or None if the patient has no laboratory tests
+        """
+        self.get_labs()  # O(1) once loaded
+        return self._first_visit  # O(1)
+    @property
+    def race(self) -> str:
+        """The patient's race property."""
+        return self._race  # O(1)
 
-    Arguments
-    ---------
-    patient_filename --  a string denoting the .txt file with the information
-        for the patients (patient ID, gender, date of birth, race, marital
-        status, language, community percentage below poverty)
+    @race.setter
+    def race(self, race: str) -> None:
+        if isinstance(race, str):
+            self._race = race
+        else:
+            raise ValueError('"race" must be a string')
 
-    lab_filename -- a string denoting the lab history information the
-        patients (patient ID, admission ID, test name, test value, test units,
-        test date and time)
+    @property
+    def ms(self) -> str:
+        """The patient's marital status property."""
+        return self._ms  # O(1)
 
-    Return
-    -------
-    dict[str, PATIENT]
-        each key is a patient's unique ID and each value is an instance of the
-        Patient class with all the laboratory test history for that patient
-    """
-    patient_infile = open(patient_filename, "r")  # O(1)
-    patient_variables = patient_infile.readline()  # O(1)
-    patient_variables = remove_chars(patient_variables)  # O(r)
-    patient_vars_list = patient_variables.split("\t")  # O(r)
-    patient_vars_list[-1] = patient_vars_list[
-        -1
-    ].strip()  # trim last variable O(1)
-
-    patient_id_idx = patient_vars_list.index("PatientID")  # O(r)
-    patient_gender_idx = patient_vars_list.index("PatientGender")  # O(r)
-    patient_dob_idx = patient_vars_list.index("PatientDateOfBirth")  # O(r)
-    patient_race_idx = patient_vars_list.index("PatientRace")  # O(r)
-    patient_ms_idx = patient_vars_list.index("PatientMaritalStatus")  # O(r)
-    patient_lang_idx = patient_vars_list.index("PatientLanguage")  # O(r)
-    patient_pbp_idx = patient_vars_list.index(
-        "PatientPopulationPercentageBelowPoverty"  # fmt: ignore
-    )  # O(r)
-
-    patients = patient_infile.readlines()  # O(qr)
-    patient_infile.close()  # O(1)
+    @ms.setter
+    def ms(self, marital_status: str) -> None:
+        if isinstance(marital_status, str):
+            self._ms = marital_status
+        else:
+            raise ValueError('"marital_status" must be a string')
 
-    patient_dict: dict[str, Patient] = {}  # O(1)
+    @property
+    def lang(self) -> str:
+        """The patient's language property."""
+        return self._lang  # O(1)
 
-    for aline in patients:  # O(q)
-        patient = aline.split("\t")  # O(r)
-        patient[-1] = patient[-1].strip()  # O(r)
-
-        patient_id = patient[patient_id_idx]  # O(1)
-        patient_gender = patient[patient_gender_idx]  # O(1)
-        patient_dob = patient[patient_dob_idx]  # O(1)
-        patient_race = patient[patient_race_idx]  # O(1)
-        patient_ms = patient[patient_ms_idx]  # O(1)
-        patient_lang = patient[patient_lang_idx]  # O(1)
-        patient_pbp = patient[patient_pbp_idx]  # O(1)
-        patient_dict[patient_id] = Patient(
-            patient_id,
-            patient_gender,
-            patient_dob,
-            patient_race,
-            patient_ms,
-            patient_lang,
-            patient_pbp,
-        )
+    @lang.setter
+    def lang(self, language: str) -> None:
+        if isinstance(language, str):
+            self._lang = language
+        else:
+            raise ValueError('"language" must be a string')
 
-    lab_infile = open(lab_filename, "r")  # O(1)
-    lab_variables = lab_infile.readline()  # O(1)
-    lab_variables = remove_chars(lab_variables)  # O(t)
-    lab_vars_list = lab_variables.split("\t")  # O(t)
-    lab_vars_list[-1] = lab_vars_list[-1].strip()  # O(t)
-
-    lab_pid_idx = lab_vars_list.index("PatientID")  # O(t)
-    lab_aid_idx = lab_vars_list.index("AdmissionID")  # O(t)
-    lab_name_idx = lab_vars_list.index("LabName")  # O(t)
-    lab_value_idx = lab_vars_list.index("LabValue")  # O(t)
-    lab_units_idx = lab_vars_list.index("LabUnits")  # O(t)
-    lab_datetime_idx = lab_vars_list.index("LabDateTime")  # O(t)
-
-    labs = lab_infile.readlines()  # O(st)
-    lab_infile.close()  # O(1)
-
-    for aline in labs:  # O(s)
-        one_lab = aline.split("\t")  # O(t)
-        one_lab[-1] = one_lab[-1].strip()  # O(t)
-
-        patient_id = one_lab[lab_pid_idx]  # O(1)
-        lab_aid = one_lab[lab_aid_idx]  # O(1)
-        lab_name = one_lab[lab_name_idx]  # O(1)
-        lab_value = one_lab[lab_value_idx]  # O(1)
-        lab_units = one_lab[lab_units_idx]  # O(1)
-        lab_datetime = one_lab[lab_datetime_idx]  # O(1)
-
-        lab = Lab(
-            patient_id, lab_aid, lab_name, lab_value, lab_units, lab_datetime
-        )  # O(1)
+    @property
+    def pbp(self) -> str:
+        """The patient's community poverty percent property."""
+        return self._pbp  # O(1)
 
-        patient_dict[patient_id].add_lab(lab)  # O(1)
+    @pbp.setter
+    def pbp(self, pbp: str) -> None:
+        if isinstance(pbp, str):
+            self._pbp = pbp
+        else:
+            raise ValueError('"pbp" must be a string')
 
-    records = patient_dict  # O(1)
-    return records  # O(1)
+    def get_labs(self) -> list[Lab]:
+        """
+        Return the laboratory test history for the patient.
+
+        If a lab source was set, it is called on first access and its
+        laboratory tests are added to the history. If the patient is
+        attached to a LabCache, the access marks the patient as most
+        recently used.
+
+        Arguments
+        ---------
+        None
+
+        Return
+        ------
+        list[Lab]
+            instances of the Lab class, where each instance
+            is a recorded laboratory test for the patient
+        """
+        if self._lab_source is not None:  # O(1)
+            source = self._lab_source  # O(1)
+            self._lab_source = None  # O(1)
+            for lab in source():  # O(n)
+                self.add_lab(lab)  # O(1)
+        elif self._lab_cache is not None:  # O(1)
+            self._lab_cache.touch(self)  # O(1)
+        return self.labs  # O(1)
+
+    def set_lab_source(self, source: Callable[[], Iterable[Lab]]) -> None:
+        """
+        Defer loading the laboratory test history until first access.
+
+        Arguments
+        ---------
+        source -- a callable returning the instances of the Lab class
+            for the patient
+
+        Return
+        ------
+        None
+        """
+        self._lab_source = source  # O(1)
+
+    def unload_labs(self, source: Callable[[], Iterable[Lab]]) -> None:
+        """
+        Drop the laboratory test history until the next access.
+
+        The laboratory tests and their indexes are released, and source
+        reloads them the next time they are accessed.
+
+        Arguments
+        ---------
+        source -- a callable returning the instances of the Lab class
+            for the patient
+
+        Return
+        ------
+        None
+        """
+        self.labs = []  # O(1)
+        self._lab_index = None  # O(1)
+        self._admissions = {}  # O(1)
+        self._first_visit = None  # O(1)
+        self._first_visit_age = None  # O(1)
+        self._lab_source = source  # O(1)
+
+    def add_lab(self, lab: Lab) -> None:
+        """
+        Add lab to patient's laboratory test history.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        lab -- an instance of the Lab class denoting one lab
+        taken by the patient
+
+        Return
+        ------
+        None
+        """
+        self.get_labs().append(lab)  # O(1)
+        self._lab_index = None  # O(1)
+
+        admission = self._admissions.get(lab.admission_id)  # O(1)
+        if admission is None:  # O(1)
+            admission = Admission(lab.admission_id, self.get_series)
+            self._admissions[lab.admission_id] = admission  # O(1)
+        admission.add(lab)  # O(1)
+
+        if self._first_visit is None or lab.date_time < self._first_visit:
+            self._first_visit = lab.date_time  # O(1)
+
+    def _series_index(self) -> dict[str, LabSeries]:
+        """
+        Return the patient's LabSeries keyed by laboratory test name.
+
+        The index is built by grouping the laboratory tests by name and
+        sorting each group once, and is kept until add_lab or
+        unload_labs changes the laboratory tests.
+
+        Time Complexity
+        ---------------
+        O(L log L) on the first call after a change, O(1) afterwards
+        L - number of laboratory tests of the patient
+
+        Arguments
+        ---------
+        None
+
+        Return
+        ------
+        dict[str, LabSeries]
+            the patient's indexed values keyed by laboratory test name
+        """
+        labs = self.get_labs()  # O(1) once loaded
+        index = self._lab_index  # O(1)
+        if index is None:  # O(1)
+            groups: dict[str, list[Lab]] = {}  # O(1)
+            for lab in labs:  # O(l)
+                group = groups.get(lab.name)  # O(1)
+                if group is None:  # O(1)
+                    group = groups[lab.name] = []  # O(1)
+                group.append(lab)  # O(1)
+            index = {
+                name: LabSeries(name, group) for name, group in groups.items()
+            }  # O(l log l)
+            self._lab_index = index  # O(1)
+        return index  # O(1)
+
+    def get_series(self, lab_name: str) -> Optional[LabSeries]:
+        """
+        Return the indexed values for one laboratory test.
+
+        Time Complexity
+        ---------------
+        O(L log L) on the first query after labs are added, O(1)
+        afterwards
+        L - number of laboratory tests of the patient
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        Return
+        ------
+        LabSeries or None
+            the patient's indexed values for the laboratory test, or
+            None if the patient never took the test
+        """
+        return self._series_index().get(lab_name)  # O(1) once indexed
+
+    def get_summary(self, lab_name: str) -> Optional[LabSummary]:
+        """
+        Return the summary statistics for one laboratory test.
+
+        Time Complexity
+        ---------------
+        O(1) total once the series are indexed
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        Return
+        ------
+        LabSummary or None
+            the count, extrema, mean, last value and date range of the
+            laboratory test, or None if the patient never took the test
+        """
+        series = self.get_series(lab_name)  # O(1)
+        if series is None:  # O(1)
+            return None  # O(1)
+        return series.summary()  # O(1)
+
+    def get_summaries(self) -> dict[str, LabSummary]:
+        """
+        Return the summary statistics for every laboratory test.
+
+        Time Complexity
+        ---------------
+        O(T) total once the series are indexed
+        T - number of distinct laboratory tests taken by the patient
+
+        Arguments
+        ---------
+        None
+
+        Return
+        ------
+        dict[str, LabSummary]
+            the summary statistics keyed by laboratory test name
+        """
+        index = self._series_index()  # O(1) once indexed
+        return {
+            name: series.summary() for name, series in index.items()
+        }  # O(t)
+
+    @property
+    def age(self) -> int:
+        """
+        The patient's age property.
+
+        The date of birth is parsed once and the age is cached until the
+        date of birth or the current date changes.
+
+        Time Complexity
+        ---------------
+        O(1) total - All statements involve either indexing,
+        variable assignment, variable state updates, or logical
+        comparisons. Hence, all operations are in O(1) time.
+
+        Assumptions
+        -----------
+        1.  All entries for patient date of birth are strings of a fixed
+            length.
+
+        Arguments
+        ---------
+        None
+
+        Return
+        -------
+        int
+            the patient's current age
+        """
+        today = date.today()  # O(1)
+        if self._age is None or self._age[0] != today:  # O(1)
+            self._age = (today, _age_on(self.dob_datetime, today))  # O(1)
+        return self._age[1]  # O(1)
+
+    def get_admission(self, admission_id: str) -> Optional[Admission]:
+        """
+        Return the patient's laboratory tests in one admission.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        admission_id -- a string denoting the admission id
+
+        Return
+        ------
+        Admission or None
+            the patient's admission, or None if the patient has no
+            laboratory test in the admission
+        """
+        self.get_labs()  # O(1) once loaded
+        return self._admissions.get(admission_id)  # O(1)
+
+    def get_admissions(self) -> list[Admission]:
+        """
+        Return the patient's admissions in order of their first test.
+
+        Time Complexity
+        ---------------
+        O(A log A) total
+        A - number of admissions of the patient
+
+        Arguments
+        ---------
+        None
+
+        Return
+        ------
+        list[Admission]
+            the patient's admissions, sorted by their earliest laboratory
+            test
+        """
+        self.get_labs()  # O(1) once loaded
+        return sorted(
+            self._admissions.values(), key=lambda admission: admission.first
+        )  # O(a log a)
+
+    def labs_between(
+        self,
+        lab_name: str,
+        start: Union[str, datetime],
+        end: Union[str, datetime],
+    ) -> list[Lab]:
+        """
+        Return the patient's laboratory tests of one name in a time range.
+
+        Time Complexity
+        ---------------
+        O(log N + K) total
+        N - number of records for the laboratory test
+        K - number of laboratory tests returned
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        start -- a datetime, or a string formatted as the laboratory
+            tests' dates and times, denoting the start of the range
+
+        end -- a datetime, or a string formatted as the laboratory
+            tests' dates and times, denoting the end of the range
+
+        Return
+        ------
+        list[Lab]
+            the laboratory tests taken from start to end inclusive,
+            sorted by date and time
+        """
+        series = self.get_series(lab_name)  # O(1)
+        if series is None:  # O(1)
+            return []  # O(1)
+        return series.between(start, end)  # O(log n + k)
+
+    def last_before(
+        self, lab_name: str, when: Union[str, datetime]
+    ) -> Optional[Lab]:
+        """
+        Return the patient's latest laboratory test of one name before when.
+
+        Time Complexity
+        ---------------
+        O(log N) total
+        N - number of records for the laboratory test
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        when -- a datetime, or a string formatted as the laboratory
+            tests' dates and times
+
+        Return
+        ------
+        Lab or None
+            the latest laboratory test strictly before when, or None if
+            there is none
+        """
+        series = self.get_series(lab_name)  # O(1)
+        if series is None:  # O(1)
+            return None  # O(1)
+        return series.last_before(when)  # O(log n)
+
+    def age_first_visit(self) -> int:
+        """
+        Return the patient's age at first admission.
+
+        The result is cached until the date of birth or the earliest
+        laboratory test changes.
+
+        Time Complexity
+        ---------------
+        O(1) total - the earliest laboratory test date and time is
+        maintained by add_lab.
+
+        Assumptions
+        -----------
+        1.  All entries for patient date of birth are strings of a fixed
+            length.
+        2.  All entries for patient date and time of admission are strings
+            of a fixed length.
+
+        Arguments
+        ---------
+        None
+
+        Return
+        -------
+        int
+            the patient's age at first admission
+        """
+        first_visit_string = self.first_visit  # O(1) once loaded
+        if first_visit_string is None:  # O(1)
+            raise ValueError("patient has no laboratory tests")
+
+        cached = self._first_visit_age  # O(1)
+        if cached is None or cached[0] != first_visit_string:  # O(1)
+            first_visit_date = _parse_datetime(first_visit_string)  # O(1)
+            age = _age_on(self.dob_datetime, first_visit_date)  # O(1)
+            cached = (first_visit_string, age)  # O(1)
+            self._first_visit_age = cached  # O(1)
+        return cached[1]  # O(1)
+
+    def is_sick(self, lab_name: str, operator: str, value: float) -> bool:
+        """
+        Return the patient's history of illness for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(1) total once the series are indexed - the minimum and maximum
+        of each laboratory test are computed when its LabSeries is
+        built, on the first query after labs are added.
+
+        Assumptions
+        -----------
+        1.  All arguments are positional and lack of adherence to order
+            indicated in function definition generates errors.
+        2.  Only operators passed as arguments include > and <
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        operator -- a string denoting a comparison operator: > or <
+
+        value -- a float denoting a value for a laboratory test to
+            assess the patient's history of illness
+
+        Return
+        -------
+        bool
+            the patient's history of illness for a laboratory test: True
+            if the patient's recorded value is greater than or less than
+            value, and False if otherwise or if the patient never took
+            the laboratory test
+        """
+        operator_table = {
+            ">": lambda x, y: x > y,
+            "<": lambda x, y: x < y,
+        }  # O(1)
+
+        comparison = operator_table[operator]  # O(1)
+
+        series = self.get_series(lab_name)  # O(1) once indexed
+        if series is None or not series.value_count:  # O(1)
+            return False  # O(1)
+
+        if operator == ">":  # O(1)
+            if comparison(series.max_value, value):  # type: ignore
+                return True  # O(1)
+
+        if operator == "<":  # O(1)
+            if comparison(series.min_value, value):  # type: ignore
+                return True  # O(1)
+        return False  # O(1)
+
+
+class Query:
+    """
+    A class to represent a criterion on patients.
+
+    Queries are built from clauses on laboratory tests, demographics
+    and age, and combined with & (AND) and | (OR). A clause on a
+    laboratory test holds if any of the patient's numeric values for
+    the test satisfies it, so Query.lab(name, ">", value) agrees with
+    Patient.is_sick(name, ">", value).
+
+    Attributes
+    ----------
+    kind -- a string denoting the kind of query: lab, demographic,
+        age, and or or
+    field -- a string denoting the laboratory test's name or the
+        patient's attribute, or None for age, and and or
+    operator -- a string denoting a comparison operator: >, <, >=,
+        <=, == or between, or None for and and or
+    value -- the value to compare against, a tuple of the lower and
+        upper bound for between, or None for and and or
+    clauses -- a list of instances of the Query class combined by
+        and or or
+
+    Methods
+    -------
+    __init__(self, kind, field, operator, value, clauses)
+        Construct all attributes for Query class.
+
+    lab(cls, lab_name, operator, value)
+        Return a query on a patient's values for a laboratory test.
+
+    demographic(cls, attribute, operator, value)
+        Return a query on a patient's demographic attribute.
+
+    age(cls, operator, value)
+        Return a query on a patient's age.
+
+    __and__(self, other)
+        Return a query that holds if both queries hold.
+
+    __or__(self, other)
+        Return a query that holds if either query holds.
+
+    compile(self)
+        Return a plan that evaluates the query.
+
+        Time Complexity
+        ---------------
+        O(C log C) total
+        C - number of clauses in the query
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        field: Optional[str] = None,
+        operator: Optional[str] = None,
+        value: Any = None,
+        clauses: Iterable["Query"] = (),
+    ) -> None:
+        """
+        Construct all attributes for Query class.
+
+        Arguments
+        ---------
+        kind -- a string denoting the kind of query: lab, demographic,
+            age, and or or
+
+        field -- a string denoting the laboratory test's name or the
+            patient's attribute
+
+        operator -- a string denoting a comparison operator: >, <, >=,
+            <=, == or between
+
+        value -- the value to compare against, or a tuple of the lower
+            and upper bound for between
+
+        clauses -- instances of the Query class combined by and or or
+
+        Return
+        -------
+        None
+        """
+        if kind in ("lab", "demographic", "age"):  # O(1)
+            if operator not in QUERY_OPERATORS:  # O(1)
+                raise ValueError(
+                    '"operator" must be one of ' + ", ".join(QUERY_OPERATORS)
+                )
+            if operator == "between" and len(value) != 2:  # O(1)
+                raise ValueError('"value" must be a (lower, upper) pair')
+        elif kind not in ("and", "or"):  # O(1)
+            raise ValueError('"kind" must be lab, demographic, age, and or or')
+
+        self.kind = kind  # O(1)
+        self.field = field  # O(1)
+        self.operator = operator  # O(1)
+        self.value = value  # O(1)
+        self.clauses: list[Query] = list(clauses)  # O(c)
+
+    @classmethod
+    def lab(cls, lab_name: str, operator: str, value: Any) -> "Query":
+        """
+        Return a query on a patient's values for a laboratory test.
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        operator -- a string denoting a comparison operator: >, <, >=,
+            <=, == or between
+
+        value -- a float, or a tuple of the lower and upper bound for
+            between
+
+        Return
+        ------
+        Query
+            a query that holds if any of the patient's numeric values
+            for the laboratory test satisfies the comparison
+        """
+        return cls("lab", lab_name, operator, value)  # O(1)
+
+    @classmethod
+    def demographic(cls, attribute: str, operator: str, value: Any) -> "Query":
+        """
+        Return a query on a patient's demographic attribute.
+
+        Arguments
+        ---------
+        attribute -- a string denoting the patient's attribute: gender,
+            race, ms, lang or pbp
+
+        operator -- a string denoting a comparison operator: == for
+            every attribute, and >, <, >=, <= or between for pbp
+
+        value -- a string, a float for pbp, or a tuple of the lower and
+            upper bound for between
+
+        Return
+        ------
+        Query
+            a query that holds if the patient's attribute satisfies the
+            comparison
+        """
+        if attribute not in DEMOGRAPHIC_ATTRIBUTES:  # O(1)
+            raise ValueError(
+                '"attribute" must be one of ' + ", ".join(DEMOGRAPHIC_ATTRIBUTES)
+            )
+        if attribute != "pbp" and operator != "==":  # O(1)
+            raise ValueError('"operator" must be == for ' + attribute)
+        return cls("demographic", attribute, operator, value)  # O(1)
+
+    @classmethod
+    def age(cls, operator: str, value: Any) -> "Query":
+        """
+        Return a query on a patient's age.
+
+        Arguments
+        ---------
+        operator -- a string denoting a comparison operator: >, <, >=,
+            <=, == or between
+
+        value -- an integer, or a tuple of the lower and upper bound
+            for between
+
+        Return
+        ------
+        Query
+            a query that holds if the patient's current age satisfies
+            the comparison
+        """
+        return cls("age", None, operator, value)  # O(1)
+
+    def __and__(self, other: "Query") -> "Query":
+        """Return a query that holds if both queries hold."""
+        return Query("and", clauses=self._flatten("and") + other._flatten("and"))
+
+    def __or__(self, other: "Query") -> "Query":
+        """Return a query that holds if either query holds."""
+        return Query("or", clauses=self._flatten("or") + other._flatten("or"))
+
+    def _flatten(self, kind: str) -> list["Query"]:
+        """Return the clauses of the query if it is of kind, else itself."""
+        return self.clauses if self.kind == kind else [self]  # O(1)
+
+    def compile(self) -> "QueryPlan":
+        """
+        Return a plan that evaluates the query.
+
+        Time Complexity
+        ---------------
+        O(C log C) total
+        C - number of clauses in the query
+
+        Arguments
+        ---------
+        None
+
+        Return
+        ------
+        QueryPlan
+            the compiled query, which may be run on many patients
+        """
+        return QueryPlan(self)  # O(c log c)
+
+
+class QueryPlan:
+    """
+    A class to evaluate a compiled Query over patients.
+
+    Compiling resolves every operator and converts every value once.
+    Clauses on laboratory tests are resolved to sets of candidate
+    patient ids from each patient's minimum and maximum for the test,
+    read from LabTable.extrema when a table is given and from the
+    patients' LabSeries otherwise. Clauses combined by and intersect
+    these sets first, and the demographic and age clauses, then scans
+    of a laboratory test's values for == and between, run only on the
+    patients left. Clauses combined by or run on the patients not yet
+    matched and their results are united.
+
+    Attributes
+    ----------
+    query -- an instance of the Query class
+    cost -- an integer denoting the relative cost of evaluating the
+        plan on one patient
+
+    Methods
+    -------
+    __init__(self, query)
+        Construct all attributes for QueryPlan class.
+
+        Time Complexity
+        ---------------
+        O(C log C) total
+        C - number of clauses in the query
+
+    filter(self, patients)
+        Return the patients who satisfy the query.
+
+        Time Complexity
+        ---------------
+        O(P * L + K * D) total
+        P - number of patients
+        L - number of clauses on laboratory tests
+        K - number of patients left by the laboratory test clauses
+        D - number of other clauses
+
+    matches(self, patient)
+        Return whether one patient satisfies the query.
+
+        Time Complexity
+        ---------------
+        O(C) worst case
+        C - number of clauses in the query
+
+    select(self, records, table=None)
+        Return the ids of the patients who satisfy the query.
+
+        Time Complexity
+        ---------------
+        O(P * L + K * D) total once extrema are cached
+        P - number of patients
+        L - number of clauses on laboratory tests
+        K - number of patients left by the laboratory test clauses
+        D - number of other clauses
+    """
+
+    def __init__(self, query: Query) -> None:
+        """
+        Construct all attributes for QueryPlan class.
+
+        Time Complexity
+        ---------------
+        O(C log C) total
+        C - number of clauses in the query
+
+        Arguments
+        ---------
+        query -- an instance of the Query class
+
+        Return
+        -------
+        None
+        """
+        self.query = query  # O(1)
+        self._steps: list[QueryPlan] = []  # O(1)
+        self._predicate: Optional[Callable[[Patient], bool]] = None  # O(1)
+        self._candidates: Optional[Callable[..., set[str]]] = None
+        self._exact = False  # O(1)
+
+        if query.kind in ("and", "or"):  # O(1)
+            self._steps = sorted(
+                (QueryPlan(clause) for clause in query.clauses),
+                key=lambda step: (not step._indexed, step.cost),
+            )  # O(c log c)
+            self.cost = sum(step.cost for step in self._steps)  # O(c)
+        else:
+            (
+                self._predicate,
+                self.cost,
+                self._candidates,
+            ) = _compile_clause(query)  # O(1)
+            self._exact = query.operator not in ("==", "between")  # O(1)
+
+    @property
+    def _indexed(self) -> bool:
+        """Whether the plan resolves to ids without testing patients."""
+        if self._steps:  # O(1)
+            return all(step._indexed for step in self._steps)  # O(c)
+        return self._candidates is not None  # O(1)
+
+    def _select(
+        self,
+        records: dict[str, Patient],
+        table: Optional["LabTable"],
+        candidates: Optional[set[str]],
+    ) -> set[str]:
+        """Return the ids of candidates, or all records, that match."""
+        if self._candidates is not None:  # O(1)
+            ids = self._candidates(records, table, candidates)  # O(p)
+            if self._exact:  # O(1)
+                return ids  # O(1)
+            predicate = self._predicate  # O(1)
+            return {
+                patient_id
+                for patient_id in ids
+                if predicate(records[patient_id])  # type: ignore
+            }  # O(k)
+
+        if self._predicate is not None:  # O(1)
+            predicate = self._predicate  # O(1)
+            pool = records.keys() if candidates is None else candidates
+            return {
+                patient_id
+                for patient_id in pool
+                if predicate(records[patient_id])
+            }  # O(k)
+
+        if self.query.kind == "and":  # O(1)
+            for step in self._steps:  # O(c)
+                candidates = step._select(records, table, candidates)
+                if not candidates:  # O(1)
+                    break
+            return candidates if candidates is not None else set()
+
+        matched: set[str] = set()  # O(1)
+        remaining = set(records if candidates is None else candidates)
+        for step in self._steps:  # O(c)
+            if not remaining:  # O(1)
+                break
+            found = step._select(records, table, remaining)  # O(p)
+            matched |= found  # O(k)
+            remaining -= found  # O(k)
+        return matched  # O(1)
+
+    def filter(self, patients: Iterable[Patient]) -> list[Patient]:
+        """
+        Return the patients who satisfy the query.
+
+        Time Complexity
+        ---------------
+        O(P * L + K * D) total
+        P - number of patients
+        L - number of clauses on laboratory tests
+        K - number of patients left by the laboratory test clauses
+        D - number of other clauses
+
+        Arguments
+        ---------
+        patients -- instances of the Patient class
+
+        Return
+        ------
+        list[Patient]
+            the patients who satisfy the query, in their original order
+        """
+        patients = list(patients)  # O(p)
+        records = {patient.id: patient for patient in patients}  # O(p)
+        ids = self._select(records, None, None)  # O(pl + kd)
+        return [patient for patient in patients if patient.id in ids]
+
+    def matches(self, patient: Patient) -> bool:
+        """
+        Return whether one patient satisfies the query.
+
+        Time Complexity
+        ---------------
+        O(C) worst case
+        C - number of clauses in the query
+
+        Arguments
+        ---------
+        patient -- an instance of the Patient class
+
+        Return
+        ------
+        bool
+            True if the patient satisfies the query, and False otherwise
+        """
+        return bool(self.filter([patient]))  # O(c)
+
+    def select(
+        self,
+        records: dict[str, Patient],
+        table: Optional["LabTable"] = None,
+    ) -> list[str]:
+        """
+        Return the ids of the patients who satisfy the query.
+
+        Time Complexity
+        ---------------
+        O(P * L + K * D) total once extrema are cached
+        P - number of patients
+        L - number of clauses on laboratory tests
+        K - number of patients left by the laboratory test clauses
+        D - number of other clauses
+
+        Arguments
+        ---------
+        records -- a dictionary of instances of the Patient class keyed
+            by patient id, as returned by parse_data
+
+        table -- an optional instance of the LabTable class backing
+            records, whose cached extrema resolve the laboratory test
+            clauses without building any patient's LabSeries
+
+        Return
+        ------
+        list[str]
+            the ids of the patients who satisfy the query, in the order
+            of records
+        """
+        ids = self._select(records, table, None)  # O(pl + kd)
+        return [patient_id for patient_id in records if patient_id in ids]
+
+
+class Vocabulary:
+    """
+    A class to map repeated strings to small integer codes.
+
+    Each distinct string is stored once and is assigned the next
+    integer code the first time it is added.
+
+    Attributes
+    ----------
+    strings -- a list of strings, where the index of each string
+        is its code
+
+    Methods
+    -------
+    __init__(self)
+        Construct all attributes for Vocabulary class.
+
+    add(self, string)
+        Return the code for string, assigning one if it is new.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+    get(self, string)
+        Return the code for string, or None if it was never added.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+    intern(self, string)
+        Return the one stored copy of string, adding it if it is new.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+    __getitem__(self, code)
+        Return the string for code.
+
+    __len__(self)
+        Return the number of distinct strings.
+    """
+
+    def __init__(self) -> None:
+        """
+        Construct all attributes for Vocabulary class.
+
+        Arguments
+        ---------
+        None
+
+        Return
+        -------
+        None
+        """
+        self.strings: list[str] = []  # O(1)
+        self._codes: dict[str, int] = {}  # O(1)
+
+    def add(self, string: str) -> int:
+        """
+        Return the code for string, assigning one if it is new.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        string -- a string to encode
+
+        Return
+        ------
+        int
+            the code for string
+        """
+        code = self._codes.get(string)  # O(1)
+        if code is None:  # O(1)
+            code = len(self.strings)  # O(1)
+            self._codes[string] = code  # O(1)
+            self.strings.append(string)  # O(1)
+        return code  # O(1)
+
+    def get(self, string: str) -> Optional[int]:
+        """
+        Return the code for string, or None if it was never added.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        string -- a string to look up
+
+        Return
+        ------
+        int or None
+            the code for string, or None if string was never added
+        """
+        return self._codes.get(string)  # O(1)
+
+    def intern(self, string: str) -> str:
+        """
+        Return the one stored copy of string, adding it if it is new.
+
+        Equal strings returned by intern are the same object, so they
+        share memory and compare by identity before their contents.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        string -- a string to intern
+
+        Return
+        ------
+        str
+            the stored string equal to string
+        """
+        code = self._codes.get(string)  # O(1)
+        if code is None:  # O(1)
+            code = self.add(string)  # O(1)
+        return self.strings[code]  # O(1)
+
+    def __getitem__(self, code: int) -> str:
+        """Return the string for code."""
+        return self.strings[code]  # O(1)
+
+    def __len__(self) -> int:
+        """Return the number of distinct strings."""
+        return len(self.strings)  # O(1)
+
+
+class LabVocabulary:
+    """
+    A class to share the repeated strings of laboratory tests.
+
+    Patient ids, admission ids, test names and units repeat on millions
+    of rows. A LabVocabulary stores each distinct value once and gives
+    it an integer code. parse_data interns these fields of every
+    laboratory test through a LabVocabulary, and a LabTable built on the
+    same LabVocabulary stores the same codes.
+
+    Attributes
+    ----------
+    patient_ids -- a Vocabulary of the patients' ids
+    admission_ids -- a Vocabulary of the patients' admission ids
+    names -- a Vocabulary of the laboratory tests' names
+    units -- a Vocabulary of the laboratory tests' units
+
+    Methods
+    -------
+    __init__(self)
+        Construct all attributes for LabVocabulary class.
+
+    intern_fields(self, fields)
+        Replace the repeated fields of a lab line with stored copies.
+
+        Time Complexity
+        ---------------
+        O(1) total
+    """
+
+    def __init__(self) -> None:
+        """
+        Construct all attributes for LabVocabulary class.
+
+        Arguments
+        ---------
+        None
+
+        Return
+        -------
+        None
+        """
+        self.patient_ids = Vocabulary()  # O(1)
+        self.admission_ids = Vocabulary()  # O(1)
+        self.names = Vocabulary()  # O(1)
+        self.units = Vocabulary()  # O(1)
+
+    def intern_fields(self, fields: list[str]) -> list[str]:
+        """
+        Replace the repeated fields of a lab line with stored copies.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        fields -- a list of strings ordered as LAB_VARIABLES
+
+        Return
+        ------
+        list[str]
+            fields, with the patient id, admission id, name and units
+            replaced by their interned copies
+        """
+        fields[0] = self.patient_ids.intern(fields[0])  # O(1)
+        fields[1] = self.admission_ids.intern(fields[1])  # O(1)
+        fields[2] = self.names.intern(fields[2])  # O(1)
+        fields[4] = self.units.intern(fields[4])  # O(1)
+        return fields  # O(1)
+
+    def _vocabularies(self) -> list[Vocabulary]:
+        """Return the vocabularies in the order they are written."""
+        return [self.patient_ids, self.admission_ids, self.names, self.units]
+
+
+class LabTable:
+    """
+    A class to store laboratory tests column by column.
+
+    Repeated strings are stored once in a Vocabulary and each row
+    holds their integer codes. Values are stored as floats and
+    dates and times as integer microseconds since 1970-01-01, so
+    one row costs tens of bytes instead of an instance of the Lab
+    class with a dictionary of attributes.
+
+    Attributes
+    ----------
+    vocabulary -- a LabVocabulary of the table's repeated strings,
+        which may be shared with other tables and with parse_data
+    patient_ids -- a Vocabulary of the patients' ids
+    admission_ids -- a Vocabulary of the patients' admission ids
+    names -- a Vocabulary of the laboratory tests' names
+    units -- a Vocabulary of the laboratory tests' units
+    patient_codes -- an array of integers denoting each row's code
+        in patient_ids
+    admission_codes -- an array of integers denoting each row's
+        code in admission_ids
+    name_codes -- an array of integers denoting each row's code
+        in names
+    unit_codes -- an array of integers denoting each row's code
+        in units
+    values -- an array of floats denoting each row's value, or
+        NaN if the value is not numeric
+    timestamps -- an array of integers denoting each row's date
+        and time in microseconds since 1970-01-01
+
+    Methods
+    -------
+    __init__(self, vocabulary)
+        Construct all attributes for LabTable class.
+
+    append(self, patient_id, admission_id, name, value, units,
+        date_time)
+        Add one laboratory test to the table.
+
+        Time Complexity
+        ---------------
+        O(1) amortized
+
+    extend(self, other)
+        Add every row of another table to the table.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of rows in other
+
+    get_lab(self, row)
+        Return an instance of the Lab class for one row.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+    value_texts(self)
+        Return the original text of values that are not kept as floats.
+
+        Time Complexity
+        ---------------
+        O(T) total
+        T - number of such values
+
+    set_value_text(self, row, text)
+        Keep the original text of one row's value.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+    rows(self, patient_id)
+        Return the row numbers of one patient's laboratory tests.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+    labs(self, patient_id)
+        Return instances of the Lab class for one patient.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+    extrema(self, lab_name)
+        Return every patient's minimum and maximum value for a test.
+
+        Time Complexity
+        ---------------
+        O(S) on the first call after an append, O(1) otherwise
+        S - number of rows in the table
+
+    summary(self, lab_name)
+        Return every patient's summary statistics for a test.
+
+        Time Complexity
+        ---------------
+        O(S) on the first call after an append, O(P) otherwise
+        S - number of rows in the table
+        P - number of patients in the table
+
+    sick_mask(self, lab_name, operator, value)
+        Return every patient's history of illness for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(P) total once extrema are cached
+        P - number of patients in the table
+
+    sick_patients(self, lab_name, operator, value)
+        Return the ids of patients who are sick for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(P) total once extrema are cached
+        P - number of patients in the table
+
+    dump(self, outfile)
+        Write the table to a binary file.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of rows in the table
+
+    load(cls, infile)
+        Read a table written by dump from a binary file.
+
+        Time Complexity
+        ---------------
+        O(S) total, without any work per row in Python
+        S - number of rows in the table
+
+    __len__(self)
+        Return the number of rows.
+    """
+
+    def __init__(self, vocabulary: Optional[LabVocabulary] = None) -> None:
+        """
+        Construct all attributes for LabTable class.
+
+        Arguments
+        ---------
+        vocabulary -- an optional instance of the LabVocabulary class to
+            share, which defaults to a new LabVocabulary
+
+        Return
+        -------
+        None
+        """
+        if vocabulary is None:  # O(1)
+            vocabulary = LabVocabulary()  # O(1)
+        self.vocabulary = vocabulary  # O(1)
+        self.patient_ids = vocabulary.patient_ids  # O(1)
+        self.admission_ids = vocabulary.admission_ids  # O(1)
+        self.names = vocabulary.names  # O(1)
+        self.units = vocabulary.units  # O(1)
+        self.patient_codes = array("i")  # O(1)
+        self.admission_codes = array("i")  # O(1)
+        self.name_codes = array("i")  # O(1)
+        self.unit_codes = array("i")  # O(1)
+        self.values = array("d")  # O(1)
+        self.timestamps = array("q")  # O(1)
+        self._value_text: dict[int, str] = {}  # O(1)
+        self._patient_rows: dict[int, array] = {}  # O(1)
+        self._extrema: Optional[dict[int, tuple[array, array]]] = None
+        self._summaries: Optional[dict[int, tuple[array, ...]]] = None
+
+    def append(
+        self,
+        patient_id: str,
+        admission_id: str,
+        name: str,
+        value: str,
+        units: str,
+        date_time: str,
+    ) -> None:
+        """
+        Add one laboratory test to the table.
+
+        Values whose text does not round-trip through float, such as
+        non-numeric results, keep their original text for get_lab.
+
+        Time Complexity
+        ---------------
+        O(1) amortized
+
+        Arguments
+        ---------
+        patient_id -- a string denoting the patient's id
+        admission_id -- a string denoting the patient's
+            admission id
+        name -- a string denoting the laboratory test's name
+        value -- a string denoting the laboratory test's value
+        units -- a string denoting the laboratory test's units
+        date_time -- a string denoting the laboratory test's
+            date and time
+
+        Return
+        ------
+        None
+        """
+        row = len(self.values)  # O(1)
+        patient_code = self.patient_ids.add(patient_id)  # O(1)
+        self.patient_codes.append(patient_code)  # O(1)
+        self.admission_codes.append(self.admission_ids.add(admission_id))
+        self.name_codes.append(self.names.add(name))  # O(1)
+        self.unit_codes.append(self.units.add(units))  # O(1)
+        self.timestamps.append(_to_micros(date_time))  # O(1)
+
+        try:
+            number = float(value)  # O(1)
+        except ValueError:
+            number = NAN  # O(1)
+        if repr(number) != value:  # O(1)
+            self._value_text[row] = value  # O(1)
+        self.values.append(number)  # O(1)
+
+        rows = self._patient_rows.get(patient_code)  # O(1)
+        if rows is None:  # O(1)
+            rows = array("q")  # O(1)
+            self._patient_rows[patient_code] = rows  # O(1)
+        rows.append(row)  # O(1)
+        self._extrema = None  # O(1)
+        self._summaries = None  # O(1)
+
+    def extend(self, other: "LabTable") -> None:
+        """
+        Add every row of another table to the table.
+
+        Codes of other are translated to codes of the table, so the two
+        tables may have been built independently. Tables that share a
+        LabVocabulary share codes and need no translation.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of rows in other
+
+        Arguments
+        ---------
+        other -- an instance of the LabTable class
+
+        Return
+        ------
+        None
+        """
+        offset = len(self)  # O(1)
+        patient_map = self._code_map(self.patient_ids, other.patient_ids)
+        maps = [
+            patient_map,
+            self._code_map(self.admission_ids, other.admission_ids),
+            self._code_map(self.names, other.names),
+            self._code_map(self.units, other.units),
+        ]  # O(p+a+n+u)
+
+        for column, other_column, code_map in zip(
+            self._columns()[:4], other._columns()[:4], maps
+        ):  # O(1)
+            if code_map is None:  # O(1)
+                column.extend(other_column)  # O(s)
+            else:
+                column.extend(
+                    array("i", [code_map[x] for x in other_column])
+                )  # O(s)
+        self.values.extend(other.values)  # O(s)
+        self.timestamps.extend(other.timestamps)  # O(s)
+
+        for row, value in other._value_text.items():  # O(s)
+            self._value_text[row + offset] = value  # O(1)
+
+        for patient_code, rows in other._patient_rows.items():  # O(p)
+            code = patient_code  # O(1)
+            if patient_map is not None:  # O(1)
+                code = patient_map[patient_code]  # O(1)
+            merged = self._patient_rows.get(code)  # O(1)
+            if merged is None:  # O(1)
+                merged = array("q")  # O(1)
+                self._patient_rows[code] = merged  # O(1)
+            merged.extend(array("q", [row + offset for row in rows]))  # O(r)
+
+        self._extrema = None  # O(1)
+        self._summaries = None  # O(1)
+
+    @staticmethod
+    def _code_map(
+        vocabulary: Vocabulary, other: Vocabulary
+    ) -> Optional[list[int]]:
+        """Return codes of vocabulary for other's codes, or None if same."""
+        if vocabulary is other:  # O(1)
+            return None  # O(1)
+        return [vocabulary.add(string) for string in other.strings]  # O(v)
+
+    def get_lab(self, row: int) -> Lab:
+        """
+        Return an instance of the Lab class for one row.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        row -- an integer denoting the row number
+
+        Return
+        ------
+        Lab
+            an instance of the Lab class with the row's attributes
+        """
+        value = self._value_text.get(row)  # O(1)
+        if value is None:  # O(1)
+            value = repr(self.values[row])  # O(1)
+
+        return Lab(
+            self.patient_ids[self.patient_codes[row]],
+            self.admission_ids[self.admission_codes[row]],
+            self.names[self.name_codes[row]],
+            value,
+            self.units[self.unit_codes[row]],
+            _from_micros(self.timestamps[row]),
+        )  # O(1)
+
+    def value_texts(self) -> dict[int, str]:
+        """
+        Return the original text of values that are not kept as floats.
+
+        These are the values whose text does not round-trip through
+        float, such as non-numeric results, whose value is NaN.
+
+        Time Complexity
+        ---------------
+        O(T) total
+        T - number of such values
+
+        Arguments
+        ---------
+        None
+
+        Return
+        ------
+        dict[int, str]
+            a copy of the original texts keyed by row number
+        """
+        return dict(self._value_text)  # O(t)
+
+    def set_value_text(self, row: int, text: str) -> None:
+        """
+        Keep the original text of one row's value.
+
+        get_lab returns text as the row's value instead of the float.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        row -- an integer denoting the row number
+
+        text -- a string denoting the laboratory test's value as read
+
+        Return
+        ------
+        None
+        """
+        if not 0 <= row < len(self):  # O(1)
+            raise ValueError(f"row {row} is not in the table")
+        self._value_text[row] = text  # O(1)
+
+    def rows(self, patient_id: str) -> array:
+        """
+        Return the row numbers of one patient's laboratory tests.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        patient_id -- a string denoting the patient's id
+
+        Return
+        ------
+        array
+            the row numbers, in the order they were appended
+        """
+        patient_code = self.patient_ids.get(patient_id)  # O(1)
+        if patient_code is None:  # O(1)
+            return array("q")  # O(1)
+        return self._patient_rows[patient_code]  # O(1)
+
+    def labs(self, patient_id: str) -> list[Lab]:
+        """
+        Return instances of the Lab class for one patient.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+        Arguments
+        ---------
+        patient_id -- a string denoting the patient's id
+
+        Return
+        ------
+        list[Lab]
+            instances of the Lab class for the patient's rows
+        """
+        return [self.get_lab(row) for row in self.rows(patient_id)]  # O(n)
+
+    def extrema(self, lab_name: str) -> tuple[array, array]:
+        """
+        Return every patient's minimum and maximum value for a test.
+
+        The minima and maxima of all laboratory tests are reduced in one
+        pass over the table, grouped by test name and patient, and cached
+        until the next append.
+
+        Time Complexity
+        ---------------
+        O(S) on the first call after an append, O(1) otherwise
+        S - number of rows in the table
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        Return
+        ------
+        tuple[array, array]
+            the minimum and maximum value of each patient, indexed by
+            the patient's code in patient_ids, or NaN if the patient
+            never took the laboratory test
+        """
+        if self._extrema is None:  # O(1)
+            self._extrema = self._reduce()  # O(s)
+
+        name_code = self.names.get(lab_name)  # O(1)
+        if name_code is None or name_code not in self._extrema:  # O(1)
+            missing = array("d", [NAN]) * len(self.patient_ids)  # O(p)
+            return missing, missing  # O(1)
+        return self._extrema[name_code]  # O(1)
+
+    def _reduce(self) -> dict[int, tuple[array, array]]:
+        """Return the minima and maxima grouped by test name and patient."""
+        patient_count = len(self.patient_ids)  # O(1)
+        extrema: dict[int, tuple[array, array]] = {}  # O(1)
+
+        for name_code, patient_code, value in zip(
+            self.name_codes, self.patient_codes, self.values
+        ):  # O(s)
+            if value != value:  # NaN O(1)
+                continue
+            group = extrema.get(name_code)  # O(1)
+            if group is None:  # O(1)
+                group = (
+                    array("d", [NAN]) * patient_count,
+                    array("d", [NAN]) * patient_count,
+                )  # O(p)
+                extrema[name_code] = group  # O(1)
+            minima, maxima = group  # O(1)
+            if not minima[patient_code] <= value:  # O(1)
+                minima[patient_code] = value  # O(1)
+            if not maxima[patient_code] >= value:  # O(1)
+                maxima[patient_code] = value  # O(1)
+
+        return extrema  # O(1)
+
+    def summary(self, lab_name: str) -> dict[str, LabSummary]:
+        """
+        Return every patient's summary statistics for a test.
+
+        The statistics of all laboratory tests are reduced in one pass
+        over the table, grouped by test name and patient, and cached
+        until the next append. They equal Patient.get_summary for
+        patients parsed from the same rows.
+
+        Time Complexity
+        ---------------
+        O(S) on the first call after an append, O(P) otherwise
+        S - number of rows in the table
+        P - number of patients in the table
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        Return
+        ------
+        dict[str, LabSummary]
+            the summary statistics keyed by patient id, for the patients
+            who took the laboratory test
+        """
+        if self._summaries is None:  # O(1)
+            self._summaries = self._summarize()  # O(s)
+
+        name_code = self.names.get(lab_name)  # O(1)
+        if name_code is None or name_code not in self._summaries:  # O(1)
+            return {}  # O(1)
+
+        summaries: dict[str, LabSummary] = {}  # O(1)
+        (
+            counts,
+            value_counts,
+            minima,
+            maxima,
+            totals,
+            last_values,
+            _,
+            earliest,
+            latest,
+        ) = self._summaries[name_code]  # O(1)
+        for patient_code, count in enumerate(counts):  # O(p)
+            if not count:  # O(1)
+                continue
+            value_count = value_counts[patient_code]  # O(1)
+            if value_count:  # O(1)
+                numbers = (
+                    minima[patient_code],
+                    maxima[patient_code],
+                    totals[patient_code] / value_count,
+                    last_values[patient_code],
+                )  # O(1)
+            else:
+                numbers = (None, None, None, None)  # O(1)
+            summaries[self.patient_ids[patient_code]] = LabSummary(
+                count,
+                value_count,
+                *numbers,
+                _from_micros(earliest[patient_code]),
+                _from_micros(latest[patient_code]),
+            )  # O(1)
+        return summaries  # O(1)
+
+    def _summarize(self) -> dict[int, tuple[array, ...]]:
+        """Return the summary statistics grouped by test name and patient."""
+        patient_count = len(self.patient_ids)  # O(1)
+        summaries: dict[int, tuple[array, ...]] = {}  # O(1)
+
+        for name_code, patient_code, value, timestamp in zip(
+            self.name_codes, self.patient_codes, self.values, self.timestamps
+        ):  # O(s)
+            group = summaries.get(name_code)  # O(1)
+            if group is None:  # O(1)
+                group = (
+                    array("q", [0]) * patient_count,
+                    array("q", [0]) * patient_count,
+                    array("d", [NAN]) * patient_count,
+                    array("d", [NAN]) * patient_count,
+                    array("d", [0.0]) * patient_count,
+                    array("d", [NAN]) * patient_count,
+                    array("q", [0]) * patient_count,
+                    array("q", [0]) * patient_count,
+                    array("q", [0]) * patient_count,
+                )  # O(p)
+                summaries[name_code] = group  # O(1)
+            (
+                counts,
+                value_counts,
+                minima,
+                maxima,
+                totals,
+                last_values,
+                last_times,
+                earliest,
+                latest,
+            ) = group  # O(1)
+
+            if not counts[patient_code]:  # O(1)
+                earliest[patient_code] = timestamp  # O(1)
+                latest[patient_code] = timestamp  # O(1)
+            elif timestamp < earliest[patient_code]:  # O(1)
+                earliest[patient_code] = timestamp  # O(1)
+            elif timestamp > latest[patient_code]:  # O(1)
+                latest[patient_code] = timestamp  # O(1)
+            counts[patient_code] += 1  # O(1)
+
+            if value != value:  # NaN O(1)
+                continue
+            if (
+                not value_counts[patient_code]
+                or timestamp >= last_times[patient_code]
+            ):  # O(1)
+                last_times[patient_code] = timestamp  # O(1)
+                last_values[patient_code] = value  # O(1)
+            value_counts[patient_code] += 1  # O(1)
+            totals[patient_code] += value  # O(1)
+            if not minima[patient_code] <= value:  # O(1)
+                minima[patient_code] = value  # O(1)
+            if not maxima[patient_code] >= value:  # O(1)
+                maxima[patient_code] = value  # O(1)
+
+        return summaries  # O(1)
+
+    def sick_mask(
+        self, lab_name: str, operator: str, value: float
+    ) -> list[bool]:
+        """
+        Return every patient's history of illness for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(P) total once extrema are cached
+        P - number of patients in the table
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        operator -- a string denoting a comparison operator: > or <
+
+        value -- a float denoting a value for a laboratory test to
+            assess the patients' history of illness
+
+        Return
+        ------
+        list[bool]
+            each patient's result of Patient.is_sick, indexed by the
+            patient's code in patient_ids
+        """
+        minima, maxima = self.extrema(lab_name)  # O(s) or O(1)
+        threshold = float(value)  # O(1)
+
+        if operator == ">":  # O(1)
+            return list(map(threshold.__lt__, maxima))  # O(p)
+        if operator == "<":  # O(1)
+            return list(map(threshold.__gt__, minima))  # O(p)
+        raise ValueError('"operator" must be > or <')
+
+    def sick_patients(
+        self, lab_name: str, operator: str, value: float
+    ) -> list[str]:
+        """
+        Return the ids of patients who are sick for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(P) total once extrema are cached
+        P - number of patients in the table
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        operator -- a string denoting a comparison operator: > or <
+
+        value -- a float denoting a value for a laboratory test to
+            assess the patients' history of illness
+
+        Return
+        ------
+        list[str]
+            the ids of the patients for whom Patient.is_sick is True
+        """
+        mask = self.sick_mask(lab_name, operator, value)  # O(p)
+        return list(compress(self.patient_ids.strings, mask))  # O(p)
+
+    def dump(self, outfile: BinaryIO) -> None:
+        """
+        Write the table to a binary file.
+
+        The vocabularies are written as a JSON block and every column
+        as the raw bytes of its array, so load needs no parsing per row.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of rows in the table
+
+        Arguments
+        ---------
+        outfile -- a binary file open for writing
+
+        Return
+        ------
+        None
+        """
+        codes = list(self._patient_rows)  # O(p)
+        row_order = array("q")  # O(1)
+        row_offsets = array("q", [0])  # O(1)
+        for patient_code in codes:  # O(p)
+            row_order.extend(self._patient_rows[patient_code])  # O(r)
+            row_offsets.append(len(row_order))  # O(1)
+
+        columns = self._columns() + [
+            array("q", codes),
+            row_order,
+            row_offsets,
+        ]  # O(p)
+        _write_block(
+            outfile,
+            {
+                "byteorder": sys.byteorder,
+                "vocabularies": [
+                    vocabulary.strings for vocabulary in self._vocabularies()
+                ],
+                "value_text": list(self._value_text.items()),
+                "columns": [
+                    [column.typecode, len(column)] for column in columns
+                ],
+            },
+        )  # O(s)
+        for column in columns:  # O(1)
+            column.tofile(outfile)  # O(s)
+
+    @classmethod
+    def load(cls, infile: BinaryIO) -> "LabTable":
+        """
+        Read a table written by dump from a binary file.
+
+        Time Complexity
+        ---------------
+        O(S) total, without any work per row in Python
+        S - number of rows in the table
+
+        Arguments
+        ---------
+        infile -- a binary file open for reading
+
+        Return
+        ------
+        LabTable
+            the table that was written
+        """
+        header = _read_block(infile)  # O(s)
+        if header["byteorder"] != sys.byteorder:  # O(1)
+            raise ValueError("table was written with another byte order")
+
+        table = cls()  # O(1)
+        for vocabulary, strings in zip(
+            table._vocabularies(), header["vocabularies"]
+        ):  # O(1)
+            for string in strings:  # O(v)
+                vocabulary.add(string)  # O(1)
+        table._value_text = {
+            row: value for row, value in header["value_text"]
+        }  # O(s)
+
+        columns = []  # O(1)
+        for typecode, length in header["columns"]:  # O(1)
+            column = array(typecode)  # O(1)
+            column.fromfile(infile, length)  # O(s)
+            columns.append(column)  # O(1)
+
+        (
+            table.patient_codes,
+            table.admission_codes,
+            table.name_codes,
+            table.unit_codes,
+            table.values,
+            table.timestamps,
+            codes,
+            row_order,
+            row_offsets,
+        ) = columns  # O(1)
+        for idx, patient_code in enumerate(codes):  # O(p)
+            table._patient_rows[patient_code] = row_order[
+                row_offsets[idx] : row_offsets[idx + 1]
+            ]  # O(r)
+        return table  # O(1)
+
+    def _vocabularies(self) -> list[Vocabulary]:
+        """Return the vocabularies in the order they are written."""
+        return self.vocabulary._vocabularies()  # O(1)
+
+    def _columns(self) -> list[array]:
+        """Return the columns in the order they are written."""
+        return [
+            self.patient_codes,
+            self.admission_codes,
+            self.name_codes,
+            self.unit_codes,
+            self.values,
+            self.timestamps,
+        ]  # O(1)
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return len(self.values)  # O(1)
+
+
+class LabCursor:
+    """
+    A class to remember how much of a lab .txt file has been parsed.
+
+    The checksum covers every byte before offset, so a file that was
+    rewritten rather than appended to is detected wherever it changed.
+
+    Attributes
+    ----------
+    lab_filename -- a string denoting the lab .txt file
+    offset -- an integer denoting the byte after the last parsed line,
+        or None if no line has been parsed
+    checksum -- a string denoting the checksum of the bytes before
+        offset, or None if no line has been parsed
+
+    Methods
+    -------
+    __init__(self, lab_filename, offset, checksum)
+        Construct all attributes for LabCursor class.
+
+    at_end(cls, lab_filename)
+        Return a cursor after the last complete line of a lab .txt file.
+
+    matches(self)
+        Return whether the bytes before offset are unchanged.
+
+    save(self, filename)
+        Write the cursor to a JSON file.
+
+    load(cls, filename)
+        Read a cursor from a JSON file.
+    """
+
+    def __init__(
+        self,
+        lab_filename: str,
+        offset: Optional[int] = None,
+        checksum: Optional[str] = None,
+    ) -> None:
+        """
+        Construct all attributes for LabCursor class.
+
+        Arguments
+        ---------
+        lab_filename -- a string denoting the lab .txt file
+        offset -- an optional integer denoting the byte after the last
+            parsed line
+        checksum -- an optional string denoting the checksum of the
+            bytes before offset
+
+        Return
+        -------
+        None
+        """
+        self.lab_filename = lab_filename  # O(1)
+        self.offset = offset  # O(1)
+        self.checksum = checksum  # O(1)
+
+    @classmethod
+    def at_end(cls, lab_filename: str) -> "LabCursor":
+        """
+        Return a cursor after the last complete line of a lab .txt file.
+
+        Use this cursor for records that were already parsed with
+        parse_data, so update_data only parses rows appended later.
+
+        Arguments
+        ---------
+        lab_filename -- a string denoting the lab .txt file
+
+        Return
+        ------
+        LabCursor
+            a cursor at the end of the last complete line
+        """
+        _require_uncompressed(lab_filename)  # O(1)
+        with open(lab_filename, "rb") as infile:  # O(1)
+            start = len(infile.readline())  # O(1)
+            size = os.fstat(infile.fileno()).st_size  # O(1)
+            offset = _last_line_end(infile, start, size)  # O(1)
+        return cls(
+            lab_filename, offset, _prefix_checksum(lab_filename, offset)
+        )  # O(b)
+
+    def matches(self) -> bool:
+        """
+        Return whether the bytes before offset are unchanged.
+
+        Return
+        ------
+        bool
+            True if the file still starts with the parsed bytes, and
+            False if otherwise
+        """
+        return self._verified_digest() is not None  # O(b)
+
+    def _verified_digest(self) -> Optional["hashlib.blake2b"]:
+        """
+        Return the digest of the bytes before offset if they are unchanged.
+
+        The digest can be continued over later bytes, so a caller that
+        verifies the prefix does not hash it again for its next cursor.
+
+        Return
+        ------
+        hashlib.blake2b or None
+            the digest of the bytes before offset, or None if they
+            changed
+        """
+        if self.offset is None:  # O(1)
+            return hashlib.blake2b()  # O(1)
+        try:
+            if os.path.getsize(self.lab_filename) < self.offset:  # O(1)
+                return None  # O(1)
+            digest = _prefix_digest(self.lab_filename, self.offset)  # O(b)
+        except OSError:
+            return None  # O(1)
+        if digest.hexdigest() != self.checksum:  # O(1)
+            return None  # O(1)
+        return digest  # O(1)
+
+    def save(self, filename: str) -> None:
+        """
+        Write the cursor to a JSON file.
+
+        Arguments
+        ---------
+        filename -- a string denoting the JSON file
+
+        Return
+        ------
+        None
+        """
+        with open(filename, "w") as outfile:  # O(1)
+            json.dump(
+                {
+                    "lab_filename": self.lab_filename,
+                    "offset": self.offset,
+                    "checksum": self.checksum,
+                },
+                outfile,
+            )  # O(1)
+
+    @classmethod
+    def load(cls, filename: str) -> "LabCursor":
+        """
+        Read a cursor from a JSON file.
+
+        Arguments
+        ---------
+        filename -- a string denoting a JSON file written by save
+
+        Return
+        ------
+        LabCursor
+            the cursor that was written
+        """
+        with open(filename, "r") as infile:  # O(1)
+            state = json.load(infile)  # O(1)
+        return cls(
+            state["lab_filename"], state["offset"], state["checksum"]
+        )  # O(1)
+
+
+class LoadStats:
+    """
+    A class to collect timings of one load of EHR data.
+
+    parse_data fills an instance of LoadStats when one is passed as
+    stats. Each stage records its wall time and the rows it produced:
+    snapshot_read, patients, labs, lab_sources and snapshot_write. The
+    read stage is the part of labs spent reading, decoding and splitting
+    lines, so labs minus read is the time spent building laboratory
+    tests and adding them to patients or a LabTable.
+
+    Attributes
+    ----------
+    seconds -- a dictionary of floats denoting the wall time of each
+        stage, keyed by stage name
+    rows -- a dictionary of integers denoting the rows produced by each
+        stage, keyed by stage name
+    bytes_read -- an integer denoting the bytes of input files read
+    peak_memory -- an integer denoting the peak resident set size of
+        the process in bytes at the end of the latest stage, or None
+        where the platform does not report it
+    hook -- an optional callable called with the stage name, wall time
+        and rows at the end of each stage
+
+    Methods
+    -------
+    __init__(self, hook)
+        Construct all attributes for LoadStats class.
+
+    stage(self, name)
+        Return a context manager that times one stage.
+
+    timed(self, iterable, name)
+        Yield the items of iterable, timing and counting them as a stage.
+
+    add_rows(self, name, count)
+        Add rows produced by a stage.
+
+    rows_per_second(self, name)
+        Return the throughput of a stage.
+
+    as_dict(self)
+        Return the collected timings as a dictionary.
+    """
+
+    def __init__(
+        self, hook: Optional[Callable[[str, float, int], None]] = None
+    ) -> None:
+        """
+        Construct all attributes for LoadStats class.
+
+        Arguments
+        ---------
+        hook -- an optional callable called with the stage name, wall
+            time in seconds and rows at the end of each stage, for
+            example to feed a metrics client
+
+        Return
+        -------
+        None
+        """
+        self.seconds: dict[str, float] = {}  # O(1)
+        self.rows: dict[str, int] = {}  # O(1)
+        self.bytes_read = 0  # O(1)
+        self.peak_memory: Optional[int] = None  # O(1)
+        self.hook = hook  # O(1)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Return a context manager that times one stage.
+
+        Arguments
+        ---------
+        name -- a string denoting the stage's name
+
+        Return
+        ------
+        Iterator[None]
+            a context manager that adds the wall time of its body to the
+            stage
+        """
+        start = perf_counter()  # O(1)
+        try:
+            yield
+        finally:
+            self._finish(name, perf_counter() - start)  # O(1)
+
+    def timed(self, iterable: Iterable[Any], name: str) -> Iterator[Any]:
+        """
+        Yield the items of iterable, timing and counting them as a stage.
+
+        Only the time spent producing items is counted, not the time the
+        caller spends on each item.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of items in iterable
+
+        Arguments
+        ---------
+        iterable -- an iterable of items
+
+        name -- a string denoting the stage's name
+
+        Return
+        ------
+        Iterator[Any]
+            the items of iterable
+        """
+        iterator = iter(iterable)  # O(1)
+        elapsed = 0.0  # O(1)
+        count = 0  # O(1)
+        try:
+            while True:  # O(n)
+                start = perf_counter()  # O(1)
+                try:
+                    item = next(iterator)  # O(1)
+                except StopIteration:
+                    elapsed += perf_counter() - start  # O(1)
+                    break
+                elapsed += perf_counter() - start  # O(1)
+                count += 1  # O(1)
+                yield item
+        finally:
+            self.rows[name] = self.rows.get(name, 0) + count  # O(1)
+            self._finish(name, elapsed)  # O(1)
+
+    def add_rows(self, name: str, count: int) -> None:
+        """
+        Add rows produced by a stage.
+
+        Arguments
+        ---------
+        name -- a string denoting the stage's name
+
+        count -- an integer denoting the number of rows
+
+        Return
+        ------
+        None
+        """
+        self.rows[name] = self.rows.get(name, 0) + count  # O(1)
+
+    def rows_per_second(self, name: str) -> float:
+        """
+        Return the throughput of a stage.
+
+        Arguments
+        ---------
+        name -- a string denoting the stage's name
+
+        Return
+        ------
+        float
+            the stage's rows divided by its wall time, or 0.0 if the
+            stage did not run
+        """
+        seconds = self.seconds.get(name, 0.0)  # O(1)
+        return self.rows.get(name, 0) / seconds if seconds else 0.0  # O(1)
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Return the collected timings as a dictionary.
+
+        Arguments
+        ---------
+        None
+
+        Return
+        ------
+        dict[str, Any]
+            the seconds, rows, rows per second, bytes read and peak
+            memory, ready for json.dumps or a metrics client
+        """
+        return {
+            "seconds": dict(self.seconds),
+            "rows": dict(self.rows),
+            "rows_per_second": {
+                name: self.rows_per_second(name) for name in self.seconds
+            },
+            "bytes_read": self.bytes_read,
+            "peak_memory": self.peak_memory,
+        }  # O(1)
+
+    def _finish(self, name: str, seconds: float) -> None:
+        """Add the wall time of a stage and report it to the hook."""
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds  # O(1)
+        self.peak_memory = _peak_memory()  # O(1)
+        if self.hook is not None:  # O(1)
+            self.hook(name, seconds, self.rows.get(name, 0))  # O(1)
+
+
+class LabIndex:
+    """
+    A class to locate each patient's laboratory tests in a lab .txt file.
+
+    The index holds the byte offset of every line of the lab file,
+    grouped by patient id, so one patient's laboratory tests can be read
+    without parsing the rest of the file. It can be saved to disk and is
+    only loaded back while the lab file is unchanged.
+
+    Attributes
+    ----------
+    lab_filename -- a string denoting the indexed lab .txt file
+    offsets -- a dictionary of arrays of integers denoting the byte
+        offsets of each patient's lines, keyed by patient id
+    indices -- a list of integers denoting the column of each variable
+        in LAB_VARIABLES
+    fingerprint -- a dictionary denoting the path, size, modification
+        time and content hash of the lab file when it was indexed
+
+    Methods
+    -------
+    __init__(self, lab_filename, offsets, indices, fingerprint)
+        Construct all attributes for LabIndex class.
+
+    build(cls, lab_filename)
+        Index a lab .txt file in one pass.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of lines in the lab .txt file
+
+    read_labs(self, patient_id)
+        Return instances of the Lab class for one patient.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+    extend(self, start, end)
+        Index the lines of the lab file between two byte offsets.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of lines between the offsets
+
+    save(self, filename)
+        Write the index to a binary file.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of lines in the lab .txt file
+
+    load(cls, filename)
+        Read an index written by save from a binary file.
+
+        Time Complexity
+        ---------------
+        O(S) total, without any work per line in Python
+        S - number of lines in the lab .txt file
+    """
+
+    def __init__(
+        self,
+        lab_filename: str,
+        offsets: dict[str, array],
+        indices: list[int],
+        fingerprint: dict[str, Any],
+    ) -> None:
+        """
+        Construct all attributes for LabIndex class.
+
+        Arguments
+        ---------
+        lab_filename -- a string denoting the indexed lab .txt file
+
+        offsets -- a dictionary of arrays of integers denoting the byte
+            offsets of each patient's lines, keyed by patient id
+
+        indices -- a list of integers denoting the column of each
+            variable in LAB_VARIABLES
+
+        fingerprint -- a dictionary returned by _fingerprint for the
+            lab file
+
+        Return
+        -------
+        None
+        """
+        self.lab_filename = lab_filename  # O(1)
+        self.offsets = offsets  # O(1)
+        self.indices = indices  # O(1)
+        self.fingerprint = fingerprint  # O(1)
+
+    @classmethod
+    def build(cls, lab_filename: str) -> "LabIndex":
+        """
+        Index a lab .txt file in one pass.
+
+        Only the patient id of each line is decoded, and the content hash
+        of the fingerprint is updated with each line as it is indexed, so
+        the file is read once.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of lines in the lab .txt file
+
+        Arguments
+        ---------
+        lab_filename -- a string denoting the lab history information
+            for the patients
+
+        Return
+        ------
+        LabIndex
+            the byte offsets of each patient's lines
+        """
+        _require_uncompressed(lab_filename)  # O(1)
+        encoding = locale.getpreferredencoding(False)  # O(1)
+        digest = hashlib.blake2b()  # O(1)
+        offsets: dict[str, array] = {}  # O(1)
+
+        with open(lab_filename, "rb") as infile:  # O(1)
+            stat = os.fstat(infile.fileno())  # O(1)
+            header = infile.readline()  # O(1)
+            digest.update(header)  # O(1)
+            indices = _header_indices(header.decode(encoding), LAB_VARIABLES)
+            column = indices[0]  # O(1)
+            offset = len(header)  # O(1)
+            for aline in infile:  # O(s)
+                digest.update(aline)  # O(1)
+                patient_id = aline.split(b"\t", column + 1)[column].strip()
+                rows = offsets.get(patient_id)  # O(1)
+                if rows is None:  # O(1)
+                    rows = array("q")  # O(1)
+                    offsets[patient_id] = rows  # O(1)
+                rows.append(offset)  # O(1)
+                offset += len(aline)  # O(1)
+
+        fingerprint = _fingerprint(lab_filename, stat, digest.hexdigest())
+        return cls(
+            lab_filename,
+            {key.decode(encoding): rows for key, rows in offsets.items()},
+            indices,
+            fingerprint,
+        )  # O(q)
+
+    def read_labs(self, patient_id: str) -> list[Lab]:
+        """
+        Return instances of the Lab class for one patient.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+        Arguments
+        ---------
+        patient_id -- a string denoting the patient's id
+
+        Return
+        ------
+        list[Lab]
+            instances of the Lab class for the patient's lines, in file
+            order
+        """
+        offsets = self.offsets.get(patient_id)  # O(1)
+        if not offsets:  # O(1)
+            return []  # O(1)
+
+        encoding = locale.getpreferredencoding(False)  # O(1)
+        indices = self.indices  # O(1)
+        labs = []  # O(1)
+        with open(self.lab_filename, "rb") as infile:  # O(1)
+            for offset in offsets:  # O(n)
+                infile.seek(offset)  # O(1)
+                fields = infile.readline().split(b"\t")  # O(t)
+                fields[-1] = fields[-1].strip()  # O(1)
+                labs.append(
+                    Lab(*[fields[idx].decode(encoding) for idx in indices])
+                )  # O(1)
+        return labs  # O(1)
+
+    def extend(self, start: int, end: int) -> None:
+        """
+        Index the lines of the lab file between two byte offsets.
+
+        update_data calls this for lines appended after the index was
+        built. The fingerprint is left as it was, so a saved copy of the
+        extended index is not loaded back by load.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of lines between the offsets
+
+        Arguments
+        ---------
+        start -- an integer denoting the first byte of the first line
+
+        end -- an integer denoting the byte after the last line
+
+        Return
+        ------
+        None
+        """
+        encoding = locale.getpreferredencoding(False)  # O(1)
+        column = self.indices[0]  # O(1)
+        offset = start  # O(1)
+        with open(self.lab_filename, "rb") as infile:  # O(1)
+            infile.seek(start)  # O(1)
+            lines = infile.read(end - start).splitlines(keepends=True)
+        for aline in lines:  # O(s)
+            patient_id = aline.split(b"\t", column + 1)[column].strip()
+            key = patient_id.decode(encoding)  # O(1)
+            rows = self.offsets.get(key)  # O(1)
+            if rows is None:  # O(1)
+                rows = array("q")  # O(1)
+                self.offsets[key] = rows  # O(1)
+            rows.append(offset)  # O(1)
+            offset += len(aline)  # O(1)
+
+    def save(self, filename: str) -> None:
+        """
+        Write the index to a binary file.
+
+        The patient ids are written as a JSON block and the offsets of
+        all patients as the raw bytes of one array. The index is written
+        to a temporary file that replaces filename once complete.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of lines in the lab .txt file
+
+        Arguments
+        ---------
+        filename -- a string denoting the index file
+
+        Return
+        ------
+        None
+        """
+        temporary = f"{filename}.{os.getpid()}.tmp"  # O(1)
+        with open(temporary, "wb") as outfile:  # O(1)
+            outfile.write(INDEX_MAGIC)  # O(1)
+            _write_block(
+                outfile,
+                {
+                    "byteorder": sys.byteorder,
+                    "fingerprint": self.fingerprint,
+                    "indices": self.indices,
+                    "patient_ids": list(self.offsets),
+                    "counts": [len(rows) for rows in self.offsets.values()],
+                },
+            )  # O(q)
+            for rows in self.offsets.values():  # O(q)
+                rows.tofile(outfile)  # O(n)
+        os.replace(temporary, filename)  # O(1)
+
+    @classmethod
+    def load(cls, filename: str) -> Optional["LabIndex"]:
+        """
+        Read an index written by save from a binary file.
+
+        Time Complexity
+        ---------------
+        O(S) total, without any work per line in Python
+        S - number of lines in the lab .txt file
+
+        Arguments
+        ---------
+        filename -- a string denoting a file written by save
+
+        Return
+        ------
+        LabIndex or None
+            the index, or None if the file is missing or unreadable or
+            the lab file has changed since it was indexed
+        """
+        try:
+            with open(filename, "rb") as infile:  # O(1)
+                if infile.read(len(INDEX_MAGIC)) != INDEX_MAGIC:  # O(1)
+                    return None  # O(1)
+                meta = _read_block(infile)  # O(q)
+                if not _is_current(meta["fingerprint"]):  # O(1)
+                    return None  # O(1)
+                offsets: dict[str, array] = {}  # O(1)
+                for patient_id, count in zip(
+                    meta["patient_ids"], meta["counts"]
+                ):  # O(q)
+                    rows = array("q")  # O(1)
+                    rows.fromfile(infile, count)  # O(n)
+                    if meta["byteorder"] != sys.byteorder:  # O(1)
+                        rows.byteswap()  # O(n)
+                    offsets[patient_id] = rows  # O(1)
+        except (OSError, ValueError, KeyError, struct.error, EOFError):
+            return None  # O(1)
+        return cls(
+            meta["fingerprint"]["path"],
+            offsets,
+            meta["indices"],
+            meta["fingerprint"],
+        )  # O(1)
+
+
+class LabCache:
+    """
+    A class to bound how many patients' laboratory tests stay in memory.
+
+    Patients attached to the cache read their laboratory tests from a
+    LabIndex on first access. Once more than max_patients patients have
+    their laboratory tests in memory, the least recently used patient's
+    are dropped and read again on its next access.
+
+    Attributes
+    ----------
+    index -- an instance of the LabIndex class
+    max_patients -- an integer denoting the most patients whose
+        laboratory tests stay in memory, or None for no bound
+    resident -- an ordered dictionary of instances of the Patient class
+        whose laboratory tests are in memory, keyed by patient id from
+        least to most recently used
+
+    Methods
+    -------
+    __init__(self, index, max_patients)
+        Construct all attributes for LabCache class.
+
+    attach(self, records)
+        Read the patients' laboratory tests through the cache.
+
+        Time Complexity
+        ---------------
+        O(Q) total
+        Q - number of patients
+
+    touch(self, patient)
+        Mark a patient as most recently used.
+
+        Time Complexity
+        ---------------
+        O(1) total
+    """
+
+    def __init__(
+        self, index: LabIndex, max_patients: Optional[int] = None
+    ) -> None:
+        """
+        Construct all attributes for LabCache class.
+
+        Arguments
+        ---------
+        index -- an instance of the LabIndex class
+
+        max_patients -- an optional integer denoting the most patients
+            whose laboratory tests stay in memory
+
+        Return
+        -------
+        None
+        """
+        if max_patients is not None and max_patients < 1:  # O(1)
+            raise ValueError('"max_patients" must be a positive integer')
+        self.index = index  # O(1)
+        self.max_patients = max_patients  # O(1)
+        self.resident: OrderedDict[str, Patient] = OrderedDict()  # O(1)
+
+    def attach(self, records: dict[str, Patient]) -> None:
+        """
+        Read the patients' laboratory tests through the cache.
+
+        Time Complexity
+        ---------------
+        O(Q) total
+        Q - number of patients
+
+        Arguments
+        ---------
+        records -- a dictionary of instances of the Patient class keyed
+            by patient id
+
+        Return
+        ------
+        None
+        """
+        for patient in records.values():  # O(q)
+            patient._lab_cache = self  # O(1)
+            patient.unload_labs(partial(self._load, patient))  # O(1)
+
+    def touch(self, patient: Patient) -> None:
+        """
+        Mark a patient as most recently used.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        patient -- an instance of the Patient class attached to the
+            cache
+
+        Return
+        ------
+        None
+        """
+        if patient.id in self.resident:  # O(1)
+            self.resident.move_to_end(patient.id)  # O(1)
+
+    def _load(self, patient: Patient) -> list[Lab]:
+        """Return a patient's laboratory tests and evict the oldest."""
+        labs = self.index.read_labs(patient.id)  # O(n)
+        self.resident[patient.id] = patient  # O(1)
+        self.resident.move_to_end(patient.id)  # O(1)
+        while (
+            self.max_patients is not None
+            and len(self.resident) > self.max_patients
+        ):  # O(1) amortized
+            _, evicted = self.resident.popitem(last=False)  # O(1)
+            evicted.unload_labs(partial(self._load, evicted))  # O(1)
+        return labs  # O(1)
+
+
+class LabFilter:
+    """
+    A class to select the rows and columns of a lab file while it is read.
+
+    Rows are rejected before any instance of the Lab class is built. When
+    exactly one lab name, or else exactly one patient id, is requested,
+    each line is first searched for it as a substring, which rejects most
+    lines without splitting them; memory-mapped files are searched as
+    bytes, before anything is decoded. Lines are split only up to the
+    last column that is used.
+
+    Attributes
+    ----------
+    lab_names -- a frozenset of strings denoting the laboratory test
+        names to keep, or None to keep every name
+    patient_ids -- a frozenset of strings denoting the patient ids to
+        keep, or None to keep every patient
+    start -- a string denoting the earliest date and time to keep, or
+        None for no lower bound
+    end -- a string denoting the latest date and time to keep, or None
+        for no upper bound
+    columns -- a tuple of strings denoting the variables of
+        LAB_VARIABLES to keep; the others are read as empty strings
+
+    Methods
+    -------
+    __init__(self, lab_names, patient_ids, start, end, columns)
+        Construct all attributes for LabFilter class.
+
+    keeps_patient(self, patient_id)
+        Return whether a patient's rows can be kept.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+    select(self, lines, header, encoding)
+        Yield the kept fields of the kept lines of a lab file.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of lines
+    """
+
+    def __init__(
+        self,
+        lab_names: Optional[Iterable[str]] = None,
+        patient_ids: Optional[Iterable[str]] = None,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+        columns: Optional[Iterable[str]] = None,
+    ) -> None:
+        """
+        Construct all attributes for LabFilter class.
+
+        Arguments
+        ---------
+        lab_names -- an optional iterable of strings denoting the
+            laboratory test names to keep
+
+        patient_ids -- an optional iterable of strings denoting the
+            patient ids to keep
+
+        start -- an optional datetime, or string formatted as the
+            laboratory tests' dates and times, denoting the earliest
+            date and time to keep
+
+        end -- an optional datetime, or string formatted as the
+            laboratory tests' dates and times, denoting the latest date
+            and time to keep
+
+        columns -- an optional iterable of strings denoting the variables
+            of LAB_VARIABLES to keep, which must include PatientID
+
+        Return
+        -------
+        None
+        """
+        self.lab_names = None if lab_names is None else frozenset(lab_names)
+        self.patient_ids = (
+            None if patient_ids is None else frozenset(patient_ids)
+        )  # O(1)
+        self.start = None if start is None else _date_key(start, True)
+        self.end = None if end is None else _date_key(end)  # O(1)
+
+        if columns is None:  # O(1)
+            columns = LAB_VARIABLES  # O(1)
+        self.columns = tuple(
+            variable for variable in LAB_VARIABLES if variable in set(columns)
+        )  # O(1)
+        unknown = set(columns) - set(LAB_VARIABLES)  # O(1)
+        if unknown:  # O(1)
+            raise ValueError(f'unknown lab columns: {", ".join(unknown)}')
+        if "PatientID" not in self.columns:  # O(1)
+            raise ValueError('"columns" must include "PatientID"')
+
+    def keeps_patient(self, patient_id: str) -> bool:
+        """
+        Return whether a patient's rows can be kept.
+
+        Time Complexity
+        ---------------
+        O(1) total
+
+        Arguments
+        ---------
+        patient_id -- a string denoting a patient's id
+
+        Return
+        ------
+        bool
+            True if no patient ids were requested or patient_id is one
+            of them
+        """
+        return self.patient_ids is None or patient_id in self.patient_ids
+
+    def select(
+        self,
+        lines: Iterable[AnyStr],
+        header: str,
+        encoding: Optional[str] = None,
+    ) -> Iterator[list[str]]:
+        """
+        Yield the kept fields of the kept lines of a lab file.
+
+        Time Complexity
+        ---------------
+        O(S) total
+        S - number of lines
+
+        Arguments
+        ---------
+        lines -- an iterable of the lab file's lines after the header,
+            as strings, or as bytes when encoding is given
+
+        header -- a string denoting the lab file's header line
+
+        encoding -- an optional string denoting the encoding of lines
+            that are bytes
+
+        Return
+        ------
+        Iterator[list[str]]
+            the fields of each kept line, in the order of LAB_VARIABLES,
+            with empty strings for the columns that are not kept
+        """
+        if encoding is None:  # O(1)
+            convert: Callable[[str], Any] = str  # O(1)
+            decode: Callable[[Any], str] = str  # O(1)
+        else:
+            convert = methodcaller("encode", encoding)  # O(1)
+            decode = methodcaller("decode", encoding)  # O(1)
+
+        indices = _header_indices(header, LAB_VARIABLES)  # O(t)
+        last_column = header.count("\t")  # O(t)
+        patient_idx, name_idx, date_idx = (
+            indices[0],
+            indices[2],
+            indices[5],
+        )  # O(1)
+        names = (
+            None
+            if self.lab_names is None
+            else {convert(name) for name in self.lab_names}
+        )  # O(1)
+        ids = (
+            None
+            if self.patient_ids is None
+            else {convert(id) for id in self.patient_ids}
+        )  # O(1)
+        start = None if self.start is None else convert(self.start)  # O(1)
+        end = None if self.end is None else convert(self.end)  # O(1)
+
+        needle = None  # O(1)
+        if names is not None and len(names) == 1:  # O(1)
+            needle = next(iter(names))  # O(1)
+        elif ids is not None and len(ids) == 1:  # O(1)
+            needle = next(iter(ids))  # O(1)
+
+        kept = [
+            indices[position]
+            for position, variable in enumerate(LAB_VARIABLES)
+            if variable in self.columns
+        ]  # O(1)
+        used = kept + [name_idx] * (names is not None)  # O(1)
+        used += [date_idx] * (start is not None or end is not None)  # O(1)
+        maxsplit = max(used) + 1  # O(1)
+        if maxsplit > last_column:  # O(1)
+            maxsplit = -1  # O(1)
+        sep = convert("\t")  # O(1)
+        empty = [""] * len(LAB_VARIABLES)  # O(1)
+        positions = [
+            (position, indices[position])
+            for position, variable in enumerate(LAB_VARIABLES)
+            if variable in self.columns
+        ]  # O(1)
+
+        for aline in lines:  # O(s)
+            if needle is not None and needle not in aline:  # O(t)
+                continue
+            fields = aline.split(sep, maxsplit)  # O(t)
+            if maxsplit == -1:  # O(1)
+                fields[-1] = fields[-1].strip()  # O(t)
+            if names is not None and fields[name_idx] not in names:  # O(1)
+                continue
+            if ids is not None and fields[patient_idx] not in ids:  # O(1)
+                continue
+            if start is not None and fields[date_idx] < start:  # O(1)
+                continue
+            if end is not None and fields[date_idx] > end:  # O(1)
+                continue
+            row = empty[:]  # O(1)
+            for position, idx in positions:  # O(1)
+                row[position] = decode(fields[idx])  # O(1)
+            yield row  # O(1)
+
+
+class _StringColumn:
+    """A read-only sequence of strings stored as offsets into UTF-8 bytes."""
+
+    def __init__(self, offsets: memoryview, data: memoryview) -> None:
+        """Wrap the end offsets and bytes of a string column."""
+        self._offsets = offsets  # O(1)
+        self._data = data  # O(1)
+
+    def __len__(self) -> int:
+        """Return the number of strings."""
+        return len(self._offsets) - 1  # O(1)
+
+    def __getitem__(self, idx: int) -> str:
+        """Return one string, decoded from the shared bytes."""
+        if not 0 <= idx < len(self._offsets) - 1:  # O(1)
+            raise IndexError(idx)
+        return str(
+            self._data[self._offsets[idx] : self._offsets[idx + 1]], "utf-8"
+        )  # O(1)
+
+
+class LabStore:
+    """
+    A class to read patients and laboratory tests from a shared store.
+
+    A store file is written once by write_store and memory-mapped
+    read-only by every process that opens it. Its columns are used in
+    place through memoryviews, so the pages are shared through the
+    operating system's page cache and each process holds only the small
+    vocabularies of admission ids, test names and units rather than its
+    own copy of every patient and laboratory test.
+
+    Patients are sorted by id, and each patient's laboratory tests are
+    grouped by test name and sorted by date and time within a group.
+    Each group holds the minimum and maximum numeric value, so is_sick
+    needs no scan of the laboratory tests. The same minima and maxima
+    are also stored name by name, in order of patient, so sick_patients
+    scans one contiguous column.
+
+    Attributes
+    ----------
+    filename -- a string denoting the store file
+    patient_ids -- a sequence of strings denoting the patients' ids,
+        sorted
+    admission_ids -- a Vocabulary of the laboratory tests' admission ids
+    names -- a Vocabulary of the laboratory tests' names
+    units -- a Vocabulary of the laboratory tests' units
+
+    Methods
+    -------
+    __init__(self, store_filename)
+        Memory-map a store file written by write_store.
+
+    __getitem__(self, patient_id)
+        Return a PatientView of one patient.
+
+        Time Complexity
+        ---------------
+        O(log Q) total
+        Q - number of patients
+
+    sick_patients(self, lab_name, operator, value)
+        Return the ids of patients who are sick for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(G) total
+        G - number of patients who took the laboratory test
+
+    close(self)
+        Release the memory map.
+
+    __len__(self)
+        Return the number of patients.
+
+    __iter__(self)
+        Iterate over the patients' ids.
+    """
+
+    def __init__(self, store_filename: str) -> None:
+        """
+        Memory-map a store file written by write_store.
+
+        Arguments
+        ---------
+        store_filename -- a string denoting the store file
+
+        Return
+        -------
+        None
+        """
+        with open(store_filename, "rb") as infile:  # O(1)
+            if infile.read(len(STORE_MAGIC)) != STORE_MAGIC:  # O(1)
+                raise ValueError(f"{store_filename} is not a store file")
+            header = _read_block(infile)  # O(v)
+            start = _aligned(infile.tell())  # O(1)
+            self._map = mmap.mmap(
+                infile.fileno(), 0, access=mmap.ACCESS_READ
+            )  # O(1)
+        if header["byteorder"] != sys.byteorder:  # O(1)
+            self._map.close()  # O(1)
+            raise ValueError("store was written with another byte order")
+
+        self.filename = store_filename  # O(1)
+        self._views = [memoryview(self._map)]  # O(1)
+        columns: dict[str, memoryview] = {}  # O(1)
+        for name, typecode, offset, size in header["columns"]:  # O(1)
+            view = self._views[0][start + offset : start + offset + size]
+            columns[name] = view.cast(typecode)  # O(1)
+            self._views.extend((view, columns[name]))  # O(1)
+
+        self.admission_ids, self.names, self.units = (
+            Vocabulary(),
+            Vocabulary(),
+            Vocabulary(),
+        )  # O(1)
+        for vocabulary, strings in zip(
+            (self.admission_ids, self.names, self.units),
+            header["vocabularies"],
+        ):  # O(1)
+            for string in strings:  # O(v)
+                vocabulary.add(string)  # O(1)
+
+        self._demographics = {
+            variable: _StringColumn(
+                columns[variable + ".offsets"], columns[variable]
+            )
+            for variable in PATIENT_VARIABLES
+        }  # O(1)
+        self.patient_ids = self._demographics["PatientID"]  # O(1)
+        self._value_text = _StringColumn(
+            columns["LabValueText.offsets"], columns["LabValueText"]
+        )  # O(1)
+        self._columns = columns  # O(1)
+
+    def __getitem__(self, patient_id: str) -> "PatientView":
+        """Return a PatientView of one patient, or raise KeyError."""
+        code = self._code(patient_id)  # O(log q)
+        if code is None:  # O(1)
+            raise KeyError(patient_id)
+        return PatientView(self, code)  # O(1)
+
+    def __contains__(self, patient_id: object) -> bool:
+        """Return whether the store holds a patient."""
+        if not isinstance(patient_id, str):  # O(1)
+            return False  # O(1)
+        return self._code(patient_id) is not None  # O(log q)
+
+    def __len__(self) -> int:
+        """Return the number of patients."""
+        return len(self.patient_ids)  # O(1)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the patients' ids."""
+        return iter(self.patient_ids)  # O(1)
+
+    def __enter__(self) -> "LabStore":
+        """Return the store."""
+        return self  # O(1)
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Release the memory map."""
+        self.close()  # O(1)
+
+    def close(self) -> None:
+        """
+        Release the memory map.
+
+        Views of the store cannot be used once it is closed.
+
+        Return
+        ------
+        None
+        """
+        for view in reversed(self._views):  # O(1)
+            view.release()  # O(1)
+        self._map.close()  # O(1)
+
+    def sick_patients(
+        self, lab_name: str, operator: str, value: float
+    ) -> list[str]:
+        """
+        Return the ids of patients who are sick for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(G) total
+        G - number of patients who took the laboratory test
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        operator -- a string denoting a comparison operator: > or <
+
+        value -- a float denoting a value for a laboratory test to
+            assess the patients' history of illness
+
+        Return
+        ------
+        list[str]
+            the ids of the patients for whom Patient.is_sick is True, in
+            order of id
+        """
+        if operator not in (">", "<"):  # O(1)
+            raise ValueError('"operator" must be > or <')
+        name_code = self.names.get(lab_name)  # O(1)
+        if name_code is None:  # O(1)
+            return []  # O(1)
+
+        columns = self._columns  # O(1)
+        start = columns["name_groups"][name_code]  # O(1)
+        end = columns["name_groups"][name_code + 1]  # O(1)
+        threshold = float(value)  # O(1)
+        if operator == ">":  # O(1)
+            sick = map(threshold.__lt__, columns["name_max"][start:end])
+        else:
+            sick = map(threshold.__gt__, columns["name_min"][start:end])
+        codes = compress(columns["name_patients"][start:end], sick)  # O(g)
+        return [self.patient_ids[code] for code in codes]  # O(g)
+
+    def _code(self, patient_id: str) -> Optional[int]:
+        """Return a patient's position in patient_ids, or None."""
+        code = bisect_left(self.patient_ids, patient_id)  # O(log q)
+        if code < len(self) and self.patient_ids[code] == patient_id:
+            return code  # O(1)
+        return None  # O(1)
+
+    def _group(self, code: int, lab_name: str) -> Optional[int]:
+        """Return the group of a patient's tests of one name, or None."""
+        name_code = self.names.get(lab_name)  # O(1)
+        if name_code is None:  # O(1)
+            return None  # O(1)
+        groups = self._columns["patient_groups"]  # O(1)
+        group_names = self._columns["group_names"]  # O(1)
+        group = bisect_left(
+            group_names, name_code, groups[code], groups[code + 1]
+        )  # O(log n)
+        if group < groups[code + 1] and group_names[group] == name_code:
+            return group  # O(1)
+        return None  # O(1)
+
+    def _is_sick(
+        self, code: int, lab_name: str, operator: str, value: float
+    ) -> bool:
+        """Return Patient.is_sick for the patient at code."""
+        if operator not in (">", "<"):  # O(1)
+            raise ValueError('"operator" must be > or <')
+        group = self._group(code, lab_name)  # O(log n)
+        if group is None:  # O(1)
+            return False  # O(1)
+        if operator == ">":  # O(1)
+            return self._columns["group_max"][group] > value  # O(1)
+        return self._columns["group_min"][group] < value  # O(1)
+
+    def _rows(self, code: int) -> range:
+        """Return the rows of a patient's laboratory tests."""
+        groups = self._columns["patient_groups"]  # O(1)
+        group_rows = self._columns["group_rows"]  # O(1)
+        return range(
+            group_rows[groups[code]], group_rows[groups[code + 1]]
+        )  # O(1)
+
+    def _labs(self, code: int) -> list[Lab]:
+        """Return instances of the Lab class for a patient's rows."""
+        columns = self._columns  # O(1)
+        patient_id = self.patient_ids[code]  # O(1)
+        text_rows = columns["value_text_rows"]  # O(1)
+        groups = columns["patient_groups"]  # O(1)
+        labs = []  # O(1)
+        for group in range(groups[code], groups[code + 1]):  # O(n)
+            name = self.names[columns["group_names"][group]]  # O(1)
+            for row in range(
+                columns["group_rows"][group], columns["group_rows"][group + 1]
+            ):  # O(n)
+                text = bisect_left(text_rows, row)  # O(log s)
+                if text < len(text_rows) and text_rows[text] == row:  # O(1)
+                    value = self._value_text[text]  # O(1)
+                else:
+                    value = repr(columns["values"][row])  # O(1)
+                labs.append(
+                    Lab(
+                        patient_id,
+                        self.admission_ids[columns["admission_codes"][row]],
+                        name,
+                        value,
+                        self.units[columns["unit_codes"][row]],
+                        _from_micros(columns["timestamps"][row]),
+                    )
+                )  # O(1)
+        return labs  # O(1)
+
+
+class PatientView:
+    """
+    A class to read one patient of a LabStore without copying it.
+
+    A view answers the same questions as an instance of the Patient
+    class, reading the patient's demographics and laboratory tests from
+    the store's shared memory on every access.
+
+    Attributes
+    ----------
+    store -- the LabStore that holds the patient
+    code -- an integer denoting the patient's position in the store
+
+    Methods
+    -------
+    id, gender, dob, race, ms, lang, pbp
+        The patient's demographic properties.
+
+    dob_datetime
+        The patient's parsed date of birth property.
+
+    age
+        The patient's age property.
+
+    first_visit
+        The patient's first visit property.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+    labs
+        The patient's laboratory tests property.
+
+    get_labs(self)
+        Return the laboratory test history for the patient.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+    is_sick(self, lab_name, operator, value)
+        Return the patient's history of illness for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(log N) total
+        N - number of laboratory test names taken by the patient
+
+    age_first_visit(self)
+        Return the patient's age at first admission.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+    """
+
+    def __init__(self, store: LabStore, code: int) -> None:
+        """
+        Construct all attributes for PatientView class.
+
+        Arguments
+        ---------
+        store -- an instance of the LabStore class
+
+        code -- an integer denoting the patient's position in the store
+
+        Return
+        -------
+        None
+        """
+        self.store = store  # O(1)
+        self.code = code  # O(1)
+
+    def _demographic(self, variable: str) -> str:
+        """Return one of the patient's demographic strings."""
+        return self.store._demographics[variable][self.code]  # O(1)
+
+    @property
+    def id(self) -> str:
+        """The patient's ID property."""
+        return self._demographic("PatientID")  # O(1)
+
+    @property
+    def gender(self) -> str:
+        """The patient's gender property."""
+        return self._demographic("PatientGender")  # O(1)
+
+    @property
+    def dob(self) -> str:
+        """The patient's date of birth property."""
+        return self._demographic("PatientDateOfBirth")  # O(1)
+
+    @property
+    def race(self) -> str:
+        """The patient's race property."""
+        return self._demographic("PatientRace")  # O(1)
+
+    @property
+    def ms(self) -> str:
+        """The patient's marital status property."""
+        return self._demographic("PatientMaritalStatus")  # O(1)
+
+    @property
+    def lang(self) -> str:
+        """The patient's language property."""
+        return self._demographic("PatientLanguage")  # O(1)
+
+    @property
+    def pbp(self) -> str:
+        """The patient's community poverty percent property."""
+        return self._demographic(
+            "PatientPopulationPercentageBelowPoverty"
+        )  # O(1)
+
+    @property
+    def dob_datetime(self) -> datetime:
+        """The patient's parsed date of birth property."""
+        return _parse_datetime(self.dob)  # O(1)
+
+    @property
+    def age(self) -> int:
+        """The patient's age property."""
+        return _age_on(self.dob_datetime, date.today())  # O(1)
+
+    @property
+    def labs(self) -> list[Lab]:
+        """The patient's laboratory tests property."""
+        return self.get_labs()  # O(n)
+
+    def get_labs(self) -> list[Lab]:
+        """
+        Return the laboratory test history for the patient.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+        Return
+        -------
+        list[Lab]
+            new instances of the Lab class, grouped by test name and
+            sorted by date and time within a name
+        """
+        return self.store._labs(self.code)  # O(n)
+
+    def is_sick(self, lab_name: str, operator: str, value: float) -> bool:
+        """
+        Return the patient's history of illness for a laboratory test.
+
+        Time Complexity
+        ---------------
+        O(log N) total
+        N - number of laboratory test names taken by the patient
+
+        Arguments
+        ---------
+        lab_name -- a string denoting the name of a laboratory test
+
+        operator -- a string denoting a comparison operator: > or <
+
+        value -- a float denoting a value for a laboratory test to
+            assess the patient's history of illness
+
+        Return
+        -------
+        bool
+            the result of Patient.is_sick for the same laboratory tests
+        """
+        return self.store._is_sick(
+            self.code, lab_name, operator, value
+        )  # O(log n)
+
+    @property
+    def first_visit(self) -> Optional[str]:
+        """
+        The patient's first visit property.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+        Return
+        ------
+        str or None
+            the date and time of the patient's earliest laboratory test,
+            or None if the patient has no laboratory tests
+        """
+        rows = self.store._rows(self.code)  # O(1)
+        if not rows:  # O(1)
+            return None  # O(1)
+        timestamps = self.store._columns["timestamps"]  # O(1)
+        with timestamps[rows.start : rows.stop] as own:  # O(1)
+            first = min(own)  # O(n)
+        return _from_micros(first)  # O(1)
+
+    def age_first_visit(self) -> int:
+        """
+        Return the patient's age at first admission.
+
+        Time Complexity
+        ---------------
+        O(N) total
+        N - number of laboratory tests taken by the patient
+
+        Return
+        -------
+        int
+            the patient's age at first admission
+        """
+        first_visit = self.first_visit  # O(n)
+        if first_visit is None:  # O(1)
+            raise ValueError("patient has no laboratory tests")
+        return _age_on(
+            self.dob_datetime, _parse_datetime(first_visit)
+        )  # O(1)
+
+
+def _write_block(outfile: BinaryIO, block: object) -> None:
+    """
+    Write a JSON block preceded by its length to a binary file.
+
+    Arguments
+    ---------
+    outfile -- a binary file open for writing
+
+    block -- an object that can be serialized to JSON
+
+    Return
+    ------
+    None
+    """
+    data = json.dumps(block, separators=(",", ":")).encode()  # O(n)
+    outfile.write(struct.pack("<Q", len(data)))  # O(1)
+    outfile.write(data)  # O(n)
+
+
+def _read_block(infile: BinaryIO) -> Any:
+    """
+    Read a JSON block written by _write_block from a binary file.
+
+    Arguments
+    ---------
+    infile -- a binary file open for reading
+
+    Return
+    ------
+    Any
+        the deserialized block
+    """
+    (length,) = struct.unpack("<Q", infile.read(8))  # O(1)
+    return json.loads(infile.read(length))  # O(n)
+
+
+def remove_chars(variables: str) -> str:
+    """Trim BOM from first line of .txt file.
+
+    Time Complexity
+    ---------------
+    O(N) total
+    N - number of times the character sequence "ï»¿"
+        is replaced with "" to create a new string
+
+    Arguments
+    ---------
+    variables -- a string denoting the variables
+        from the first line of a .txt file
+
+    Return
+    -------
+    str
+        trimmed variables from the first line of a .txt file
+    """
+    trimmed_variables = variables.replace("ï»¿", "")  # O(n)
+    return trimmed_variables  # O(1)
+
+
+def _parse_datetime(date_time: str) -> datetime:
+    """
+    Return the datetime for a date and time string.
+
+    Strings in the fixed-width layout "%Y-%m-%d %H:%M:%S.%f" are parsed
+    by datetime.fromisoformat, which is far faster than datetime.strptime.
+    Other strings, including those with a time zone that fromisoformat
+    accepts, fall back to datetime.strptime, which raises ValueError for
+    strings that do not match the layout.
+
+    Arguments
+    ---------
+    date_time -- a string denoting a date and time formatted as
+        "%Y-%m-%d %H:%M:%S.%f"
+
+    Return
+    ------
+    datetime
+        the parsed date and time
+    """
+    if len(date_time) > 20 and date_time[10] == " " and date_time[19] == ".":
+        try:
+            parsed = datetime.fromisoformat(date_time)  # O(1)
+        except ValueError:
+            pass
+        else:
+            if parsed.tzinfo is None:  # O(1)
+                return parsed  # O(1)
+    return datetime.strptime(date_time, "%Y-%m-%d %H:%M:%S.%f")  # O(1)
+
+
+@lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def _cached_datetime(date_time: str) -> datetime:
+    """Return _parse_datetime(date_time), caching recent strings."""
+    return _parse_datetime(date_time)  # O(1)
+
+
+def _date_key(when: Union[str, datetime], round_up: bool = False) -> str:
+    """
+    Return a date and time as a string comparable with LabSeries dates.
+
+    Laboratory test dates and times have milliseconds, so a datetime
+    with a finer part is truncated to the millisecond, which keeps an
+    upper bound inclusive, or rounded up to the next millisecond, which
+    keeps a lower bound from admitting earlier laboratory tests.
+
+    Arguments
+    ---------
+    when -- a datetime, or a string formatted as "%Y-%m-%d %H:%M:%S.%f"
+
+    round_up -- a bool denoting whether a datetime between two
+        milliseconds is rounded up rather than truncated
+
+    Return
+    ------
+    str
+        when formatted as "%Y-%m-%d %H:%M:%S.%f" with milliseconds, or when
+        itself if it is a string
+    """
+    if isinstance(when, datetime):  # O(1)
+        remainder = when.microsecond % 1000  # O(1)
+        if round_up and remainder:  # O(1)
+            when += timedelta(microseconds=1000 - remainder)  # O(1)
+        return when.isoformat(" ", "milliseconds")  # O(1)
+    return when  # O(1)
+
+
+def _age_on(birth: date, day: date) -> int:
+    """
+    Return the age in whole years of someone born on birth on day.
+
+    Arguments
+    ---------
+    birth -- a date or datetime denoting the date of birth
+
+    day -- a date or datetime denoting the date the age is taken on
+
+    Return
+    ------
+    int
+        the number of birthdays between birth and day
+    """
+    age = day.year - birth.year  # O(1)
+
+    if (day.month < birth.month) or (
+        day.month == birth.month and day.day < birth.day
+    ):  # O(1)
+        age -= 1  # O(1)
+
+    return int(age)  # O(1)
+
+
+def _to_micros(date_time: str) -> int:
+    """
+    Return microseconds since 1970-01-01 for a date and time string.
+
+    Arguments
+    ---------
+    date_time -- a string denoting a date and time formatted as
+        "%Y-%m-%d %H:%M:%S.%f"
+
+    Return
+    ------
+    int
+        the number of microseconds since 1970-01-01
+    """
+    delta = _parse_datetime(date_time) - EPOCH  # O(1)
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + (
+        delta.microseconds
+    )  # O(1)
+
+
+def _from_micros(micros: int) -> str:
+    """
+    Return the date and time string for microseconds since 1970-01-01.
+
+    Arguments
+    ---------
+    micros -- an integer denoting microseconds since 1970-01-01
+
+    Return
+    ------
+    str
+        the date and time formatted as "%Y-%m-%d %H:%M:%S.%f", with
+        milliseconds when the microseconds are a whole number of
+        milliseconds
+    """
+    date_time = EPOCH + timedelta(microseconds=micros)  # O(1)
+    if micros % 1000:  # O(1)
+        return date_time.isoformat(" ", "microseconds")  # O(1)
+    return date_time.isoformat(" ", "milliseconds")  # O(1)
+
+
+def _peak_memory() -> Optional[int]:
+    """Return the peak resident set size in bytes, or None if unknown."""
+    if resource is None:  # O(1)
+        return None  # O(1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # O(1)
+    return peak if sys.platform == "darwin" else peak * 1024  # O(1)
+
+
+def _stage(stats: Optional[LoadStats], name: str) -> ContextManager[None]:
+    """Return stats.stage(name), or a context manager that does nothing."""
+    if stats is None:  # O(1)
+        return nullcontext()  # O(1)
+    return stats.stage(name)  # O(1)
+
+
+def _compile_comparison(operator: str, value: Any) -> Callable[[Any], bool]:
+    """Return a predicate comparing its argument against value."""
+    if operator == "between":  # O(1)
+        low, high = value  # O(1)
+        return lambda x: low <= x <= high  # O(1)
+    comparisons: dict[str, Callable[[Any], bool]] = {
+        ">": lambda x: x > value,
+        "<": lambda x: x < value,
+        ">=": lambda x: x >= value,
+        "<=": lambda x: x <= value,
+        "==": lambda x: x == value,
+    }  # O(1)
+    return comparisons[operator]  # O(1)
+
+
+def _compile_clause(
+    query: Query,
+) -> tuple[Callable[[Patient], bool], int, Optional[Callable[..., set[str]]]]:
+    """
+    Return a predicate on patients, its cost and a candidate lookup.
+
+    The lookup is None for demographic and age clauses. For a clause on
+    a laboratory test it returns the ids of the patients whose minimum
+    and maximum for the test admit a match, which are exactly the
+    matching patients except for == and between.
+    """
+    operator = query.operator  # O(1)
+    value = query.value  # O(1)
+
+    if query.kind == "demographic":  # O(1)
+        attribute = query.field  # O(1)
+        if attribute != "pbp":  # O(1)
+            return (
+                lambda patient: getattr(patient, attribute) == value,
+                0,
+                None,
+            )
+
+        if operator == "between":  # O(1)
+            value = (float(value[0]), float(value[1]))  # O(1)
+        else:
+            value = float(value)  # O(1)
+        test = _compile_comparison(operator, value)  # O(1)
+
+        def pbp(patient: Patient) -> bool:
+            try:
+                return test(float(patient.pbp))  # O(1)
+            except ValueError:
+                return False  # O(1)
+
+        return pbp, 1, None
+
+    if query.kind == "age":  # O(1)
+        test = _compile_comparison(operator, value)  # O(1)
+        return lambda patient: test(patient.age), 2, None
+
+    name = query.field  # O(1)
+    if operator == "between":  # O(1)
+        value = (float(value[0]), float(value[1]))  # O(1)
+    else:
+        value = float(value)  # O(1)
+    test = _compile_comparison(operator, value)  # O(1)
+    candidates = _compile_candidates(name, operator, value)  # O(1)
+
+    if operator in (">", ">="):  # O(1)
+        attribute = "max_value"  # O(1)
+    elif operator in ("<", "<="):  # O(1)
+        attribute = "min_value"  # O(1)
+    else:
+
+        def scan(patient: Patient) -> bool:
+            series = patient.get_series(name)  # O(1)
+            return series is not None and any(map(test, series.values))
+
+        return scan, 4, candidates
+
+    def extremum(patient: Patient) -> bool:
+        series = patient.get_series(name)  # O(1)
+        return (
+            series is not None
+            and bool(series.value_count)
+            and test(getattr(series, attribute))
+        )  # O(1)
+
+    return extremum, 3, candidates
+
+
+def _compile_candidates(
+    name: str, operator: str, value: Any
+) -> Callable[..., set[str]]:
+    """
+    Return a lookup of the patients whose extrema admit a lab clause.
+
+    A patient is a candidate if the range from their minimum to their
+    maximum for the laboratory test can hold a matching value. The
+    extrema are read from LabTable.extrema when a table is given, one
+    pass over its columns, and from each candidate's LabSeries
+    otherwise. Patients who never took the test have NaN or no
+    extrema and are never candidates.
+    """
+    if operator == "between":  # O(1)
+        low, high = value  # O(1)
+    else:
+        low = high = value  # O(1)
+
+    def overlaps(minimum: float, maximum: float) -> bool:
+        return minimum <= high and maximum >= low  # O(1)
+
+    bounds: dict[str, Callable[[float, float], bool]] = {
+        ">": lambda minimum, maximum: maximum > value,
+        ">=": lambda minimum, maximum: maximum >= value,
+        "<": lambda minimum, maximum: minimum < value,
+        "<=": lambda minimum, maximum: minimum <= value,
+        "==": overlaps,
+        "between": overlaps,
+    }  # O(1)
+    admits = bounds[operator]  # O(1)
+
+    def lookup(
+        records: dict[str, Patient],
+        table: Optional[LabTable],
+        candidates: Optional[set[str]],
+    ) -> set[str]:
+        if table is not None:  # O(1)
+            minima, maxima = table.extrema(name)  # O(s) or O(1)
+            ids = set(
+                compress(table.patient_ids.strings, map(admits, minima, maxima))
+            )  # O(p)
+            return ids & (records.keys() if candidates is None else candidates)
+
+        ids = set()  # O(1)
+        pool = records.keys() if candidates is None else candidates  # O(1)
+        for patient_id in pool:  # O(p)
+            series = records[patient_id].get_series(name)  # O(1)
+            if (
+                series is not None
+                and series.value_count
+                and admits(series.min_value, series.max_value)
+            ):  # O(1)
+                ids.add(patient_id)  # O(1)
+        return ids  # O(1)
+
+    return lookup  # O(1)
+
+
+def _compression(filename: str) -> Optional[str]:
+    """
+    Return the compression of a file, detected from its magic bytes.
+
+    Arguments
+    ---------
+    filename -- a string denoting a file
+
+    Return
+    ------
+    str or None
+        gzip or zstd, or None if the file is not compressed
+    """
+    with open(filename, "rb") as infile:  # O(1)
+        magic = infile.read(len(ZSTD_MAGIC))  # O(1)
+    if magic.startswith(GZIP_MAGIC):  # O(1)
+        return "gzip"  # O(1)
+    if magic == ZSTD_MAGIC:  # O(1)
+        return "zstd"  # O(1)
+    return None  # O(1)
+
+
+def _open_text(filename: str, compression: Optional[str] = None) -> TextIO:
+    """
+    Open a text file for reading, decompressing it in a background thread.
+
+    Arguments
+    ---------
+    filename -- a string denoting a plain, gzip or zstd text file
+
+    compression -- an optional string denoting the file's compression
+        returned by _compression
+
+    Return
+    ------
+    TextIO
+        the file's decompressed text, decoded as open() would decode it
+    """
+    if compression is None:  # O(1)
+        return open(filename, "r")  # O(1)
+
+    raw = open(filename, "rb")  # O(1)
+    if compression == "gzip":  # O(1)
+        stream: BinaryIO = gzip.GzipFile(fileobj=raw)  # type: ignore
+    else:
+        stream = _zstd_reader(raw)  # O(1)
+    return io.TextIOWrapper(
+        io.BufferedReader(_DecompressionThread(stream, raw))
+    )  # O(1)
+
+
+def _zstd_reader(raw: BinaryIO) -> BinaryIO:
+    """Return a stream decompressing every zstd frame of raw."""
+    try:
+        import zstandard
+    except ImportError:
+        try:
+            from compression import zstd  # type: ignore
+        except ImportError as error:
+            raise ImportError(
+                "zstandard is required to read zstd compressed files"
+            ) from error
+        return zstd.ZstdFile(raw)  # O(1)
+    return zstandard.ZstdDecompressor().stream_reader(
+        raw, read_across_frames=True
+    )  # O(1)
+
+
+def _require_uncompressed(filename: str) -> None:
+    """Raise ValueError if a file is compressed."""
+    if _compression(filename) is not None:  # O(1)
+        raise ValueError(
+            f"{filename} is compressed; byte offsets need an uncompressed file"
+        )
+
+
+def _header_indices(header: str, variables: tuple[str, ...]) -> list[int]:
+    """
+    Return the column indices of variables in a .txt file header line.
+
+    Time Complexity
+    ---------------
+    O(VT) total
+    V - number of requested variables
+    T - number of columns in the header line
+
+    Arguments
+    ---------
+    header -- a string denoting the first line of a .txt file
+
+    variables -- a tuple of strings denoting the variables to locate
+
+    Return
+    ------
+    list[int]
+        the column index of each variable, in the order requested
+    """
+    header = remove_chars(header)  # O(t)
+    vars_list = header.split("\t")  # O(t)
+    vars_list[-1] = vars_list[-1].strip()  # trim last variable O(1)
+    return [vars_list.index(variable) for variable in variables]  # O(vt)
+
+
+def _read_header(infile: TextIO, variables: tuple[str, ...]) -> list[int]:
+    """
+    Return the column indices of variables in a .txt file header.
+
+    Time Complexity
+    ---------------
+    O(VT) total
+    V - number of requested variables
+    T - number of columns in the header line
+
+    Arguments
+    ---------
+    infile -- an open .txt file positioned at its header line
+
+    variables -- a tuple of strings denoting the variables to locate
+
+    Return
+    ------
+    list[int]
+        the column index of each variable, in the order requested
+    """
+    return _header_indices(infile.readline(), variables)  # O(vt)
+
+
+def _iter_rows(
+    filename: str,
+    variables: tuple[str, ...],
+    use_mmap: bool = False,
+    lab_filter: Optional[LabFilter] = None,
+) -> Iterator[list[str]]:
+    """
+    Yield the requested fields of a tab-delimited .txt file line by line.
+
+    Files compressed with gzip or zstd are detected from their magic bytes
+    and decompressed while they are read, and are never memory-mapped.
+
+    Time Complexity
+    ---------------
+    O(ST) total
+    S - number of lines in the .txt file
+    T - number of columns per line in the .txt file
+
+    Arguments
+    ---------
+    filename -- a string denoting a tab-delimited .txt file, which may
+        be compressed with gzip or zstd
+
+    variables -- a tuple of strings denoting the variables to yield
+
+    use_mmap -- a boolean denoting whether to read an uncompressed file
+        through _iter_mapped_rows
+
+    lab_filter -- an optional instance of the LabFilter class that
+        selects the lines and columns of a lab file, in which case
+        variables must be LAB_VARIABLES
+
+    Return
+    ------
+    Iterator[list[str]]
+        the fields of each line, in the order of variables
+    """
+    compression = _compression(filename)  # O(1)
+    if use_mmap and compression is None:  # O(1)
+        yield from _iter_mapped_rows(
+            filename, variables, lab_filter=lab_filter
+        )  # O(st)
+        return
+
+    with _open_text(filename, compression) as infile:  # O(1)
+        if lab_filter is not None:  # O(1)
+            yield from lab_filter.select(infile, infile.readline())  # O(st)
+            return
+        indices = _read_header(infile, variables)  # O(t)
+        for aline in infile:  # O(s)
+            fields = aline.split("\t")  # O(t)
+            fields[-1] = fields[-1].strip()  # O(t)
+            yield [fields[idx] for idx in indices]  # O(1)
+
+
+def _iter_mapped_rows(
+    filename: str,
+    variables: tuple[str, ...],
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    lab_filter: Optional[LabFilter] = None,
+) -> Iterator[list[str]]:
+    """
+    Yield the requested fields of a memory-mapped .txt file line by line.
+
+    Lines are split as bytes and only the requested fields are decoded,
+    so the other columns never become Python strings. The mapping is
+    backed by the operating system's page cache, which is shared by every
+    process that reads the same file.
+
+    Time Complexity
+    ---------------
+    O(ST) total
+    S - number of lines in the range
+    T - number of columns per line in the .txt file
+
+    Arguments
+    ---------
+    filename -- a string denoting a tab-delimited .txt file
+
+    variables -- a tuple of strings denoting the variables to yield
+
+    start -- an optional integer denoting the byte offset of the first
+        line to read, which defaults to the line after the header
+
+    end -- an optional integer denoting the byte offset at which to stop
+        reading, which defaults to the end of the file
+
+    lab_filter -- an optional instance of the LabFilter class that
+        selects the lines and columns of a lab file, in which case
+        variables must be LAB_VARIABLES
+
+    Return
+    ------
+    Iterator[list[str]]
+        the fields of each line, in the order of variables
+    """
+    encoding = locale.getpreferredencoding(False)  # O(1)
+    with open(filename, "rb") as infile:  # O(1)
+        if os.fstat(infile.fileno()).st_size == 0:  # O(1)
+            return
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header = data.readline().decode(encoding)  # O(t)
+            indices = _header_indices(header, variables)  # O(t)
+            if start is not None:  # O(1)
+                data.seek(start)  # O(1)
+            stop = len(data) if end is None else end  # O(1)
+
+            readline = data.readline  # O(1)
+            if lab_filter is not None:  # O(1)
+                lines = (
+                    readline() for _ in iter(lambda: data.tell() < stop, False)
+                )  # O(1)
+                yield from lab_filter.select(lines, header, encoding)  # O(st)
+                return
+            while data.tell() < stop:  # O(s)
+                fields = readline().split(b"\t")  # O(t)
+                fields[-1] = fields[-1].strip()  # O(t)
+                yield [fields[idx].decode(encoding) for idx in indices]
+
+
+def _split_ranges(filename: str, chunk_size: int) -> list[tuple[int, int]]:
+    """
+    Return byte ranges of a .txt file's lines, aligned to newlines.
+
+    The header line is excluded and every range starts at the beginning
+    of a line and ends after a newline or at the end of the file.
+
+    Time Complexity
+    ---------------
+    O(C) total
+    C - number of ranges
+
+    Arguments
+    ---------
+    filename -- a string denoting a tab-delimited .txt file
+
+    chunk_size -- an integer denoting the approximate number of bytes
+        per range
+
+    Return
+    ------
+    list[tuple[int, int]]
+        the start and end byte offset of each range
+    """
+    with open(filename, "rb") as infile:  # O(1)
+        infile.readline()  # header O(1)
+        bounds = [infile.tell()]  # O(1)
+        size = os.fstat(infile.fileno()).st_size  # O(1)
+
+        offset = bounds[0] + chunk_size  # O(1)
+        while offset < size:  # O(c)
+            infile.seek(offset - 1)  # O(1)
+            infile.readline()  # O(1)
+            if infile.tell() >= size:  # O(1)
+                break
+            bounds.append(infile.tell())  # O(1)
+            offset = bounds[-1] + chunk_size  # O(1)
+
+    bounds.append(size)  # O(1)
+    return [
+        (start, end) for start, end in zip(bounds, bounds[1:]) if start < end
+    ]  # O(c)
+
+
+def _parse_lab_range(
+    lab_filename: str,
+    start: int,
+    end: int,
+    lab_filter: Optional[LabFilter] = None,
+) -> LabTable:
+    """
+    Parse the laboratory tests in one byte range of a lab .txt file.
+
+    This function runs in a worker process of parse_data. The file is
+    memory-mapped, so every worker shares the page cache, and the result
+    is a LabTable, which is far cheaper to send between processes than
+    instances of the Lab class.
+
+    Time Complexity
+    ---------------
+    O(ST) total
+    S - number of lines in the range
+    T - number of columns per line
+
+    Arguments
+    ---------
+    lab_filename -- a string denoting the lab history information for the
+        patients
+
+    start -- an integer denoting the first byte of the range
+
+    end -- an integer denoting the byte after the range
+
+    lab_filter -- an optional instance of the LabFilter class that
+        selects the lines and columns to parse
+
+    Return
+    ------
+    LabTable
+        the laboratory tests in the range, in file order
+    """
+    table = LabTable()  # O(1)
+    for fields in _iter_mapped_rows(
+        lab_filename, LAB_VARIABLES, start, end, lab_filter
+    ):  # O(st)
+        table.append(*fields)  # O(1)
+    return table  # O(1)
+
+
+def iter_patients(
+    patient_filename: str, use_mmap: bool = False
+) -> Iterator[Patient]:
+    """
+    Yield patients one line at a time.
+
+    Time Complexity
+    ---------------
+    O(QR) total
+    Q - number of lines in the patient_filename .txt file
+    R - number of columns per line in the patient_filename
+        .txt file
+
+    Arguments
+    ---------
+    patient_filename --  a string denoting the .txt file with the information
+        for the patients
+
+    use_mmap -- a boolean denoting whether to memory-map the file and
+        decode only the fields that are used
+
+    Return
+    ------
+    Iterator[Patient]
+        an instance of the Patient class for each line of the file, without
+        any laboratory test history
+    """
+    for fields in _iter_rows(
+        patient_filename, PATIENT_VARIABLES, use_mmap
+    ):  # O(qr)
+        yield Patient(*fields)  # O(1)
+
+
+def iter_labs(
+    lab_filename: str,
+    use_mmap: bool = False,
+    fast: bool = False,
+    vocabulary: Optional[LabVocabulary] = None,
+    lab_filter: Optional[LabFilter] = None,
+) -> Iterator[Union[Lab, LabRecord]]:
+    """
+    Yield laboratory tests one line at a time.
+
+    Only the current line is held in memory, so the file is never
+    materialized as a list of strings.
+
+    Time Complexity
+    ---------------
+    O(ST) total
+    S - number of lines in the lab_filename .txt file
+    T - number of columns per line in the lab_filename .txt file
+
+    Arguments
+    ---------
+    lab_filename -- a string denoting the lab history information for the
+        patients
+
+    use_mmap -- a boolean denoting whether to memory-map the file and
+        decode only the fields that are used
+
+    fast -- a boolean denoting whether to yield instances of LabRecord
+        instead of the Lab class
+
+    vocabulary -- an optional instance of the LabVocabulary class that
+        interns the patient id, admission id, name and units of each
+        laboratory test
+
+    lab_filter -- an optional instance of the LabFilter class that
+        selects the lines and columns to yield
+
+    Return
+    ------
+    Iterator[Lab] or Iterator[LabRecord]
+        an instance of the Lab class, or of LabRecord, for each line of
+        the file
+    """
+    rows = _iter_rows(lab_filename, LAB_VARIABLES, use_mmap, lab_filter)
+    if vocabulary is not None:  # O(1)
+        rows = map(vocabulary.intern_fields, rows)  # O(1)
+    if fast:  # O(1)
+        yield from map(LabRecord._make, rows)  # O(st)
+        return
+
+    for fields in rows:  # O(st)
+        yield Lab(*fields)  # O(1)
+
+
+def parse_data(
+    patient_filename: str,
+    lab_filename: str,
+    table: Optional[LabTable] = None,
+    workers: int = 1,
+    use_mmap: bool = False,
+    cache_dir: Optional[str] = None,
+    fast: bool = False,
+    vocabulary: Optional[LabVocabulary] = None,
+    stats: Optional[LoadStats] = None,
+    lab_filter: Optional[LabFilter] = None,
+) -> dict[str, Patient]:
+    """
+    Parse and return lab test history for patients.
+
+    When a LabTable is given, laboratory tests are stored in the table
+    column by column instead of as instances of the Lab class, and each
+    patient's get_labs() builds instances of the Lab class from the table
+    on first access.
+
+    When workers is greater than one, the lab file is split into byte
+    ranges of about DEFAULT_CHUNK_SIZE bytes aligned to newlines, and the
+    ranges are parsed into LabTable chunks in a pool of worker processes.
+    The chunks are merged in file order into table, or into a new LabTable
+    when no table is given, and get_labs() builds instances of the Lab
+    class from it on first access.
+
+    When use_mmap is True, the files are memory-mapped and only the fields
+    that are used are decoded. Worker processes always memory-map the lab
+    file.
+
+    When cache_dir is given, the parsed records are written to a binary
+    snapshot in cache_dir, and later calls with the same files load the
+    snapshot instead of parsing. The snapshot records the path, size,
+    modification time and content hash of both files and is rebuilt when
+    either file changes. Records loaded from or written to a snapshot are
+    backed by a LabTable, as if table had been given.
+
+    When fast is True, each laboratory test is an immutable LabRecord
+    instead of an instance of the Lab class. The columns are validated
+    once when the header is read rather than on every attribute of every
+    row. fast has no effect when laboratory tests are stored in a
+    LabTable.
+
+    When lab_filter is given, only the patients and laboratory tests it
+    keeps are parsed; the other lines of the lab file are rejected before
+    any object is built, and the columns it drops are empty strings.
+
+    When vocabulary is given, the patient ids, admission ids, names and
+    units of the laboratory tests are interned through it, so each
+    distinct string is stored once. vocabulary defaults to the vocabulary
+    of table; without either, strings are not interned.
+
+    When stats is given, the wall time, rows, bytes read and peak memory
+    of each stage are recorded in it. Without stats, no time is measured.
+
+    Time Complexity
+    ---------------
+    O(QR+ST) total
+    Q - number of lines in the patient_filename .txt file
+    R - number of columns per line in the patient_filename
+        .txt file
+    S - number of lines in the labs_filename .txt file
+    T - number of columns per line in the labs_filename
+        .txt file
+
+    Assumptions
+    -----------
+    1.  All arguments are positional and lack of adherence to order
+        indicated in function definition generates errors.
+    2.  Only input is tab-delimited .txt files, optionally compressed
+        with gzip or zstd.
+    3.  All patient and corresponding lab history files contain same columns.
+    4.  The number of lines in labs_filename .txt file will be greater than
+        or equal to the number of lines in patient_filename (S >= Q).
+
+    Arguments
+    ---------
+    patient_filename --  a string denoting the .txt file with the information
+        for the patients (patient ID, gender, date of birth, race, marital
+        status, language, community percentage below poverty)
+
+    lab_filename -- a string denoting the lab history information the
+        patients (patient ID, admission ID, test name, test value, test units,
+        test date and time)
+
+    table -- an optional instance of the LabTable class that receives the
+        laboratory tests
+
+    workers -- an integer denoting the number of processes that parse the
+        lab file; a compressed lab file is parsed by one process
+
+    use_mmap -- a boolean denoting whether to memory-map the files
+
+    cache_dir -- an optional string denoting the directory that holds
+        binary snapshots of parsed records, which cannot be used with a
+        table that already holds rows
+
+    fast -- a boolean denoting whether to store laboratory tests as
+        instances of LabRecord instead of the Lab class
+
+    vocabulary -- an optional instance of the LabVocabulary class that
+        interns the repeated strings of the laboratory tests
+
+    stats -- an optional instance of the LoadStats class that receives
+        the timings of each stage
+
+    lab_filter -- an optional instance of the LabFilter class that
+        selects the patients, laboratory tests and lab columns to parse
+
+    Return
+    -------
+    dict[str, PATIENT]
+        each key is a patient's unique ID and each value is an instance of the
+        Patient class with all the laboratory test history for that patient
+    """
+    if workers < 1:  # O(1)
+        raise ValueError('"workers" must be a positive integer')
+    if lab_filter is not None and cache_dir is not None:  # O(1)
+        raise ValueError('"lab_filter" cannot be used with "cache_dir"')
+    if cache_dir is not None and table is not None and len(table):  # O(1)
+        raise ValueError('"table" must be empty when "cache_dir" is given')
+    if (
+        lab_filter is not None
+        and (table is not None or workers > 1)
+        and "LabDateTime" not in lab_filter.columns
+    ):  # O(1)
+        raise ValueError('a LabTable needs the "LabDateTime" column')
+
+    if vocabulary is None and table is not None:  # O(1)
+        vocabulary = table.vocabulary  # O(1)
+
+    if cache_dir is not None:  # O(1)
+        snapshot = cache_filename(patient_filename, lab_filename, cache_dir)
+        with _stage(stats, "snapshot_read"):  # O(1)
+            cached = read_snapshot(snapshot)  # O(q+s)
+            if cached is not None and stats is not None:  # O(1)
+                stats.bytes_read += os.path.getsize(snapshot)  # O(1)
+                stats.add_rows("snapshot_read", len(cached[1]))  # O(1)
+        if cached is not None:  # O(1)
+            cached_records, cached_table = cached  # O(1)
+            if table is None:  # O(1)
+                return cached_records  # O(1)
+            table.extend(cached_table)  # O(s)
+            for patient_id, patient in cached_records.items():  # O(q)
+                patient.set_lab_source(partial(table.labs, patient_id))
+            return cached_records  # O(1)
+        if table is None:  # O(1)
+            table = LabTable(vocabulary)  # O(1)
+        sources = [patient_filename, lab_filename]  # O(1)
+        fingerprints = [_fingerprint(source) for source in sources]  # O(b)
+
+    patient_dict: dict[str, Patient] = {}  # O(1)
+
+    with _stage(stats, "patients"):  # O(1)
+        for patient in iter_patients(patient_filename, use_mmap):  # O(qr)
+            if lab_filter is not None and not lab_filter.keeps_patient(
+                patient.id
+            ):  # O(1)
+                continue
+            if vocabulary is not None:  # O(1)
+                patient.id = vocabulary.patient_ids.intern(patient.id)
+            patient_dict[patient.id] = patient  # O(1)
+        if stats is not None:  # O(1)
+            stats.bytes_read += os.path.getsize(patient_filename)  # O(1)
+            stats.add_rows("patients", len(patient_dict))  # O(1)
+
+    table_rows = 0 if table is None else len(table)  # O(1)
+    with _stage(stats, "labs"):  # O(1)
+        if workers > 1 and table is None:  # O(1)
+            table = LabTable(vocabulary)  # O(1)
+        if workers > 1 and _compression(lab_filename) is None:  # O(1)
+            _parse_parallel(
+                lab_filename, table, workers, lab_filter  # type: ignore
+            )  # O(st / workers)
+        elif table is not None:  # O(1)
+            rows: Iterable[list[str]] = _iter_rows(
+                lab_filename, LAB_VARIABLES, use_mmap, lab_filter
+            )  # O(1)
+            if stats is not None:  # O(1)
+                rows = stats.timed(rows, "read")  # O(1)
+            for fields in rows:  # O(st)
+                table.append(*fields)  # O(1)
+        else:
+            labs: Iterable[Any] = iter_labs(
+                lab_filename, use_mmap, fast, vocabulary, lab_filter
+            )  # O(1)
+            if stats is not None:  # O(1)
+                labs = stats.timed(labs, "read")  # O(1)
+            for lab in labs:  # O(st)
+                patient_dict[lab.patient_id].add_lab(lab)  # type: ignore
+        if stats is not None:  # O(1)
+            stats.bytes_read += os.path.getsize(lab_filename)  # O(1)
+            stats.add_rows(
+                "labs",
+                len(table) - table_rows
+                if table is not None
+                else sum(len(patient.labs) for patient in patient_dict.values()),
+            )  # O(q)
+
+    if table is not None:  # O(1)
+        with _stage(stats, "lab_sources"):  # O(1)
+            for patient_id, patient in patient_dict.items():  # O(q)
+                patient.set_lab_source(partial(table.labs, patient_id))
+            if stats is not None:  # O(1)
+                stats.add_rows("lab_sources", len(patient_dict))  # O(1)
+
+    if cache_dir is not None:  # O(1)
+        os.makedirs(cache_dir, exist_ok=True)  # O(1)
+        with _stage(stats, "snapshot_write"):  # O(1)
+            write_snapshot(
+                snapshot,
+                patient_dict,
+                table,  # type: ignore
+                sources,
+                fingerprints,
+            )  # O(q+s)
+            if stats is not None:  # O(1)
+                stats.add_rows("snapshot_write", len(table))  # type: ignore
+
+    records = patient_dict  # O(1)
+    return records  # O(1)
+
+
+def _parse_parallel(
+    lab_filename: str,
+    table: LabTable,
+    workers: int,
+    lab_filter: Optional[LabFilter] = None,
+) -> None:
+    """
+    Parse a lab .txt file into a LabTable in a pool of worker processes.
+
+    Time Complexity
+    ---------------
+    O(ST) total, divided among the workers except for the merge
+    S - number of lines in the lab_filename .txt file
+    T - number of columns per line in the lab_filename .txt file
+
+    Arguments
+    ---------
+    lab_filename -- a string denoting the lab history information for the
+        patients
+
+    table -- an instance of the LabTable class that receives the
+        laboratory tests in file order
+
+    workers -- an integer denoting the number of worker processes
+
+    lab_filter -- an optional instance of the LabFilter class that
+        selects the lines and columns to parse
+
+    Return
+    ------
+    None
+    """
+    ranges = _split_ranges(lab_filename, DEFAULT_CHUNK_SIZE)  # O(c)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:  # O(1)
+        results = executor.map(
+            _parse_lab_range,
+            repeat(lab_filename),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+            repeat(lab_filter),
+        )  # O(st / workers)
+
+        for result in results:  # O(c)
+            table.extend(result)  # O(s / c)
+
+
+def _content_hash(filename: str) -> str:
+    """
+    Return the BLAKE2b digest of a file's contents.
+
+    Time Complexity
+    ---------------
+    O(B) total
+    B - number of bytes in the file
+
+    Arguments
+    ---------
+    filename -- a string denoting a file
+
+    Return
+    ------
+    str
+        the hexadecimal digest of the file's contents
+    """
+    digest = hashlib.blake2b()  # O(1)
+    with open(filename, "rb") as infile:  # O(1)
+        for block in iter(partial(infile.read, 2**20), b""):  # O(b)
+            digest.update(block)  # O(1)
+    return digest.hexdigest()  # O(1)
+
+
+def _fingerprint(
+    filename: str,
+    stat: Optional[os.stat_result] = None,
+    content_hash: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Return the path, size, modification time and content hash of a file.
+
+    Arguments
+    ---------
+    filename -- a string denoting a file
+
+    stat -- an optional os.stat_result of the file, taken before its
+        content was hashed
+
+    content_hash -- an optional string denoting the file's content hash
+        computed by the caller while reading it, so the file is not
+        read again
+
+    Return
+    ------
+    dict[str, Any]
+        the file's fingerprint
+    """
+    if stat is None:  # O(1)
+        stat = os.stat(filename)  # O(1)
+    if content_hash is None:  # O(1)
+        content_hash = _content_hash(filename)  # O(b)
+    return {
+        "path": os.path.abspath(filename),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "hash": content_hash,
+    }  # O(1)
+
+
+def _is_current(fingerprint: dict[str, Any]) -> bool:
+    """
+    Return whether a file still matches its fingerprint.
+
+    The content hash is only recomputed when the size matches and the
+    modification time does not, so an unchanged file costs one stat.
+
+    Arguments
+    ---------
+    fingerprint -- a dictionary returned by _fingerprint
+
+    Return
+    ------
+    bool
+        True if the file is unchanged, and False if otherwise
+    """
+    try:
+        stat = os.stat(fingerprint["path"])  # O(1)
+    except OSError:
+        return False  # O(1)
+    if stat.st_size != fingerprint["size"]:  # O(1)
+        return False  # O(1)
+    if stat.st_mtime_ns == fingerprint["mtime"]:  # O(1)
+        return True  # O(1)
+    return _content_hash(fingerprint["path"]) == fingerprint["hash"]  # O(b)
+
+
+def cache_filename(
+    patient_filename: str, lab_filename: str, cache_dir: str
+) -> str:
+    """
+    Return the snapshot file used by parse_data for a pair of files.
+
+    Arguments
+    ---------
+    patient_filename --  a string denoting the .txt file with the information
+        for the patients
+
+    lab_filename -- a string denoting the lab history information for the
+        patients
+
+    cache_dir -- a string denoting the directory that holds snapshots
+
+    Return
+    ------
+    str
+        the path of the snapshot file
+    """
+    key = "\0".join(
+        [os.path.abspath(patient_filename), os.path.abspath(lab_filename)]
+    )  # O(1)
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, digest + SNAPSHOT_SUFFIX)  # O(1)
+
+
+def write_snapshot(
+    snapshot_filename: str,
+    records: dict[str, Patient],
+    table: LabTable,
+    sources: Iterable[str] = (),
+    fingerprints: Optional[list[dict[str, Any]]] = None,
+) -> None:
+    """
+    Write patients and their laboratory tests to a binary snapshot.
+
+    The snapshot is written to a temporary file that replaces
+    snapshot_filename once complete. Fingerprints should be taken before
+    the source files are read, so a file that changes while it is read
+    does not match its snapshot.
+
+    Time Complexity
+    ---------------
+    O(Q+S) total, plus O(B) without fingerprints
+    Q - number of patients
+    S - number of rows in table
+    B - number of bytes in the source files
+
+    Arguments
+    ---------
+    snapshot_filename -- a string denoting the snapshot file
+
+    records -- a dictionary of patients whose laboratory tests are in table
+
+    table -- an instance of the LabTable class with the laboratory tests
+
+    sources -- strings denoting files whose fingerprints are recorded so
+        that read_snapshot can detect changes
+
+    fingerprints -- an optional list with the fingerprint of each of
+        sources, as returned by _fingerprint before they were read; by
+        default sources are fingerprinted now
+
+    Return
+    ------
+    None
+    """
+    if fingerprints is None:  # O(1)
+        fingerprints = [_fingerprint(source) for source in sources]  # O(b)
+    temporary = f"{snapshot_filename}.{os.getpid()}.tmp"  # O(1)
+    with open(temporary, "wb") as outfile:  # O(1)
+        outfile.write(SNAPSHOT_MAGIC)  # O(1)
+        _write_block(outfile, fingerprints)  # O(1)
+        _write_block(
+            outfile,
+            [
+                [
+                    patient.id,
+                    patient.gender,
+                    patient.dob,
+                    patient.race,
+                    patient.ms,
+                    patient.lang,
+                    patient.pbp,
+                ]
+                for patient in records.values()
+            ],
+        )  # O(q)
+        table.dump(outfile)  # O(s)
+    os.replace(temporary, snapshot_filename)  # O(1)
+
+
+def read_snapshot(
+    snapshot_filename: str,
+) -> Optional[tuple[dict[str, Patient], LabTable]]:
+    """
+    Read patients and their laboratory tests from a binary snapshot.
+
+    Time Complexity
+    ---------------
+    O(Q+S) total, without any work per laboratory test in Python
+    Q - number of patients
+    S - number of rows in the snapshot's table
+
+    Arguments
+    ---------
+    snapshot_filename -- a string denoting a file written by write_snapshot
+
+    Return
+    ------
+    tuple[dict[str, Patient], LabTable] or None
+        the patients, whose get_labs() builds instances of the Lab class
+        from the table on first access, and the table; or None if the
+        snapshot is missing, unreadable or any source file has changed
+    """
+    try:
+        with open(snapshot_filename, "rb") as infile:  # O(1)
+            if infile.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:  # O(1)
+                return None  # O(1)
+            sources = _read_block(infile)  # O(1)
+            if not all(_is_current(source) for source in sources):  # O(1)
+                return None  # O(1)
+            patient_rows = _read_block(infile)  # O(q)
+            table = LabTable.load(infile)  # O(s)
+    except (OSError, ValueError, struct.error, EOFError):
+        return None  # O(1)
+
+    records: dict[str, Patient] = {}  # O(1)
+    for fields in patient_rows:  # O(q)
+        patient = Patient(*fields)  # O(1)
+        patient.set_lab_source(partial(table.labs, patient.id))  # O(1)
+        records[patient.id] = patient  # O(1)
+    return records, table  # O(1)
+
+
+def stream_data(
+    patient_filename: str,
+    lab_filename: str,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    use_mmap: bool = False,
+    lab_filter: Optional[LabFilter] = None,
+) -> Iterator[dict[str, Patient]]:
+    """
+    Yield laboratory test history for patients in bounded batches.
+
+    The lab file is read line by line and at most buffer_size instances of
+    the Lab class are held before a batch is yielded, so peak memory depends
+    on buffer_size and the patient file rather than on the size of the lab
+    file.
+
+    Time Complexity
+    ---------------
+    O(QR+ST) total
+    Q - number of lines in the patient_filename .txt file
+    R - number of columns per line in the patient_filename
+        .txt file
+    S - number of lines in the labs_filename .txt file
+    T - number of columns per line in the labs_filename
+        .txt file
+
+    Assumptions
+    -----------
+    1.  Only input is tab-delimited .txt files.
+    2.  A patient whose laboratory tests are not contiguous in lab_filename,
+        or whose tests do not fit in one buffer, appears in more than one
+        batch, each holding part of the patient's history.
+
+    Arguments
+    ---------
+    patient_filename --  a string denoting the .txt file with the information
+        for the patients
+
+    lab_filename -- a string denoting the lab history information for the
+        patients
+
+    buffer_size -- an integer denoting the maximum number of laboratory
+        tests held in one batch
+
+    use_mmap -- a boolean denoting whether to memory-map the files
+
+    lab_filter -- an optional instance of the LabFilter class that
+        selects the laboratory tests to read
+
+    Return
+    ------
+    Iterator[dict[str, Patient]]
+        each key is a patient's unique ID and each value is a new instance of
+        the Patient class with the laboratory tests for that patient found in
+        the current batch
+    """
+    if buffer_size < 1:
+        raise ValueError('"buffer_size" must be a positive integer')
+
+    demographics: dict[str, tuple[str, ...]] = {}  # O(1)
+    for patient in iter_patients(patient_filename, use_mmap):  # O(qr)
+        demographics[patient.id] = (
+            patient.id,
+            patient.gender,
+            patient.dob,
+            patient.race,
+            patient.ms,
+            patient.lang,
+            patient.pbp,
+        )  # O(1)
+
+    batch: dict[str, Patient] = {}  # O(1)
+    buffered = 0  # O(1)
+    labs = iter_labs(lab_filename, use_mmap, lab_filter=lab_filter)  # O(1)
+    for lab in labs:  # O(st)
+        patient = batch.get(lab.patient_id)  # O(1)
+        if patient is None:  # O(1)
+            patient = Patient(*demographics[lab.patient_id])  # O(1)
+            batch[lab.patient_id] = patient  # O(1)
+        patient.add_lab(lab)  # O(1)
+        buffered += 1  # O(1)
+
+        if buffered == buffer_size:  # O(1)
+            yield batch
+            batch = {}  # O(1)
+            buffered = 0  # O(1)
+
+    if batch:  # O(1)
+        yield batch
+
+
+def sort_labs(
+    lab_filename: str,
+    sorted_filename: str,
+    run_size: int = DEFAULT_RUN_SIZE,
+    temp_dir: Optional[str] = None,
+    fan_in: int = DEFAULT_FAN_IN,
+) -> int:
+    """
+    Sort a lab .txt file by patient id and date and time in bounded memory.
+
+    The lab file is read in runs of at most run_size lines, and each run
+    is sorted in memory and spilled to a temporary file. The runs are then
+    merged, at most fan_in at a time, into sorted_filename, so memory
+    depends on run_size and not on the size of the lab file. Lines with
+    the same patient id and date and time keep their order in the lab
+    file. The sorted file is written to a temporary file that replaces
+    sorted_filename once complete, and can be read one patient at a time
+    by stream_patients.
+
+    Time Complexity
+    ---------------
+    O(ST + S log S) total, reading and writing every line
+    1 + log_F(S / R) times
+    S - number of lines in the lab_filename .txt file
+    T - number of columns per line in the lab_filename .txt file
+    R - run_size
+    F - fan_in
+
+    Arguments
+    ---------
+    lab_filename -- a string denoting the lab history information for the
+        patients, which may be compressed with gzip or zstd
+
+    sorted_filename -- a string denoting the sorted .txt file to write
+
+    run_size -- an integer denoting the maximum number of lines held in
+        memory
+
+    temp_dir -- an optional string denoting the directory for the runs,
+        which defaults to the system's temporary directory
+
+    fan_in -- an integer denoting the maximum number of runs merged at
+        once
+
+    Return
+    ------
+    int
+        the number of laboratory tests sorted
+    """
+    if run_size < 1:  # O(1)
+        raise ValueError('"run_size" must be a positive integer')
+    if fan_in < 2:  # O(1)
+        raise ValueError('"fan_in" must be at least 2')
+
+    count = 0  # O(1)
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:  # O(1)
+        runs: list[str] = []  # O(1)
+        with _open_text(lab_filename, _compression(lab_filename)) as infile:
+            header = infile.readline()  # O(t)
+            patient_idx, date_idx = _header_indices(
+                header, ("PatientID", "LabDateTime")
+            )  # O(t)
+
+            def key(aline: str) -> tuple[str, str]:
+                fields = aline.split("\t")  # O(t)
+                return fields[patient_idx], fields[date_idx].strip()  # O(1)
+
+            while True:  # O(s / r)
+                lines = list(islice(infile, run_size))  # O(r)
+                if not lines:  # O(1)
+                    break
+                if not lines[-1].endswith("\n"):  # O(1)
+                    lines[-1] += "\n"  # O(1)
+                lines.sort(key=key)  # O(r log r)
+                runs.append(os.path.join(directory, f"{len(runs)}.run"))
+                with open(runs[-1], "w") as outfile:  # O(1)
+                    outfile.writelines(lines)  # O(rt)
+                count += len(lines)  # O(1)
+
+        while len(runs) > fan_in:  # O(log_f(s / r))
+            merged = []  # O(1)
+            for start in range(0, len(runs), fan_in):  # O(s / r)
+                merged.append(
+                    os.path.join(directory, f"{len(runs)}.{start}.run")
+                )  # O(1)
+                _merge_runs(runs[start : start + fan_in], merged[-1], key)
+            runs = merged  # O(1)
+
+        temporary = f"{sorted_filename}.{os.getpid()}.tmp"  # O(1)
+        _merge_runs(runs, temporary, key, remove_chars(header))  # O(st)
+    os.replace(temporary, sorted_filename)  # O(1)
+    return count  # O(1)
+
+
+def _merge_runs(
+    runs: list[str],
+    filename: str,
+    key: Callable[[str], Any],
+    header: str = "",
+) -> None:
+    """
+    Merge sorted run files into one file and remove the runs.
+
+    Arguments
+    ---------
+    runs -- a list of strings denoting sorted run files, in file order
+
+    filename -- a string denoting the merged file to write
+
+    key -- a function returning the sort key of a line
+
+    header -- a string denoting a header line to write first
+
+    Return
+    ------
+    None
+    """
+    infiles = [open(run, "r") for run in runs]  # O(f)
+    try:
+        with open(filename, "w") as outfile:  # O(1)
+            outfile.write(header)  # O(1)
+            outfile.writelines(heapq.merge(*infiles, key=key))  # O(st log f)
+    finally:
+        for infile in infiles:  # O(f)
+            infile.close()  # O(1)
+    for run in runs:  # O(f)
+        os.remove(run)  # O(1)
+
+
+def stream_patients(
+    patient_filename: str, lab_filename: str, use_mmap: bool = False
+) -> Iterator[Patient]:
+    """
+    Yield patients one at a time from a lab file sorted by patient.
+
+    The lab file must be grouped by patient id in ascending order, as
+    written by sort_labs, so only the current patient's laboratory tests
+    are held in memory besides the patients without laboratory tests.
+
+    Time Complexity
+    ---------------
+    O(QR+ST) total
+    Q - number of lines in the patient_filename .txt file
+    R - number of columns per line in the patient_filename
+        .txt file
+    S - number of lines in the labs_filename .txt file
+    T - number of columns per line in the labs_filename
+        .txt file
+
+    Arguments
+    ---------
+    patient_filename --  a string denoting the .txt file with the information
+        for the patients
+
+    lab_filename -- a string denoting the lab history information for the
+        patients, sorted by sort_labs
+
+    use_mmap -- a boolean denoting whether to memory-map the files
+
+    Return
+    ------
+    Iterator[Patient]
+        an instance of the Patient class with all the laboratory test
+        history for each patient who has laboratory tests, in order of
+        patient id
+    """
+    patients = {
+        patient.id: patient
+        for patient in iter_patients(patient_filename, use_mmap)
+    }  # O(qr)
+
+    previous = None  # O(1)
+    for patient_id, labs in groupby(
+        iter_labs(lab_filename, use_mmap), attrgetter("patient_id")
+    ):  # O(st)
+        if previous is not None and patient_id <= previous:  # O(1)
+            raise ValueError(
+                f'"{lab_filename}" is not sorted by patient; use sort_labs'
+            )
+        previous = patient_id  # O(1)
+        patient = patients.pop(patient_id)  # O(1)
+        for lab in labs:  # O(n)
+            patient.add_lab(lab)  # O(1)
+        yield patient
+
+
+def shard_of(patient_id: str, shards: int) -> int:
+    """
+    Return the shard of a patient in a dataset written by partition_data.
+
+    The shard is a BLAKE2b hash of the patient id modulo shards, so it is
+    the same in every process, on every machine and for every Python
+    version, unlike the built-in hash of a string.
+
+    Arguments
+    ---------
+    patient_id -- a string denoting a patient's id
+
+    shards -- an integer denoting the number of shards
+
+    Return
+    ------
+    int
+        the patient's shard, from 0 to shards - 1
+    """
+    digest = hashlib.blake2b(patient_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards  # O(1)
+
+
+def partition_data(
+    patient_filename: str,
+    lab_filename: str,
+    directory: str,
+    shards: int,
+) -> dict[str, Any]:
+    """
+    Split patient and lab .txt files into shards by patient id.
+
+    Both files are read once and each line is copied unchanged to the
+    shard given by shard_of for its patient id, so every patient's lab
+    lines are in the same shard as the patient. Shard i is the pair of
+    files patients.<i>.txt and labs.<i>.txt in directory, each with the
+    header of its input file, which parse_data and the other readers of
+    this module consume like the whole files. A manifest.json written
+    last records the shards and their row counts.
+
+    Lines are buffered per shard and, whenever about PARTITION_BUFFER_SIZE
+    characters are buffered, appended to the shard files one file at a
+    time, so any number of shards can be written without exceeding the
+    limit on open files.
+
+    Time Complexity
+    ---------------
+    O(Q+S) total
+    Q - number of lines in the patient_filename .txt file
+    S - number of lines in the lab_filename .txt file
+
+    Arguments
+    ---------
+    patient_filename --  a string denoting the .txt file with the information
+        for the patients, which may be compressed with gzip or zstd
+
+    lab_filename -- a string denoting the lab history information for the
+        patients, which may be compressed with gzip or zstd
+
+    directory -- a string denoting the directory for the shards
+
+    shards -- an integer denoting the number of shards
+
+    Return
+    ------
+    dict[str, Any]
+        the manifest: the number of shards, the input files and, for each
+        shard, its file names relative to directory and its patient and
+        lab row counts
+    """
+    if shards < 1:  # O(1)
+        raise ValueError('"shards" must be a positive integer')
+    os.makedirs(directory, exist_ok=True)  # O(1)
+
+    manifest: dict[str, Any] = {
+        "shards": shards,
+        "hash": "blake2b-64",
+        "patient_file": os.path.abspath(patient_filename),
+        "lab_file": os.path.abspath(lab_filename),
+        "files": [
+            {
+                "patients": f"patients.{shard:05d}.txt",
+                "labs": f"labs.{shard:05d}.txt",
+                "patient_rows": 0,
+                "lab_rows": 0,
+            }
+            for shard in range(shards)
+        ],
+    }  # O(n)
+
+    assigned: dict[str, int] = {}  # O(1)
+    for kind, filename, rows in (
+        ("patients", patient_filename, "patient_rows"),
+        ("labs", lab_filename, "lab_rows"),
+    ):  # O(1)
+        paths = [
+            os.path.join(directory, entry[kind]) for entry in manifest["files"]
+        ]  # O(n)
+        buffers: list[list[str]] = [[] for _ in range(shards)]  # O(n)
+        counts = [0] * shards  # O(n)
+        buffered = 0  # O(1)
+        with _open_text(filename, _compression(filename)) as infile:  # O(1)
+            header = infile.readline()  # O(t)
+            (idx,) = _header_indices(header, ("PatientID",))  # O(t)
+            for path in paths:  # O(n)
+                with open(path, "w") as outfile:  # O(1)
+                    outfile.write(remove_chars(header))  # O(t)
+            for aline in infile:  # O(q+s)
+                patient_id = aline.split("\t", idx + 1)[idx].rstrip("\r\n")
+                shard = assigned.get(patient_id)  # O(1)
+                if shard is None:  # O(1)
+                    shard = shard_of(patient_id, shards)  # O(1)
+                    assigned[patient_id] = shard  # O(1)
+                if not aline.endswith("\n"):  # O(1)
+                    aline += "\n"  # O(1)
+                buffers[shard].append(aline)  # O(1)
+                counts[shard] += 1  # O(1)
+                buffered += len(aline)  # O(1)
+                if buffered >= PARTITION_BUFFER_SIZE:  # O(1)
+                    _flush_shards(paths, buffers)  # O(n) per flush
+                    buffered = 0  # O(1)
+        _flush_shards(paths, buffers)  # O(n)
+        for entry, count in zip(manifest["files"], counts):  # O(n)
+            entry[rows] = count  # O(1)
+
+    with open(os.path.join(directory, MANIFEST_FILENAME), "w") as outfile:
+        json.dump(manifest, outfile, indent=1)  # O(n)
+    return manifest  # O(1)
+
+
+def _flush_shards(paths: list[str], buffers: list[list[str]]) -> None:
+    """Append each shard's buffered lines to its file and empty them."""
+    for path, lines in zip(paths, buffers):  # O(n)
+        if lines:  # O(1)
+            with open(path, "a") as outfile:  # O(1)
+                outfile.writelines(lines)  # O(t) per line
+            lines.clear()  # O(1)
+
+
+def ages_on(
+    births: Iterable[str],
+    on: Optional[Union[str, date, Iterable[Union[str, date]]]] = None,
+) -> array:
+    """
+    Return the ages in whole years of many people on reference dates.
+
+    Dates are reduced to integers YYYYMMDD, so an age is the difference
+    of two integers floor-divided by 10000, which equals _age_on without
+    any datetime arithmetic. Each distinct string is parsed once with the
+    parser of the Patient class, so the ages are those of
+    Patient.age and Patient.age_first_visit for the same dates.
+
+    Time Complexity
+    ---------------
+    O(Q) total
+    Q - number of dates of birth
+
+    Arguments
+    ---------
+    births -- an iterable of strings denoting dates of birth formatted as
+        "%Y-%m-%d %H:%M:%S.%f"
+
+    on -- an optional reference date for every age: a date, a datetime or
+        a string formatted as births, or an iterable of them with one per
+        date of birth; defaults to today
+
+    Return
+    ------
+    array
+        an array of integers with the age for each date of birth, in order
+    """
+    birth_days = _day_numbers(births)  # O(q)
+    if on is None:  # O(1)
+        on = date.today()  # O(1)
+    if isinstance(on, (str, date)):  # O(1)
+        day = _day_number(on)  # O(1)
+        return array(
+            "q", [(day - birth) // 10_000 for birth in birth_days]
+        )  # O(q)
+
+    days = _day_numbers(on)  # O(q)
+    if len(days) != len(birth_days):  # O(1)
+        raise ValueError('"on" must have one date per date of birth')
+    return array(
+        "q", [(day - birth) // 10_000 for day, birth in zip(days, birth_days)]
+    )  # O(q)
+
+
+def cohort_ages(
+    records: dict[str, Patient],
+    on: Optional[Union[str, date, Iterable[Union[str, date]]]] = None,
+) -> array:
+    """
+    Return every patient's age on reference dates.
+
+    Time Complexity
+    ---------------
+    O(Q) total
+    Q - number of patients
+
+    Arguments
+    ---------
+    records -- a dictionary of instances of the Patient class keyed by
+        patient id
+
+    on -- an optional reference date for every patient, or an iterable
+        of reference dates in the order of records, as for ages_on;
+        defaults to today
+
+    Return
+    ------
+    array
+        an array of integers with each patient's age in the order of
+        records, equal to Patient.age when on is today
+    """
+    births = map(attrgetter("dob_datetime"), records.values())  # O(1)
+    return ages_on(births, on)  # O(q)
+
+
+def cohort_ages_first_visit(records: dict[str, Patient]) -> array:
+    """
+    Return every patient's age at first admission.
+
+    Time Complexity
+    ---------------
+    O(Q) total once the patients' laboratory tests are loaded
+    Q - number of patients
+
+    Each patient's earliest laboratory test is read as soon as the
+    patient is loaded, so patients of parse_lazy may be evicted again.
+
+    Arguments
+    ---------
+    records -- a dictionary of instances of the Patient class keyed by
+        patient id
+
+    Return
+    ------
+    array
+        an array of integers with each patient's result of
+        Patient.age_first_visit, in the order of records
+    """
+    births = []  # O(1)
+    first_visits = []  # O(1)
+    for patient in records.values():  # O(q)
+        first_visit = patient.first_visit  # O(n) on first access
+        if first_visit is None:  # O(1)
+            raise ValueError(f"patient {patient.id} has no laboratory tests")
+        births.append(patient.dob_datetime)  # O(1)
+        first_visits.append(first_visit)  # O(1)
+    return ages_on(births, first_visits)  # O(q)
+
+
+def _day_numbers(whens: Iterable[Union[str, date]]) -> array:
+    """
+    Return dates as integers YYYYMMDD.
+
+    Each distinct date, datetime or string is converted once, so dates
+    shared by many patients are parsed once.
+
+    Arguments
+    ---------
+    whens -- an iterable of dates, datetimes or strings formatted as
+        "%Y-%m-%d %H:%M:%S.%f"
+
+    Return
+    ------
+    array
+        an array of integers with year * 10000 + month * 100 + day for
+        each date, in order
+    """
+    cache: dict[Union[str, date], int] = {}  # O(1)
+    numbers = array("q")  # O(1)
+    for when in whens:  # O(q)
+        number = cache.get(when)  # O(1)
+        if number is None:  # O(1)
+            number = _day_number(when)  # O(1)
+            cache[when] = number  # O(1)
+        numbers.append(number)  # O(1)
+    return numbers  # O(1)
+
+
+def _day_number(when: Union[str, date]) -> int:
+    """Return a date, datetime or date and time string as YYYYMMDD."""
+    if isinstance(when, str):  # O(1)
+        when = _parse_datetime(when)  # O(1)
+    return when.year * 10_000 + when.month * 100 + when.day  # O(1)
+
+
+def _prefix_checksum(filename: str, offset: int) -> str:
+    """
+    Return the checksum of the bytes before offset in a file.
+
+    Time Complexity
+    ---------------
+    O(B) total
+    B - number of bytes before offset
+
+    Arguments
+    ---------
+    filename -- a string denoting a file
+
+    offset -- an integer denoting the end of the prefix
+
+    Return
+    ------
+    str
+        the hexadecimal BLAKE2b digest
+    """
+    return _prefix_digest(filename, offset).hexdigest()  # O(b)
+
+
+def _prefix_digest(
+    filename: str,
+    offset: int,
+    digest: Optional["hashlib.blake2b"] = None,
+    start: int = 0,
+) -> "hashlib.blake2b":
+    """
+    Return a BLAKE2b digest updated with the bytes from start to offset.
+
+    Continuing the digest of a verified prefix gives the checksum of a
+    longer prefix without reading the verified bytes again.
+
+    Time Complexity
+    ---------------
+    O(B) total
+    B - number of bytes from start to offset
+
+    Arguments
+    ---------
+    filename -- a string denoting a file
+
+    offset -- an integer denoting the end of the prefix
+
+    digest -- an optional BLAKE2b digest of the bytes before start,
+        which is updated in place
+
+    start -- an integer denoting the first byte to add to digest
+
+    Return
+    ------
+    hashlib.blake2b
+        the digest of the bytes before offset
+    """
+    if digest is None:  # O(1)
+        digest = hashlib.blake2b()  # O(1)
+    remaining = offset - start  # O(1)
+    with open(filename, "rb") as infile:  # O(1)
+        infile.seek(start)  # O(1)
+        while remaining > 0:  # O(b)
+            block = infile.read(min(remaining, 2**20))  # O(1)
+            if not block:  # O(1)
+                break
+            digest.update(block)  # O(1)
+            remaining -= len(block)  # O(1)
+    return digest  # O(1)
+
+
+def _last_line_end(infile: BinaryIO, start: int, size: int) -> int:
+    """
+    Return the byte after the last newline between start and size.
+
+    Arguments
+    ---------
+    infile -- a binary file open for reading
+
+    start -- an integer denoting the first byte to search
+
+    size -- an integer denoting the byte after the last byte to search
+
+    Return
+    ------
+    int
+        the byte after the last newline, or start if there is none
+    """
+    position = size  # O(1)
+    while position > start:  # O(b) in the worst case
+        block_start = max(start, position - CHECKSUM_WINDOW)  # O(1)
+        infile.seek(block_start)  # O(1)
+        newline = infile.read(position - block_start).rfind(b"\n")  # O(1)
+        if newline != -1:  # O(1)
+            return block_start + newline + 1  # O(1)
+        position = block_start  # O(1)
+    return start  # O(1)
+
+
+def update_data(
+    records: dict[str, Patient],
+    lab_filename: str,
+    cursor: Optional[LabCursor] = None,
+    table: Optional[LabTable] = None,
+) -> LabCursor:
+    """
+    Parse laboratory tests appended to a lab .txt file since the cursor.
+
+    Only complete lines after cursor.offset are parsed, so a line that is
+    still being written is left for the next call. Each laboratory test is
+    added to its patient with add_lab, which updates the patient's index in
+    place. When table is given, rows are appended to the table instead, and
+    patients whose history was already built from the table also receive
+    them through add_lab. For records of parse_lazy, the new lines are
+    added to the LabIndex of the records' LabCache, so evicted patients
+    read them on their next access.
+
+    Time Complexity
+    ---------------
+    O(B+ST) total
+    B - number of bytes before the cursor, which are checksummed once
+        and the checksum continued over the new lines
+    S - number of new lines in the lab_filename .txt file
+    T - number of columns per line in the lab_filename .txt file
+
+    Arguments
+    ---------
+    records -- a dictionary of patients, such as one returned by
+        parse_data, that receives the new laboratory tests
+
+    lab_filename -- a string denoting the lab history information for the
+        patients
+
+    cursor -- an optional instance of the LabCursor class for
+        lab_filename returned by an earlier call or by LabCursor.at_end,
+        which defaults to the start of the file
+
+    table -- an optional instance of the LabTable class backing records
+
+    Return
+    ------
+    LabCursor
+        a cursor after the last parsed line, to pass to the next call
+    """
+    digest = hashlib.blake2b()  # O(1)
+    digest_start = 0  # O(1)
+    if cursor is not None:  # O(1)
+        _require_same_file(cursor.lab_filename, lab_filename)  # O(1)
+        verified = cursor._verified_digest()  # O(b)
+        if verified is None:  # O(1)
+            raise ValueError(
+                f'"{lab_filename}" changed before the cursor; parse it again'
+            )
+        digest = verified  # O(1)
+        digest_start = cursor.offset or 0  # O(1)
+
+    _require_uncompressed(lab_filename)  # O(1)
+    with open(lab_filename, "rb") as infile:  # O(1)
+        header_end = len(infile.readline())  # O(1)
+        start = header_end  # O(1)
+        if cursor is not None and cursor.offset is not None:  # O(1)
+            start = cursor.offset  # O(1)
+        size = os.fstat(infile.fileno()).st_size  # O(1)
+        end = _last_line_end(infile, start, size)  # O(1)
+
+    indexes: dict[int, LabIndex] = {}  # O(1)
+    for fields in _iter_mapped_rows(
+        lab_filename, LAB_VARIABLES, start, end
+    ):  # O(st)
+        patient = records[fields[0]]  # O(1)
+        if table is None:  # O(1)
+            cache = patient._lab_cache  # O(1)
+            if cache is not None:  # O(1)
+                if id(cache.index) not in indexes:  # O(1)
+                    _require_same_file(cache.index.lab_filename, lab_filename)
+                    indexes[id(cache.index)] = cache.index  # O(1)
+                if patient._lab_source is not None:  # O(1)
+                    continue  # read from the index on next access
+            patient.add_lab(Lab(*fields))  # O(1)
+            continue
+        table.append(*fields)  # O(1)
+        if patient._lab_source is None:  # O(1)
+            patient.add_lab(table.get_lab(len(table) - 1))  # O(1)
+
+    for index in indexes.values():  # O(1)
+        index.extend(start, end)  # O(s)
+    digest = _prefix_digest(lab_filename, end, digest, digest_start)  # O(s)
+    return LabCursor(lab_filename, end, digest.hexdigest())  # O(1)
+
+
+def _require_same_file(expected_filename: str, lab_filename: str) -> None:
+    """Raise ValueError if two names denote different lab files."""
+    if os.path.abspath(expected_filename) != os.path.abspath(lab_filename):
+        raise ValueError(
+            f'expected updates of "{expected_filename}", not "{lab_filename}"'
+        )
+
+
+def parse_lazy(
+    patient_filename: str,
+    lab_filename: str,
+    index_filename: Optional[str] = None,
+    max_resident: Optional[int] = DEFAULT_MAX_RESIDENT,
+) -> dict[str, Patient]:
+    """
+    Parse patients and read their laboratory tests on first access.
+
+    The lab file is indexed in one pass that decodes only the patient
+    ids. Each patient's get_labs() then reads and parses only that
+    patient's lines, and at most max_resident patients keep their
+    laboratory tests in memory at once.
+
+    When index_filename is given, the index is loaded from it if the
+    lab file has not changed since it was written, and is otherwise
+    built and written to it.
+
+    Time Complexity
+    ---------------
+    O(QR+S) total, plus O(NT) on each patient's first access
+    Q - number of lines in the patient_filename .txt file
+    R - number of columns per line in the patient_filename .txt file
+    S - number of lines in the lab_filename .txt file
+    N - number of laboratory tests taken by the patient
+    T - number of columns per line in the lab_filename .txt file
+
+    Arguments
+    ---------
+    patient_filename --  a string denoting the .txt file with the information
+        for the patients
+
+    lab_filename -- a string denoting the lab history information for the
+        patients
+
+    index_filename -- an optional string denoting the file that holds the
+        lab file's index
+
+    max_resident -- an optional integer denoting the most patients whose
+        laboratory tests stay in memory, or None for no bound
+
+    Return
+    ------
+    dict[str, Patient]
+        each key is a patient's unique ID and each value is an instance of the
+        Patient class whose laboratory tests are read on first access
+    """
+    index = None  # O(1)
+    if index_filename is not None:  # O(1)
+        index = LabIndex.load(index_filename)  # O(s)
+        if index is not None and not os.path.samefile(
+            index.lab_filename, lab_filename
+        ):  # O(1)
+            index = None  # O(1)
+    if index is None:  # O(1)
+        index = LabIndex.build(lab_filename)  # O(s)
+        if index_filename is not None:  # O(1)
+            index.save(index_filename)  # O(s)
+
+    records = {
+        patient.id: patient for patient in iter_patients(patient_filename)
+    }  # O(qr)
+    LabCache(index, max_resident).attach(records)  # O(q)
+    return records  # O(1)
+
+
+def write_columnar(
+    directory: str,
+    records: dict[str, Patient],
+    table: Optional[LabTable] = None,
+    file_format: str = "parquet",
+) -> None:
+    """
+    Write patients and their laboratory tests to columnar files.
+
+    Patients and laboratory tests are written to directory as
+    patients.<file_format> and labs.<file_format>, with the columns of the input
+    .txt files. Repeated strings are dictionary-encoded, dates and times
+    are timestamps and files are compressed with zstd. parquet and
+    feather (Arrow IPC) require pyarrow; snapshot writes the binary
+    snapshot of write_snapshot, which needs no third-party package.
+
+    Time Complexity
+    ---------------
+    O(Q+S) total
+    Q - number of patients
+    S - number of laboratory tests
+
+    Arguments
+    ---------
+    directory -- a string denoting the directory for the files
+
+    records -- a dictionary of instances of the Patient class keyed by
+        patient id
+
+    table -- an optional instance of the LabTable class holding the
+        patients' laboratory tests, which is built from the patients'
+        laboratory tests when not given
+
+    file_format -- a string denoting the file format: parquet, feather
+        or snapshot
+
+    Return
+    ------
+    None
+    """
+    if file_format not in COLUMNAR_FORMATS:  # O(1)
+        raise ValueError(
+            '"file_format" must be one of ' + ", ".join(COLUMNAR_FORMATS)
+        )
+
+    if table is None:  # O(1)
+        table = _table_from_records(records)  # O(q+s)
+
+    os.makedirs(directory, exist_ok=True)  # O(1)
+    if file_format == "snapshot":  # O(1)
+        write_snapshot(
+            os.path.join(directory, "records" + SNAPSHOT_SUFFIX), records, table
+        )  # O(q+s)
+        return
+
+    pa = _import_pyarrow()  # O(1)
+    patient_rows = [
+        (
+            patient.id,
+            patient.gender,
+            patient.dob,
+            patient.race,
+            patient.ms,
+            patient.lang,
+            patient.pbp,
+        )
+        for patient in records.values()
+    ]  # O(q)
+    patient_columns = list(zip(*patient_rows)) or [()] * len(
+        PATIENT_VARIABLES
+    )  # O(q)
+    patients = pa.table(
+        {
+            variable: pa.array(column, pa.string())
+            for variable, column in zip(PATIENT_VARIABLES, patient_columns)
+        }
+    )  # O(q)
+
+    value_text: list[Optional[str]] = [None] * len(table)  # O(s)
+    for row, value in table.value_texts().items():  # O(s)
+        value_text[row] = value  # O(1)
+    labs = pa.table(
+        {
+            "PatientID": _to_dictionary(pa, table.patient_codes, table.patient_ids),
+            "AdmissionID": _to_dictionary(
+                pa, table.admission_codes, table.admission_ids
+            ),
+            "LabName": _to_dictionary(pa, table.name_codes, table.names),
+            "LabValue": _to_arrow(pa, pa.float64(), table.values),
+            "LabValueText": pa.array(value_text, pa.string()),
+            "LabUnits": _to_dictionary(pa, table.unit_codes, table.units),
+            "LabDateTime": _to_arrow(pa, pa.timestamp("us"), table.timestamps),
+        }
+    )  # O(s)
+
+    for name, data in (("patients", patients), ("labs", labs)):  # O(1)
+        filename = os.path.join(directory, f"{name}.{file_format}")  # O(1)
+        if file_format == "parquet":  # O(1)
+            import pyarrow.parquet
+
+            pyarrow.parquet.write_table(data, filename, compression="zstd")
+        else:
+            import pyarrow.feather
+
+            pyarrow.feather.write_feather(data, filename, compression="zstd")
+
+
+def read_columnar(directory: str) -> tuple[dict[str, Patient], LabTable]:
+    """
+    Read patients and their laboratory tests from columnar files.
+
+    The format is detected from the files in directory, which were
+    written by write_columnar.
+
+    Time Complexity
+    ---------------
+    O(Q+S) total, with O(Q) work in Python for parquet and feather
+    Q - number of patients
+    S - number of laboratory tests
+
+    Arguments
+    ---------
+    directory -- a string denoting a directory written by write_columnar
+
+    Return
+    ------
+    tuple[dict[str, Patient], LabTable]
+        the patients, whose get_labs() builds instances of the Lab class
+        from the table on first access, and the table
+    """
+    snapshot = os.path.join(directory, "records" + SNAPSHOT_SUFFIX)  # O(1)
+    if os.path.exists(snapshot):  # O(1)
+        cached = read_snapshot(snapshot)  # O(q+s)
+        if cached is None:  # O(1)
+            raise ValueError(f"{snapshot} is not a readable snapshot")
+        return cached  # O(1)
+
+    for file_format in ("parquet", "feather"):  # O(1)
+        if os.path.exists(os.path.join(directory, f"labs.{file_format}")):
+            break
+    else:
+        raise ValueError(f"{directory} holds no columnar files")
+
+    pa = _import_pyarrow()  # O(1)
+    if file_format == "parquet":  # O(1)
+        import pyarrow.parquet
+
+        read_table = pyarrow.parquet.read_table  # O(1)
+    else:
+        import pyarrow.feather
+
+        read_table = pyarrow.feather.read_table  # O(1)
+    patients = read_table(os.path.join(directory, f"patients.{file_format}"))
+    labs = read_table(os.path.join(directory, f"labs.{file_format}"))  # O(s)
+    labs = labs.unify_dictionaries().combine_chunks()  # O(s)
+
+    table = LabTable()  # O(1)
+    table.patient_codes = _from_dictionary(
+        labs.column("PatientID"), table.patient_ids
+    )  # O(s)
+    table.admission_codes = _from_dictionary(
+        labs.column("AdmissionID"), table.admission_ids
+    )  # O(s)
+    table.name_codes = _from_dictionary(
+        labs.column("LabName"), table.names
+    )  # O(s)
+    table.unit_codes = _from_dictionary(
+        labs.column("LabUnits"), table.units
+    )  # O(s)
+    table.values = _from_arrow("d", labs.column("LabValue"))  # O(s)
+    table.timestamps = _from_arrow(
+        "q", labs.column("LabDateTime").cast(pa.int64())
+    )  # O(s)
+
+    import pyarrow.compute
+
+    value_text = labs.column("LabValueText")  # O(1)
+    valid = value_text.is_valid()  # O(s)
+    for row, text in zip(
+        pyarrow.compute.indices_nonzero(valid).to_pylist(),
+        value_text.filter(valid).to_pylist(),
+    ):  # O(s)
+        table.set_value_text(row, text)  # O(1)
+
+    codes = _to_arrow(pa, pa.int32(), table.patient_codes)  # O(1)
+    indices = pyarrow.compute.sort_indices(codes)  # O(s log s)
+    order = _from_arrow("q", indices)  # O(s)
+    sorted_codes = _from_arrow("i", codes.take(indices))  # O(s)
+    start = 0  # O(1)
+    while start < len(sorted_codes):  # O(q)
+        code = sorted_codes[start]  # O(1)
+        end = bisect_right(sorted_codes, code, start)  # O(log s)
+        table._patient_rows[code] = order[start:end]  # O(r)
+        start = end  # O(1)
+
+    records: dict[str, Patient] = {}  # O(1)
+    for fields in zip(
+        *[patients.column(variable).to_pylist() for variable in PATIENT_VARIABLES]
+    ):  # O(q)
+        patient = Patient(*fields)  # O(1)
+        patient.set_lab_source(partial(table.labs, patient.id))  # O(1)
+        records[patient.id] = patient  # O(1)
+    return records, table  # O(1)
+
+
+def write_store(
+    store_filename: str,
+    records: dict[str, Patient],
+    table: Optional[LabTable] = None,
+) -> None:
+    """
+    Write patients and their laboratory tests to a shared store file.
+
+    The store is read by LabStore, which memory-maps it so that any
+    number of processes share one copy. Every column is written as the
+    raw bytes of an array aligned to 8 bytes, and strings are written as
+    UTF-8 bytes with their end offsets. The store is written to a
+    temporary file that replaces store_filename once complete.
+
+    Time Complexity
+    ---------------
+    O(Q log Q + S log N) total
+    Q - number of patients
+    S - number of laboratory tests
+    N - number of laboratory tests per patient
+
+    Arguments
+    ---------
+    store_filename -- a string denoting the store file
+
+    records -- a dictionary of instances of the Patient class keyed by
+        patient id
+
+    table -- an optional instance of the LabTable class holding the
+        patients' laboratory tests, which is built from the patients'
+        laboratory tests when not given
+
+    Return
+    ------
+    None
+    """
+    if table is None:  # O(1)
+        table = _table_from_records(records)  # O(q+s)
+
+    patients = sorted(records.values(), key=attrgetter("id"))  # O(q log q)
+    columns: list[tuple[str, Union[array, bytes]]] = []  # O(1)
+    for variable, attribute in zip(
+        PATIENT_VARIABLES,
+        ("id", "gender", "dob", "race", "ms", "lang", "pbp"),
+    ):  # O(1)
+        offsets, data = _encode_strings(
+            getattr(patient, attribute) for patient in patients
+        )  # O(q)
+        columns += [(variable + ".offsets", offsets), (variable, data)]
+
+    name_codes = table.name_codes  # O(1)
+    timestamps = table.timestamps  # O(1)
+    order = array("q")  # O(1)
+    patient_groups = array("q", [0])  # O(1)
+    group_names = array("i")  # O(1)
+    group_rows = array("q", [0])  # O(1)
+    group_min = array("d")  # O(1)
+    group_max = array("d")  # O(1)
+    for patient in patients:  # O(q)
+        rows = sorted(
+            table.rows(patient.id),
+            key=lambda row: (name_codes[row], timestamps[row]),
+        )  # O(n log n)
+        for name_code, group in groupby(rows, name_codes.__getitem__):
+            order.extend(group)  # O(n)
+            numbers = [
+                table.values[row]
+                for row in order[group_rows[-1] :]
+                if table.values[row] == table.values[row]
+            ]  # O(n)
+            group_names.append(name_code)  # O(1)
+            group_rows.append(len(order))  # O(1)
+            group_min.append(min(numbers, default=NAN))  # O(n)
+            group_max.append(max(numbers, default=NAN))  # O(n)
+        patient_groups.append(len(group_names))  # O(1)
+
+    group_patients = array("q")  # O(1)
+    for code in range(len(patients)):  # O(q)
+        group_patients.extend(
+            repeat(code, patient_groups[code + 1] - patient_groups[code])
+        )  # O(n)
+    name_order = sorted(
+        range(len(group_names)), key=group_names.__getitem__
+    )  # O(g log g), stable so patients stay in order of id
+    sorted_names = list(map(group_names.__getitem__, name_order))  # O(g)
+    name_groups = array(
+        "q",
+        [
+            bisect_left(sorted_names, name_code)
+            for name_code in range(len(table.names) + 1)
+        ],
+    )  # O(n log g)
+    name_patients = array("q", map(group_patients.__getitem__, name_order))
+    name_min = array("d", map(group_min.__getitem__, name_order))  # O(g)
+    name_max = array("d", map(group_max.__getitem__, name_order))  # O(g)
+
+    value_texts = table.value_texts()  # O(s)
+    value_text_rows = array("q")  # O(1)
+    value_text = []  # O(1)
+    for new_row, row in enumerate(order):  # O(s)
+        text = value_texts.get(row)  # O(1)
+        if text is not None:  # O(1)
+            value_text_rows.append(new_row)  # O(1)
+            value_text.append(text)  # O(1)
+    text_offsets, text_data = _encode_strings(value_text)  # O(s)
+
+    columns += [
+        ("patient_groups", patient_groups),
+        ("group_names", group_names),
+        ("group_rows", group_rows),
+        ("group_min", group_min),
+        ("group_max", group_max),
+        ("name_groups", name_groups),
+        ("name_patients", name_patients),
+        ("name_min", name_min),
+        ("name_max", name_max),
+        (
+            "admission_codes",
+            array("i", [table.admission_codes[row] for row in order]),
+        ),
+        ("unit_codes", array("i", [table.unit_codes[row] for row in order])),
+        ("values", array("d", [table.values[row] for row in order])),
+        ("timestamps", array("q", [timestamps[row] for row in order])),
+        ("value_text_rows", value_text_rows),
+        ("LabValueText.offsets", text_offsets),
+        ("LabValueText", text_data),
+    ]  # O(s)
+
+    layout = []  # O(1)
+    offset = 0  # O(1)
+    for name, column in columns:  # O(1)
+        typecode = column.typecode if isinstance(column, array) else "B"
+        size = len(column) * (
+            column.itemsize if isinstance(column, array) else 1
+        )  # O(1)
+        layout.append([name, typecode, offset, size])  # O(1)
+        offset = _aligned(offset + size)  # O(1)
+
+    temporary = f"{store_filename}.{os.getpid()}.tmp"  # O(1)
+    with open(temporary, "wb") as outfile:  # O(1)
+        outfile.write(STORE_MAGIC)  # O(1)
+        _write_block(
+            outfile,
+            {
+                "byteorder": sys.byteorder,
+                "vocabularies": [
+                    table.admission_ids.strings,
+                    table.names.strings,
+                    table.units.strings,
+                ],
+                "columns": layout,
+            },
+        )  # O(v)
+        start = _aligned(outfile.tell())  # O(1)
+        for (_, column), (_, _, offset, _) in zip(columns, layout):  # O(1)
+            outfile.write(bytes(start + offset - outfile.tell()))  # O(1)
+            outfile.write(column)  # O(s)
+    os.replace(temporary, store_filename)  # O(1)
+
+
+def _table_from_records(records: dict[str, Patient]) -> LabTable:
+    """Return a LabTable of every patient's laboratory tests."""
+    table = LabTable()  # O(1)
+    for patient in records.values():  # O(q)
+        for lab in patient.get_labs():  # O(n)
+            table.append(
+                lab.patient_id,
+                lab.admission_id,
+                lab.name,
+                lab.value,
+                lab.units,
+                lab.date_time,
+            )  # O(1)
+    return table  # O(1)
+
+
+def _encode_strings(strings: Iterable[str]) -> tuple[array, bytes]:
+    """Return the end offsets and UTF-8 bytes of a column of strings."""
+    offsets = array("q", [0])  # O(1)
+    chunks = []  # O(1)
+    for string in strings:  # O(n)
+        chunk = string.encode("utf-8")  # O(1)
+        chunks.append(chunk)  # O(1)
+        offsets.append(offsets[-1] + len(chunk))  # O(1)
+    return offsets, b"".join(chunks)  # O(n)
+
+
+def _aligned(offset: int) -> int:
+    """Return offset rounded up to a multiple of 8 bytes."""
+    return (offset + 7) & ~7  # O(1)
+
+
+def _import_pyarrow() -> Any:
+    """Return the pyarrow module, or raise ImportError with a hint."""
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise ImportError(
+            "pyarrow is required for the parquet and feather formats; use "
+            'file_format="snapshot" without it'
+        ) from error
+    return pyarrow  # O(1)
+
+
+def _to_arrow(pa: Any, type: Any, column: array) -> Any:
+    """Return an Arrow array sharing the buffer of an array column."""
+    if sys.byteorder != "little":  # O(1)
+        column = array(column.typecode, column)  # O(s)
+        column.byteswap()  # O(s)
+    return pa.Array.from_buffers(
+        type, len(column), [None, pa.py_buffer(column)]
+    )  # O(1)
+
+
+def _from_arrow(typecode: str, data: Any) -> array:
+    """Return an array column copied from an Arrow array without nulls."""
+    if hasattr(data, "combine_chunks"):  # O(1)
+        data = data.combine_chunks()  # O(s)
+    column = array(typecode)  # O(1)
+    if not len(data):  # O(1)
+        return column  # O(1)
+    size = column.itemsize  # O(1)
+    buffer = memoryview(data.buffers()[1])  # O(1)
+    column.frombytes(
+        buffer[data.offset * size : (data.offset + len(data)) * size]
+    )  # O(s)
+    if sys.byteorder != "little":  # O(1)
+        column.byteswap()  # O(s)
+    return column  # O(1)
+
+
+def _to_dictionary(pa: Any, codes: array, vocabulary: Vocabulary) -> Any:
+    """Return a dictionary-encoded Arrow array of a code column."""
+    return pa.DictionaryArray.from_arrays(
+        _to_arrow(pa, pa.int32(), codes), pa.array(vocabulary.strings, pa.string())
+    )  # O(s)
+
+
+def _from_dictionary(data: Any, vocabulary: Vocabulary) -> array:
+    """Return the codes in vocabulary of a dictionary-encoded Arrow column."""
+    data = data.combine_chunks()  # O(s)
+    if not hasattr(data, "dictionary"):  # O(1)
+        data = data.dictionary_encode()  # O(s)
+    code_map = [vocabulary.add(string) for string in data.dictionary.to_pylist()]
+    codes = _from_arrow("i", data.indices.cast("int32"))  # O(s)
+    if code_map != list(range(len(code_map))):  # O(v)
+        codes = array("i", [code_map[code] for code in codes])  # O(s)
+    return codes  # O(1)
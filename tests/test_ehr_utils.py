@@ -21,11 +21,92 @@ Functions
     test_age_first_visit() -> None:
         Test calculation of the patient's age at their
         first admission
+
+    test_stream_data() -> None:
+        Test the batched processing of EHR data
+
+    test_get_series() -> None:
+        Test the patient's index of laboratory test values
+
+    test_lab_table() -> None:
+        Test the columnar storage of laboratory tests
+
+    test_sick_patients() -> None:
+        Test the cohort-wide history of illness
+
+    test_parse_data_workers(monkeypatch) -> None:
+        Test the parallel processing of EHR data
+
+    test_parse_data_mmap() -> None:
+        Test the memory-mapped processing of EHR data
+
+    test_parse_data_cache(tmp_path, monkeypatch) -> None:
+        Test the binary snapshot cache of EHR data
+
+    test_update_data() -> None:
+        Test the incremental processing of appended EHR data
+
+    test_cached_datetimes() -> None:
+        Test the parse-once dates and cached ages
+
+    test_parse_data_fast() -> None:
+        Test the processing of EHR data into LabRecord tuples
+
+    test_lab_vocabulary() -> None:
+        Test the interning of repeated laboratory test strings
+
+    test_labs_between() -> None:
+        Test the time range queries on laboratory tests
+
+    test_admissions() -> None:
+        Test the patient's index of laboratory tests by admission
+
+    test_lab_summary() -> None:
+        Test the summary statistics of laboratory tests
+
+    test_query() -> None:
+        Test the compiled queries on patients
+
+    test_load_stats(tmp_path) -> None:
+        Test the timings of each stage of processing EHR data
+
+    test_parse_lazy(tmp_path) -> None:
+        Test the on-demand processing of laboratory tests by patient
+
+    test_columnar(tmp_path, file_format) -> None:
+        Test the columnar export and reload of EHR data
+
+    test_columnar_without_pyarrow(tmp_path, monkeypatch) -> None:
+        Test the columnar export and reload of EHR data without pyarrow
+
+    test_compressed_input(compression) -> None:
+        Test the processing of gzip and zstd compressed EHR data
+
+    test_lab_filter() -> None:
+        Test the selection of laboratory tests while EHR data is parsed
+
+    test_lab_store(tmp_path) -> None:
+        Test the shared read-only store of EHR data
+
+    test_sort_labs(tmp_path) -> None:
+        Test the external sort of laboratory tests by patient
+
+    test_partition_data(tmp_path) -> None:
+        Test the splitting of EHR data into shards by patient
+
+    test_cohort_ages() -> None:
+        Test the batch calculation of the patients' ages
 """
 
 
 from ehr_utils import *
+from datetime import datetime
+import ehr_utils
+import gzip
+import json
 import os
+import pytest
+import sys
 
 
 PATIENT_FILE: str = "PatientID\tPatientGender\
@@ -236,3 +317,1651 @@ def test_age_first_visit() -> None:
 
     # assert
     assert true_age == test_age
+
+
+def test_stream_data() -> None:
+    """
+    Test stream_data().
+
+    Test the batched processing of EHR data.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    buffer_size = 4
+    true_batch_sizes = [4, 4, 1]
+    true_lab_count = 4
+
+    # run
+    batches = list(stream_data(patient_file, labs_file, buffer_size))
+    records = parse_data(patient_file, labs_file)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    test_batch_sizes = [
+        sum(len(patient.get_labs()) for patient in batch.values())
+        for batch in batches
+    ]
+    test_lab_count = sum(
+        len(batch[patient_id].get_labs())
+        for batch in batches
+        if patient_id in batch
+    )
+
+    # assert
+    assert test_batch_sizes == true_batch_sizes
+    assert test_lab_count == true_lab_count
+    assert test_lab_count == len(records[patient_id].get_labs())
+
+
+def test_get_series() -> None:
+    """
+    Test get_series().
+
+    Test the patient's index of laboratory test values.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    lab_name = "URINALYSIS: RED BLOOD CELLS"
+    true_values = [0.2, 3.5]
+    true_min = 0.2
+    true_max = 3.5
+    true_earliest = "2001-03-20 21:28:32.137"
+
+    # run
+    records = parse_data(patient_file, labs_file)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    patient = records[patient_id]
+    series = patient.get_series(lab_name)
+    missing = patient.get_series("CBC: PLATELET COUNT")
+    missing_result = patient.is_sick("CBC: PLATELET COUNT", ">", 0.0)
+
+    # assert
+    assert series.values == true_values
+    assert series.min_value == true_min
+    assert series.max_value == true_max
+    assert series.earliest == true_earliest
+    assert missing is None
+    assert missing_result is False
+
+
+def test_lab_table() -> None:
+    """
+    Test LabTable.
+
+    Test the columnar storage of laboratory tests.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    lab_name = "URINALYSIS: RED BLOOD CELLS"
+    true_rows = 9
+    true_names = 3
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    table = LabTable()
+    table_records = parse_data(patient_file, labs_file, table)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    true_labs = [
+        (lab.patient_id, lab.admission_id, lab.name, lab.value, lab.units,
+         lab.date_time)
+        for lab in records[patient_id].get_labs()
+    ]
+    test_labs = [
+        (lab.patient_id, lab.admission_id, lab.name, lab.value, lab.units,
+         lab.date_time)
+        for lab in table_records[patient_id].get_labs()
+    ]
+
+    # assert
+    assert len(table) == true_rows
+    assert len(table.names) == true_names
+    assert test_labs == true_labs
+    assert table_records[patient_id].is_sick(lab_name, ">", 2.8)
+
+
+def test_sick_patients() -> None:
+    """
+    Test sick_patients().
+
+    Test the cohort-wide history of illness.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    lab_name = "URINALYSIS: RED BLOOD CELLS"
+    predicates = [
+        (lab_name, ">", 2.8),
+        (lab_name, ">", 3.4),
+        (lab_name, "<", 0.15),
+        (lab_name, "<", 0.1),
+        ("CBC: WHITE BLOOD CELL COUNT", ">", 5.0),
+        ("CBC: PLATELET COUNT", ">", 5.0),
+    ]
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    table = LabTable()
+    parse_data(patient_file, labs_file, table)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    for name, operator, value in predicates:
+        true_ids = sorted(
+            patient_id
+            for patient_id, patient in records.items()
+            if patient.is_sick(name, operator, value)
+        )
+        test_ids = sorted(table.sick_patients(name, operator, value))
+        assert test_ids == true_ids
+
+
+def test_parse_data_workers(monkeypatch) -> None:
+    """
+    Test parse_data() with worker processes.
+
+    Test the parallel processing of EHR data.
+
+    Arguments
+    ---------
+    monkeypatch -- the pytest fixture used to shrink the byte ranges
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    monkeypatch.setattr(ehr_utils, "DEFAULT_CHUNK_SIZE", 100)
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    parallel_records = parse_data(patient_file, labs_file, workers=2)
+    table = LabTable()
+    table_records = parse_data(patient_file, labs_file, table, workers=2)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    for patient_id, patient in records.items():
+        true_labs = [vars(lab) for lab in patient.get_labs()]
+        test_labs = [
+            vars(lab) for lab in parallel_records[patient_id].get_labs()
+        ]
+        table_labs = [
+            vars(lab) for lab in table_records[patient_id].get_labs()
+        ]
+        assert test_labs == true_labs
+        assert table_labs == true_labs
+    assert len(table) == 9
+
+
+def test_parse_data_mmap() -> None:
+    """
+    Test parse_data() with memory-mapped files.
+
+    Test the memory-mapped processing of EHR data.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    mapped_records = parse_data(patient_file, labs_file, use_mmap=True)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    assert mapped_records.keys() == records.keys()
+    for patient_id, patient in records.items():
+        mapped_patient = mapped_records[patient_id]
+        true_labs = [vars(lab) for lab in patient.get_labs()]
+        test_labs = [vars(lab) for lab in mapped_patient.get_labs()]
+        assert mapped_patient.pbp == patient.pbp
+        assert test_labs == true_labs
+
+
+def test_parse_data_cache(tmp_path, monkeypatch) -> None:
+    """
+    Test parse_data() with a snapshot cache.
+
+    Test the binary snapshot cache of EHR data.
+
+    Arguments
+    ---------
+    tmp_path -- the pytest fixture used as the cache directory
+
+    monkeypatch -- the pytest fixture used to change the lab file while
+        it is parsed
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    cache_dir = str(tmp_path)
+    patient_id = "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    lab_name = "METABOLIC: CREATININE"
+    new_lab = (
+        f"{patient_id}\t3\t{lab_name}\t2.5\tmg/dL\t2010-01-01 00:00:00.000\n"
+    )
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    first_records = parse_data(patient_file, labs_file, cache_dir=cache_dir)
+    snapshot = cache_filename(patient_file, labs_file, cache_dir)
+    cached = read_snapshot(snapshot)
+    cached_records = parse_data(patient_file, labs_file, cache_dir=cache_dir)
+
+    labs = open(labs_file, mode="a", newline="\n")
+    labs.write(new_lab)
+    labs.close()
+    stale = read_snapshot(snapshot)
+    rebuilt_records = parse_data(patient_file, labs_file, cache_dir=cache_dir)
+
+    iter_rows = ehr_utils._iter_rows
+
+    def appending_iter_rows(*args, **kwargs):
+        yield from iter_rows(*args, **kwargs)
+        labs = open(labs_file, mode="a", newline="\n")
+        labs.write(new_lab)
+        labs.close()
+
+    monkeypatch.setattr(ehr_utils, "_iter_rows", appending_iter_rows)
+    raced_dir = str(tmp_path / "raced")
+    parse_data(patient_file, labs_file, cache_dir=raced_dir)
+    raced = read_snapshot(cache_filename(patient_file, labs_file, raced_dir))
+    full_table = LabTable()
+    parse_data(patient_file, labs_file, table=full_table)
+    with pytest.raises(ValueError):
+        parse_data(patient_file, labs_file, full_table, cache_dir=cache_dir)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    assert cached is not None
+    assert stale is None
+    assert raced is None
+    for patient_id_, patient in records.items():
+        true_labs = [vars(lab) for lab in patient.get_labs()]
+        for other in (first_records, cached_records):
+            test_labs = [vars(lab) for lab in other[patient_id_].get_labs()]
+            assert test_labs == true_labs
+            assert other[patient_id_].dob == patient.dob
+    assert len(rebuilt_records[patient_id].get_labs()) == 5
+    assert rebuilt_records[patient_id].is_sick(lab_name, ">", 2.0)
+
+
+def test_update_data() -> None:
+    """
+    Test update_data().
+
+    Test the incremental processing of appended EHR data.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    lab_name = "METABOLIC: CREATININE"
+    complete_lab = (
+        f"{patient_id}\t3\t{lab_name}\t2.5\tmg/dL\t2010-01-01 00:00:00.000\n"
+    )
+    partial_lab = f"{patient_id}\t3\t{lab_name}\t0.1"
+    rest_of_lab = "\tmg/dL\t2010-01-02 00:00:00.000\n"
+    other_id = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    many_labs = LABS_FILE + complete_lab * 2000
+    edited_labs = many_labs.replace("\t2.5\t", "\t2.6\t", 1000)
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    table = LabTable()
+    table_records = parse_data(patient_file, labs_file, table)
+    table_records[patient_id].get_labs()
+    cursor = LabCursor.at_end(labs_file)
+    table_cursor = LabCursor.at_end(labs_file)
+    lazy_records = parse_lazy(patient_file, labs_file, max_resident=1)
+    lazy_records[patient_id].get_labs()
+    lazy_cursor = LabCursor.at_end(labs_file)
+
+    labs = open(labs_file, mode="a", newline="\n")
+    labs.write(complete_lab + partial_lab)
+    labs.close()
+    cursor = update_data(records, labs_file, cursor)
+    first_count = len(records[patient_id].get_labs())
+    first_sick = records[patient_id].is_sick(lab_name, ">", 2.0)
+    lazy_cursor = update_data(lazy_records, labs_file, lazy_cursor)
+    lazy_first_count = len(lazy_records[patient_id].get_labs())
+    lazy_records[other_id].get_labs()
+
+    labs = open(labs_file, mode="a", newline="\n")
+    labs.write(rest_of_lab)
+    labs.close()
+    cursor = update_data(records, labs_file, cursor)
+    second_sick = records[patient_id].is_sick(lab_name, "<", 0.2)
+    table_cursor = update_data(table_records, labs_file, table_cursor, table)
+    lazy_cursor = update_data(lazy_records, labs_file, lazy_cursor)
+    with pytest.raises(ValueError):
+        update_data(records, patient_file, cursor)
+    lazy_labs = lazy_records[patient_id].get_labs()
+
+    fresh_records = {
+        patient.id: patient for patient in iter_patients(patient_file)
+    }
+    fresh_cursor = update_data(fresh_records, labs_file)
+    end_cursor = LabCursor.at_end(labs_file)
+
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+    stale = cursor.matches()
+
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(many_labs)
+    labs.close()
+    many_cursor = LabCursor.at_end(labs_file)
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(edited_labs)
+    labs.close()
+    edited_stale = many_cursor.matches()
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    assert first_count == 5
+    assert first_sick
+    assert len(records[patient_id].get_labs()) == 6
+    assert second_sick
+    assert len(table) == 11
+    assert len(table_records[patient_id].get_labs()) == 6
+    assert table_cursor.offset == cursor.offset
+    assert fresh_cursor.offset == cursor.offset
+    assert cursor.checksum == end_cursor.checksum
+    assert table_cursor.checksum == cursor.checksum
+    assert fresh_cursor.checksum == cursor.checksum
+    assert len(fresh_records[patient_id].get_labs()) == 6
+    assert lazy_first_count == 5
+    assert lazy_cursor.offset == cursor.offset
+    assert [vars(lab) for lab in lazy_labs] == [
+        vars(lab) for lab in records[patient_id].get_labs()
+    ]
+    assert not stale
+    assert len(edited_labs) == len(many_labs)
+    assert not edited_stale
+
+
+def test_cached_datetimes() -> None:
+    """
+    Test dob_datetime, timestamp and the cached ages.
+
+    Test the parse-once dates and cached ages.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    true_dob = datetime(1960, 12, 6, 6, 37, 5, 640000)
+    true_timestamp = datetime(1986, 12, 5, 17, 46, 42, 850000)
+    new_dob = "1970-12-06 06:37:05.640"
+    true_age_first_visit = 25
+    true_new_age_first_visit = 15
+
+    # run
+    records = parse_data(patient_file, labs_file)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    patient = records[patient_id]
+    test_dob = patient.dob_datetime
+    lab = patient.get_labs()[0]
+    test_timestamp = lab.timestamp
+    lab_attributes = vars(lab)
+    lab.date_time = "1987-12-05 17:46:42.850"
+    new_timestamp = lab.timestamp
+    age = patient.age
+    test_age_first_visit = patient.age_first_visit()
+
+    patient.dob = new_dob
+    new_age = patient.age
+    test_new_age_first_visit = patient.age_first_visit()
+
+    # assert
+    assert test_dob == true_dob
+    assert test_timestamp == true_timestamp
+    assert "_timestamp" not in lab_attributes
+    assert new_timestamp == true_timestamp.replace(year=1987)
+    for zone in ("Z", "+00:00"):
+        zoned = Lab(*LABS_FILE.splitlines()[1].split("\t"))
+        zoned.date_time += zone
+        with pytest.raises(ValueError):
+            zoned.timestamp
+    assert test_age_first_visit == true_age_first_visit
+    assert new_age == age - 10
+    assert test_new_age_first_visit == true_new_age_first_visit
+
+
+def test_parse_data_fast() -> None:
+    """
+    Test parse_data() with fast records.
+
+    Test the processing of EHR data into LabRecord tuples.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    lab_name = "URINALYSIS: RED BLOOD CELLS"
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    fast_records = parse_data(patient_file, labs_file, fast=True)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    patient = fast_records[patient_id]
+    true_labs = [
+        (lab.patient_id, lab.admission_id, lab.name, lab.value, lab.units,
+         lab.date_time)
+        for lab in records[patient_id].get_labs()
+    ]
+
+    # assert
+    assert all(isinstance(lab, LabRecord) for lab in patient.get_labs())
+    assert [tuple(lab) for lab in patient.get_labs()] == true_labs
+    assert patient.is_sick(lab_name, ">", 2.8)
+    assert patient.age_first_visit() == 25
+
+
+def test_lab_vocabulary() -> None:
+    """
+    Test LabVocabulary.
+
+    Test the interning of repeated laboratory test strings.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    lab_name = "METABOLIC: CREATININE"
+
+    # run
+    vocabulary = LabVocabulary()
+    records = parse_data(patient_file, labs_file, vocabulary=vocabulary)
+    table = LabTable(vocabulary)
+    parse_data(patient_file, labs_file, table)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    patient = records[patient_id]
+    names = [lab.name for lab in patient.get_labs() if lab.name == lab_name]
+    name_code = vocabulary.names.get(lab_name)
+    table_rows = [
+        row
+        for row in table.rows(patient_id)
+        if table.name_codes[row] == name_code
+    ]
+
+    # assert
+    assert len(vocabulary.names) == 3
+    assert names[0] is names[1]
+    assert all(lab.patient_id is patient.id for lab in patient.get_labs())
+    assert vocabulary.names.intern(lab_name) is names[0]
+    assert len(table_rows) == len(names)
+    assert table.names is vocabulary.names
+
+
+def test_labs_between() -> None:
+    """
+    Test labs_between() and last_before().
+
+    Test the time range queries on laboratory tests.
+
+    Arguments
+    ---------
+    None
+
+    Return
+    -------
+    None
+    """
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    lab_name = "URINALYSIS: RED BLOOD CELLS"
+    true_dates = ["1941-11-15 08:04:26.190", "2008-05-21 06:51:12.250"]
+    true_window = ["2008-05-21 06:51:12.250"]
+    true_before = "0.1"
+
+    # run
+    records = parse_data(patient_file, labs_file)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    patient = records[patient_id]
+    test_dates = patient.get_series(lab_name).dates
+    test_window = [
+        lab.date_time
+        for lab in patient.labs_between(
+            lab_name, datetime(2000, 1, 1), "2008-05-21 06:51:12.250"
+        )
+    ]
+    test_before = patient.last_before(lab_name, datetime(2008, 5, 21))
+    test_none = patient.last_before(lab_name, "1900-01-01 00:00:00.000")
+    test_missing = patient.labs_between("CBC: PLATELET COUNT", "0", "9")
+    after_lab = datetime(2008, 5, 21, 6, 51, 12, 250001)
+    test_after = patient.labs_between(lab_name, after_lab, datetime(2009, 1, 1))
+    test_just_before = patient.last_before(lab_name, after_lab)
+
+    # assert
+    assert test_dates == true_dates
+    assert test_window == true_window
+    assert test_after == []
+    assert test_just_before.date_time == true_window[0]
+    assert test_before.value == true_before
+    assert test_none is None
+    assert test_missing == []
+
+
+def test_admissions() -> None:
+    """
+    Test Patient.get_admission() and Patient.get_admissions().
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    true_order = ["1", "4", "5"]
+    true_count = 3
+    true_first = "1986-11-30 20:32:15.443"
+    true_creatinine = "0.5"
+    true_stay = datetime(1986, 12, 6, 4, 11, 32, 937000) - datetime(
+        1986, 11, 30, 20, 32, 15, 443000
+    )
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    table_records = parse_data(patient_file, labs_file, table=LabTable())
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    for test_records in (records, table_records):
+        patient = test_records[patient_id]
+        test_order = [admission.id for admission in patient.get_admissions()]
+        admission = patient.get_admission("1")
+
+        # assert
+        assert test_order == true_order
+        assert len(admission.labs) == true_count
+        assert admission.first == true_first
+        assert patient.first_visit == true_first
+        assert admission.first_lab("METABOLIC: CREATININE").value == (
+            true_creatinine
+        )
+        assert admission.first_lab("CBC: PLATELET COUNT") is None
+        creatinine = admission.get_series("METABOLIC: CREATININE")
+        assert creatinine.labs[0] is admission.first_lab(
+            "METABOLIC: CREATININE"
+        )
+        assert admission.get_series("CBC: PLATELET COUNT") is None
+        assert admission.length_of_stay == true_stay
+        assert patient.get_admission("9") is None
+
+
+def test_lab_summary() -> None:
+    """
+    Test Patient.get_summary() and LabTable.summary().
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    patient_id = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    lab_name = "URINALYSIS: RED BLOOD CELLS"
+    true_summary = LabSummary(
+        2,
+        2,
+        0.2,
+        3.5,
+        (3.5 + 0.2) / 2,
+        3.5,
+        "2001-03-20 21:28:32.137",
+        "2008-02-26 05:38:56.980",
+    )
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    table = LabTable()
+    table_records = parse_data(patient_file, labs_file, table=table)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    test_summary = records[patient_id].get_summary(lab_name)
+    test_summaries = records[patient_id].get_summaries()
+    test_table = table.summary(lab_name)
+
+    # assert
+    assert test_summary == true_summary
+    assert test_summaries[lab_name] == true_summary
+    assert len(test_summaries) == 3
+    assert records[patient_id].get_summary("CBC: PLATELET COUNT") is None
+    assert test_table == {
+        patient_id: records[patient_id].get_summary(lab_name)
+        for patient_id in records
+    }
+    assert table_records[patient_id].get_summary(lab_name) == true_summary
+    assert table.summary("CBC: PLATELET COUNT") == {}
+
+
+def test_query() -> None:
+    """
+    Test Query.compile() and QueryPlan.select().
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    older = "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    younger = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    creatinine = "METABOLIC: CREATININE"
+    rbc = "URINALYSIS: RED BLOOD CELLS"
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    table = LabTable()
+    table_records = parse_data(patient_file, labs_file, table=table)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    age = records[younger].age
+    test_ge = Query.lab(creatinine, ">=", 1.2).compile().select(records)
+    test_eq = Query.lab(creatinine, "==", 0.9).compile().select(records)
+    test_and = (
+        (
+            Query.lab(creatinine, "between", (0.4, 0.6))
+            & Query.demographic("gender", "==", "Male")
+        )
+        .compile()
+        .select(records)
+    )
+    test_or = (
+        (Query.demographic("pbp", "<", 16) | Query.lab(rbc, "<=", 0.1))
+        .compile()
+        .select(records)
+    )
+    test_age = (
+        (Query.age("between", (age, age)) & Query.lab(rbc, ">", 3))
+        .compile()
+        .select(records)
+    )
+    test_none = Query.lab("CBC: PLATELET COUNT", "<", 1e9).compile()
+    test_table = [
+        query.compile().select(table_records, table)
+        for query in (
+            Query.lab(creatinine, ">=", 1.2),
+            Query.lab(creatinine, "==", 0.9),
+            Query.lab(creatinine, "between", (0.4, 0.6))
+            & Query.demographic("gender", "==", "Male"),
+            Query.demographic("pbp", "<", 16) | Query.lab(rbc, "<=", 0.1),
+        )
+    ]
+
+    # assert
+    assert test_ge == [older]
+    assert test_eq == [younger]
+    assert test_and == [younger]
+    assert test_or == [older, younger]
+    assert test_age == [younger]
+    assert test_none.select(records) == []
+    assert test_table == [test_ge, test_eq, test_and, test_or]
+    assert not test_none.matches(records[older])
+    for operator in (">", "<"):
+        plan = Query.lab(rbc, operator, 1.0).compile()
+        for patient in records.values():
+            assert plan.matches(patient) == patient.is_sick(rbc, operator, 1.0)
+    with pytest.raises(ValueError):
+        Query.lab(creatinine, "!=", 1.0)
+    with pytest.raises(ValueError):
+        Query.demographic("race", ">", "White")
+
+
+def test_load_stats(tmp_path) -> None:
+    """
+    Test parse_data() with an instance of LoadStats.
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    true_bytes = os.path.getsize(patient_file) + os.path.getsize(labs_file)
+    true_rows = {"patients": 2, "read": 9, "labs": 9}
+    true_stages = ["patients", "read", "labs"]
+
+    # run
+    hooked = []
+    stats = LoadStats(lambda name, seconds, rows: hooked.append(name))
+    records = parse_data(patient_file, labs_file, stats=stats)
+    table_stats = LoadStats()
+    parse_data(
+        patient_file, labs_file, cache_dir=str(tmp_path), stats=table_stats
+    )
+    cached_stats = LoadStats()
+    parse_data(
+        patient_file, labs_file, cache_dir=str(tmp_path), stats=cached_stats
+    )
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    assert stats.rows == true_rows
+    assert hooked == true_stages
+    assert stats.bytes_read == true_bytes
+    assert stats.seconds["labs"] >= stats.seconds["read"] > 0
+    assert stats.rows_per_second("labs") > 0
+    assert stats.rows_per_second("missing") == 0.0
+    assert stats.as_dict()["rows"] == true_rows
+    assert len(records) == 2
+    assert table_stats.rows["labs"] == 9
+    assert table_stats.rows["snapshot_write"] == 9
+    assert "snapshot_read" in table_stats.seconds
+    assert cached_stats.rows == {"snapshot_read": 9}
+    assert "patients" not in cached_stats.seconds
+
+
+def test_parse_lazy(tmp_path) -> None:
+    """
+    Test parse_lazy() with a LabIndex file and a bounded LabCache.
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    index_file = str(tmp_path / "labs.ehridx")
+    older = "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    younger = "016A590E-D093-4667-A5DA-D68EA6987D93"
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    lazy = parse_lazy(patient_file, labs_file, index_file, max_resident=1)
+    test_before = len(lazy[older].labs)
+    test_older = [vars(lab) for lab in lazy[older].get_labs()]
+    test_younger = [vars(lab) for lab in lazy[younger].get_labs()]
+    test_evicted = len(lazy[older].labs)
+    test_reloaded = lazy[older].is_sick("METABOLIC: CREATININE", ">", 1.0)
+    test_index = LabIndex.load(index_file)
+    test_fingerprint = ehr_utils._fingerprint(labs_file)
+    reused = parse_lazy(patient_file, labs_file, index_file)
+    test_reused = reused[younger].age_first_visit()
+
+    labs = open(labs_file, mode="a", newline="\n")
+    labs.write(f"{older}\t3\tCBC: PLATELET COUNT\t200\tk/cumm\t")
+    labs.write("2010-01-01 00:00:00.000\n")
+    labs.close()
+    test_stale = LabIndex.load(index_file)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    assert test_before == 0
+    assert test_older == [vars(lab) for lab in records[older].labs]
+    assert test_younger == [vars(lab) for lab in records[younger].labs]
+    assert test_evicted == 0
+    assert len(lazy[younger].labs) == 0
+    assert test_reloaded
+    assert test_index is not None
+    assert len(test_index.offsets[older]) == 4
+    assert test_index.fingerprint == test_fingerprint
+    assert test_reused == records[younger].age_first_visit()
+    assert test_stale is None
+
+
+@pytest.mark.parametrize("file_format", ["snapshot", "parquet", "feather"])
+def test_columnar(tmp_path, file_format) -> None:
+    """
+    Test write_columnar() and read_columnar().
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    if file_format != "snapshot":
+        pytest.importorskip("pyarrow")
+
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.write(
+        "016A590E-D093-4667-A5DA-D68EA6987D93\t2\tURINALYSIS: COLOR\t"
+        "YELLOW\t\t1990-01-01 00:00:00.000\n"
+        "016A590E-D093-4667-A5DA-D68EA6987D93\t2\tCBC: PLATELET COUNT\t"
+        "7.10\tk/cumm\t1990-01-01 00:00:00.000\n"
+    )
+    labs.close()
+
+    directory = str(tmp_path / file_format)
+
+    # run
+    records = parse_data(patient_file, labs_file)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    write_columnar(directory, records, file_format=file_format)
+    test_records, test_table = read_columnar(directory)
+
+    # assert
+    assert len(test_table) == 11
+    assert list(test_records) == list(records)
+    for patient_id, patient in records.items():
+        test_patient = test_records[patient_id]
+        assert test_patient.dob == patient.dob
+        assert test_patient.dob_datetime == patient.dob_datetime
+        assert test_patient.pbp == patient.pbp
+        assert [vars(lab) for lab in test_patient.get_labs()] == [
+            vars(lab) for lab in patient.labs
+        ]
+    assert test_table.sick_patients("METABOLIC: CREATININE", ">", 1.0) == [
+        "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    ]
+    with pytest.raises(ValueError):
+        write_columnar(directory, records, file_format="csv")
+
+
+def test_columnar_without_pyarrow(tmp_path, monkeypatch) -> None:
+    """
+    Test write_columnar() and read_columnar() when pyarrow is missing.
+
+    Arguments
+    ---------
+    tmp_path -- the pytest fixture used as the output directory
+
+    monkeypatch -- the pytest fixture used to hide pyarrow
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.write(
+        "016A590E-D093-4667-A5DA-D68EA6987D93\t2\tURINALYSIS: COLOR\t"
+        "YELLOW\t\t1990-01-01 00:00:00.000\n"
+        "0BC491C5-5A45-4067-BD11-A78BEA00D3BE\t2\tURINALYSIS: COLOR\t"
+        "\t\t1990-01-02 00:00:00.000\n"
+        "0BC491C5-5A45-4067-BD11-A78BEA00D3BE\t2\tCBC: PLATELET COUNT\t"
+        "7.10\tk/cumm\t1990-01-03 00:00:00.000\n"
+    )
+    labs.close()
+
+    directory = str(tmp_path / "snapshot")
+
+    # run
+    records = parse_data(patient_file, labs_file)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    write_columnar(directory, records, file_format="snapshot")
+    test_records, test_table = read_columnar(directory)
+
+    # assert
+    assert sorted(test_table.value_texts().values()) == ["", "7.10", "YELLOW"]
+    assert list(test_records) == list(records)
+    for patient_id, patient in records.items():
+        test_patient = test_records[patient_id]
+        assert test_patient.dob == patient.dob
+        assert test_patient.dob_datetime == patient.dob_datetime
+        assert [vars(lab) for lab in test_patient.get_labs()] == [
+            vars(lab) for lab in patient.labs
+        ]
+    with pytest.raises(ImportError):
+        write_columnar(str(tmp_path / "parquet"), records)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_compressed_input(compression) -> None:
+    """
+    Test parse_data() and stream_data() on compressed files.
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    if compression == "gzip":
+        compress = gzip.compress
+    else:
+        compress = pytest.importorskip("zstandard").ZstdCompressor().compress
+
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    compressed_patients = "test_patients.txt.gz"
+    with open(compressed_patients, "wb") as outfile:
+        outfile.write(compress(PATIENT_FILE.encode()))
+
+    # Two concatenated members or frames, as written by parallel
+    # compressors.
+    middle = LABS_FILE.index("\n", len(LABS_FILE) // 2) + 1
+    compressed_labs = "test_labs.txt.gz"
+    with open(compressed_labs, "wb") as outfile:
+        outfile.write(compress(LABS_FILE[:middle].encode()))
+        outfile.write(compress(LABS_FILE[middle:].encode()))
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    test_records = parse_data(compressed_patients, compressed_labs)
+    test_mmap = parse_data(compressed_patients, compressed_labs, use_mmap=True)
+    table = LabTable()
+    parse_data(compressed_patients, compressed_labs, table=table, workers=2)
+    test_batches = list(stream_data(compressed_patients, compressed_labs, 1))
+
+    try:
+        LabIndex.build(compressed_labs)
+    except ValueError:
+        test_index = None
+    else:
+        test_index = "built"
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+    os.remove(compressed_patients)
+    os.remove(compressed_labs)
+
+    # assert
+    for parsed in (test_records, test_mmap):
+        assert list(parsed) == list(records)
+        for patient_id, patient in records.items():
+            assert parsed[patient_id].dob == patient.dob
+            assert [vars(lab) for lab in parsed[patient_id].labs] == [
+                vars(lab) for lab in patient.labs
+            ]
+    assert len(table) == 9
+    assert table.sick_patients("METABOLIC: CREATININE", ">", 1.0) == [
+        "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    ]
+    assert len(test_batches) == 9
+    assert sum(
+        len(patient.labs) for batch in test_batches for patient in batch.values()
+    ) == 9
+    assert test_index is None
+
+
+def test_lab_filter() -> None:
+    """
+    Test parse_data(), iter_labs() and stream_data() with a LabFilter.
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    older = "0BC491C5-5A45-4067-BD11-A78BEA00D3BE"
+    younger = "016A590E-D093-4667-A5DA-D68EA6987D93"
+    by_name_value = "URINALYSIS: RED BLOOD CELLS"
+    by_name = LabFilter(lab_names=[by_name_value])
+    by_patient = LabFilter(
+        patient_ids=[older], start="2000-01-01 00:00:00.000"
+    )
+    projected = LabFilter(
+        lab_names=["METABOLIC: CREATININE", "CBC: PLATELET COUNT"],
+        end=datetime(2000, 1, 1),
+        columns=("PatientID", "LabName", "LabValue", "LabDateTime"),
+    )
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    all_labs = [vars(lab) for lab in iter_labs(labs_file)]
+    test_names = {
+        use_mmap: [
+            vars(lab)
+            for lab in iter_labs(labs_file, use_mmap, lab_filter=by_name)
+        ]
+        for use_mmap in (False, True)
+    }
+    test_patient = parse_data(patient_file, labs_file, lab_filter=by_patient)
+    table = LabTable()
+    parse_data(patient_file, labs_file, table=table, lab_filter=by_patient)
+    test_projected = parse_data(
+        patient_file, labs_file, use_mmap=True, lab_filter=projected
+    )
+    test_batches = list(
+        stream_data(patient_file, labs_file, lab_filter=by_patient)
+    )
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    for use_mmap in (False, True):
+        assert test_names[use_mmap] == [
+            lab for lab in all_labs if lab["_name"] == by_name_value
+        ]
+        assert len(test_names[use_mmap]) == 4
+    assert list(test_patient) == [older]
+    assert [lab.date_time for lab in test_patient[older].labs] == [
+        lab.date_time
+        for lab in records[older].labs
+        if lab.date_time >= "2000-01-01"
+    ]
+    assert len(table) == len(test_patient[older].labs)
+    assert [vars(lab) for lab in table.labs(older)] == [
+        vars(lab) for lab in test_patient[older].labs
+    ]
+    assert len(test_projected[younger].labs) == 2
+    assert len(test_projected[older].labs) == 1
+    assert {lab.units for lab in test_projected[younger].labs} == {""}
+    assert {lab.admission_id for lab in test_projected[younger].labs} == {""}
+    assert test_projected[younger].is_sick("METABOLIC: CREATININE", ">", 0.7)
+    assert [list(batch) for batch in test_batches] == [[older]]
+    with pytest.raises(ValueError):
+        LabFilter(columns=("LabName",))
+    with pytest.raises(ValueError):
+        LabFilter(columns=("PatientID", "LabColour"))
+
+
+def test_lab_store(tmp_path) -> None:
+    """
+    Test write_store(), LabStore and PatientView.
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.write(
+        "016A590E-D093-4667-A5DA-D68EA6987D93\t2\tURINALYSIS: COLOR\t"
+        "YELLOW\t\t1990-01-01 00:00:00.000\n"
+    )
+    labs.close()
+
+    store_file = str(tmp_path / "records.ehrstore")
+    cases = [
+        ("METABOLIC: CREATININE", ">", 1.0),
+        ("METABOLIC: CREATININE", "<", 0.6),
+        ("URINALYSIS: RED BLOOD CELLS", ">", 3.4),
+        ("URINALYSIS: COLOR", ">", 0.0),
+        ("CBC: PLATELET COUNT", "<", 100.0),
+    ]
+
+    # run
+    records = parse_data(patient_file, labs_file)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    write_store(store_file, records)
+    store = LabStore(store_file)
+    test_ids = list(store)
+    test_views = {patient_id: store[patient_id] for patient_id in records}
+
+    # assert
+    assert test_ids == sorted(records)
+    assert len(store) == 2
+    assert "missing" not in store
+    with pytest.raises(KeyError):
+        store["missing"]
+    for patient_id, patient in records.items():
+        view = test_views[patient_id]
+        assert (view.id, view.gender, view.dob, view.pbp) == (
+            patient.id,
+            patient.gender,
+            patient.dob,
+            patient.pbp,
+        )
+        assert view.age == patient.age
+        assert view.first_visit == patient.first_visit
+        assert view.age_first_visit() == patient.age_first_visit()
+        assert sorted(
+            (lab.name, lab.date_time, lab.value, lab.units, lab.admission_id)
+            for lab in view.get_labs()
+        ) == sorted(
+            (lab.name, lab.date_time, lab.value, lab.units, lab.admission_id)
+            for lab in patient.labs
+        )
+        for lab_name, operator, value in cases:
+            assert view.is_sick(lab_name, operator, value) == patient.is_sick(
+                lab_name, operator, value
+            )
+    for lab_name, operator, value in cases:
+        assert store.sick_patients(lab_name, operator, value) == sorted(
+            patient_id
+            for patient_id, patient in records.items()
+            if patient.is_sick(lab_name, operator, value)
+        )
+    with pytest.raises(ValueError):
+        store.sick_patients("METABOLIC: CREATININE", ">=", 1.0)
+    store.close()
+
+
+def test_sort_labs(tmp_path) -> None:
+    """
+    Test sort_labs() and stream_patients().
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    sorted_file = str(tmp_path / "sorted_labs.txt")
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    test_count = sort_labs(
+        labs_file, sorted_file, run_size=2, temp_dir=str(tmp_path), fan_in=2
+    )
+    with open(sorted_file) as infile:
+        test_lines = infile.read().splitlines()
+    test_patients = list(stream_patients(patient_file, sorted_file))
+    with pytest.raises(ValueError):
+        list(stream_patients(patient_file, labs_file))
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    # assert
+    true_lines = LABS_FILE.splitlines()
+    assert test_count == 9
+    assert test_lines[0] == true_lines[0]
+    assert sorted(test_lines[1:]) == sorted(true_lines[1:])
+    keys = [
+        (fields[0], fields[5])
+        for fields in (line.split("\t") for line in test_lines[1:])
+    ]
+    assert keys == sorted(keys)
+    assert [patient.id for patient in test_patients] == sorted(records)
+    for patient in test_patients:
+        assert [vars(lab) for lab in patient.labs] == sorted(
+            (vars(lab) for lab in records[patient.id].labs),
+            key=lambda lab: lab["_date_time"],
+        )
+        assert patient.age_first_visit() == records[
+            patient.id
+        ].age_first_visit()
+    assert os.listdir(tmp_path) == ["sorted_labs.txt"]
+
+
+def test_partition_data(tmp_path) -> None:
+    """
+    Test partition_data() and shard_of().
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.close()
+
+    directory = str(tmp_path / "shards")
+    shards = 4
+
+    crlf_patient_file = str(tmp_path / "crlf_patients.txt")
+    crlf_labs_file = str(tmp_path / "crlf_labs.txt")
+    for filename, text in (
+        (crlf_patient_file, PATIENT_FILE),
+        (crlf_labs_file, LABS_FILE),
+    ):
+        with open(filename, mode="w", newline="\r\n") as outfile:
+            outfile.write(text)
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    manifest = partition_data(patient_file, labs_file, directory, shards)
+    crlf_manifest = partition_data(
+        crlf_patient_file, crlf_labs_file, str(tmp_path / "crlf"), shards
+    )
+
+    resource = pytest.importorskip("resource")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (64, hard))
+    try:
+        many_manifest = partition_data(
+            patient_file, labs_file, str(tmp_path / "many"), 500
+        )
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    with open(os.path.join(directory, "manifest.json")) as infile:
+        test_manifest = json.load(infile)
+    test_shards = [
+        parse_data(
+            os.path.join(directory, entry["patients"]),
+            os.path.join(directory, entry["labs"]),
+        )
+        for entry in manifest["files"]
+    ]
+
+    # assert
+    assert test_manifest == manifest
+    assert manifest["shards"] == shards
+    assert sum(entry["patient_rows"] for entry in manifest["files"]) == 2
+    assert sum(entry["lab_rows"] for entry in manifest["files"]) == 9
+    for shard, (entry, shard_records) in enumerate(
+        zip(manifest["files"], test_shards)
+    ):
+        assert len(shard_records) == entry["patient_rows"]
+        assert (
+            sum(len(patient.labs) for patient in shard_records.values())
+            == entry["lab_rows"]
+        )
+        for patient_id, patient in shard_records.items():
+            assert shard_of(patient_id, shards) == shard
+            assert [vars(lab) for lab in patient.labs] == [
+                vars(lab) for lab in records[patient_id].labs
+            ]
+    assert shard_of("0BC491C5-5A45-4067-BD11-A78BEA00D3BE", 1000) == 636
+    assert crlf_manifest["files"] == manifest["files"]
+    assert sum(entry["lab_rows"] for entry in many_manifest["files"]) == 9
+    for patient_id in records:
+        entry = many_manifest["files"][shard_of(patient_id, 500)]
+        assert entry["patient_rows"] == 1
+    with pytest.raises(ValueError):
+        partition_data(patient_file, labs_file, directory, 0)
+
+
+def test_cohort_ages() -> None:
+    """
+    Test ages_on(), cohort_ages() and cohort_ages_first_visit().
+
+    Return
+    ------
+    None
+    """
+
+    # setup
+    patient_file = "test_patients.txt"
+    patients = open(patient_file, mode="w", newline="\n")
+    patients.write(PATIENT_FILE)
+    patients.write(
+        "7A025E77-7832-4F53-B9A7-09A3F98AC17E\tMale\t"
+        "1940-02-29 10:11:12.130\tWhite\tSingle\tEnglish\t10.00\n"
+    )
+    patients.close()
+
+    labs_file = "test_labs.txt"
+    labs = open(labs_file, mode="w", newline="\n")
+    labs.write(LABS_FILE)
+    labs.write(
+        "7A025E77-7832-4F53-B9A7-09A3F98AC17E\t1\tCBC: PLATELET COUNT\t"
+        "250\tk/cumm\t2008-02-28 23:59:59.999\n"
+    )
+    labs.close()
+
+    references = [
+        "2008-02-28 00:00:00.000",
+        date(2008, 2, 29),
+        datetime(1960, 12, 6, 6, 37),
+    ]
+
+    # run
+    records = parse_data(patient_file, labs_file)
+    table = LabTable()
+    table_records = parse_data(patient_file, labs_file, table=table)
+    lazy_records = parse_lazy(patient_file, labs_file, max_resident=1)
+    test_lazy = cohort_ages_first_visit(lazy_records)
+
+    os.remove(patient_file)
+    os.remove(labs_file)
+
+    test_ages = cohort_ages(records)
+    test_first = cohort_ages_first_visit(table_records)
+    test_references = [cohort_ages(records, when) for when in references]
+    test_each = cohort_ages(records, references)
+    test_mixed = ages_on(
+        ["1960-12-06 06:37:05.640", "1960-12-06 06:37:05.640"],
+        [date(2020, 12, 5), "2020-12-06 00:00:00.000"],
+    )
+
+    # assert
+    patients = list(records.values())
+    assert list(test_ages) == [patient.age for patient in patients]
+    assert list(test_first) == [
+        patient.age_first_visit() for patient in patients
+    ]
+    assert list(test_lazy) == list(test_first)
+    for when, ages in zip(references, test_references):
+        day = when if isinstance(when, date) else datetime.fromisoformat(when)
+        assert list(ages) == [
+            ehr_utils._age_on(patient.dob_datetime, day) for patient in patients
+        ]
+    assert list(test_each) == [
+        ages[idx] for idx, ages in enumerate(test_references)
+    ]
+    assert list(test_mixed) == [59, 60]
+    with pytest.raises(ValueError):
+        cohort_ages(records, references[:2])
+    with pytest.raises(ValueError):
+        ages_on(["1960-12-06"])
+    with pytest.raises(ValueError):
+        ages_on(["2000-01-01 xx:yy:zz.qqq"])
+    records["no labs"] = Patient(
+        "no labs", "Female", "1990-01-01 00:00:00.000", "", "", "", "1.0"
+    )
+    with pytest.raises(ValueError):
+        cohort_ages_first_visit(records)